@@ -1,17 +1,106 @@
 from django.contrib import admin
-from .models import Api2dKey, Api2dGroup2ExpirationMapping
+from django_project.admin_utils import EstimatedCountPaginator, MonthListFilter
+from .models import Api2dKey, Api2dGroup2ExpirationMapping, UsageEvent, UsageRollup
+
+
+class CreatedMonthFilter(MonthListFilter):
+    title = "created"
+    parameter_name = "created_month"
+    field_name = "created_at"
 
 
 @admin.register(Api2dKey)
 class Api2dKeyAdmin(admin.ModelAdmin):
     list_display = ("key", "user", "created_at", "group", "expired_at")
-    list_filter = ("group", "created_at")
+    list_filter = ("group", CreatedMonthFilter)
+    list_select_related = ("user", "group")
     search_fields = ("key", "user__username")
+    search_help_text = "Search by the start of an API key or username."
     readonly_fields = ("created_at", "expired_at")
-    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Prefix matches are case-sensitive on purpose: LIKE 'term%' can use
+        # the unique indexes on key and username, ILIKE/UPPER() cannot. The
+        # two lookups are a UNION, not an OR across the user join, which
+        # Postgres could only answer with a sequential scan.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        by_key = Api2dKey.objects.filter(key__startswith=search_term)
+        by_username = Api2dKey.objects.filter(user__username__startswith=search_term)
+        matches = by_key.values("pk").union(by_username.values("pk"))
+        return queryset.filter(pk__in=matches), False
 
 
 @admin.register(Api2dGroup2ExpirationMapping)
 class Api2dGroup2ExpirationMappingAdmin(admin.ModelAdmin):
     list_display = ("group", "type_id", "validate_days")
     search_fields = ("group",)
+
+
+@admin.register(UsageEvent)
+class UsageEventAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "user",
+        "model",
+        "endpoint",
+        "input_tokens",
+        "output_tokens",
+        "latency_ms",
+        "cost",
+    )
+    list_filter = ("model", "endpoint")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    ordering = ("-created_at",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(user__username__startswith=search_term), False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(UsageRollup)
+class UsageRollupAdmin(admin.ModelAdmin):
+    """Dashboard over the rollup tables; never touches raw usage events."""
+
+    list_display = (
+        "bucket",
+        "period",
+        "user",
+        "model",
+        "requests",
+        "input_tokens",
+        "output_tokens",
+        "mean_latency_ms",
+        "cost",
+    )
+    list_filter = ("period", "model")
+    list_select_related = ("user",)
+    ordering = ("-bucket",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def mean_latency_ms(self, obj):
+        return obj.latency_ms // obj.requests if obj.requests else 0
+
+    mean_latency_ms.short_description = "Mean latency (ms)"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class api2dConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api2d"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,401 @@
+import csv
+import io
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from . import grammar
+from .model_routing import choose_model, record_latency
+from .models import Api2dKey, BatchEssay, EssayBatch
+from .revisions import change_table, highlight
+from .streaming import TRUNCATED_MESSAGE, SectionStreamParser
+from .usage import record_usage
+from .utilities import Api2dClient, celpip_improve_payload
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `per_minute` calls a minute, in bursts of up to
+    `burst`. `acquire` blocks until a call is allowed.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, per_minute // 60)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(key):
+    """The process-wide rate limiter of an API key."""
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(settings.BATCH_RATE_LIMIT_PER_MINUTE)
+        return _limiters[key]
+
+
+def _essay_files(archive):
+    """
+    The .txt entries of a zip, checked against BATCH_MAX_ESSAY_BYTES and
+    BATCH_MAX_ARCHIVE_BYTES before anything is decompressed.
+    """
+    files = []
+    for info in sorted(archive.infolist(), key=lambda i: i.filename):
+        name = os.path.basename(info.filename)
+        if info.is_dir() or not name.lower().endswith(".txt"):
+            continue
+        if name.startswith("."):
+            continue
+        if info.file_size > settings.BATCH_MAX_ESSAY_BYTES:
+            raise ValueError(f"{name} is too large for an essay.")
+        files.append((name, info))
+    if sum(info.file_size for _, info in files) > settings.BATCH_MAX_ARCHIVE_BYTES:
+        raise ValueError("The zip holds too much text.")
+    return files
+
+
+def parse_essays(upload):
+    """
+    Returns (name, essay) pairs from an uploaded CSV or zip of text files.
+    A CSV needs an "essay" column and may have a "name" column; a zip holds
+    one essay per .txt file. Raises ValueError for anything else.
+    """
+    data = upload.read()
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        essays = []
+        total = 0
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for name, info in _essay_files(archive):
+                # The sizes in the zip are not to be trusted: read one more
+                # byte than allowed to tell
+                with archive.open(info) as f:
+                    raw = f.read(settings.BATCH_MAX_ESSAY_BYTES + 1)
+                if len(raw) > settings.BATCH_MAX_ESSAY_BYTES:
+                    raise ValueError(f"{name} is too large for an essay.")
+                total += len(raw)
+                if total > settings.BATCH_MAX_ARCHIVE_BYTES:
+                    raise ValueError("The zip holds too much text.")
+                text = raw.decode("utf-8-sig", errors="replace")
+                essays.append((os.path.splitext(name)[0], text))
+    else:
+        try:
+            reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+        except UnicodeDecodeError:
+            raise ValueError("The file is neither a zip nor a UTF-8 CSV.")
+        if "essay" not in (reader.fieldnames or []):
+            raise ValueError('The CSV needs an "essay" column.')
+        essays = [
+            (row.get("name") or f"essay-{i}", row["essay"])
+            for i, row in enumerate(reader, start=1)
+        ]
+
+    essays = [(name[:200], text.strip()) for name, text in essays if text.strip()]
+    if not essays:
+        raise ValueError("No essays found in the file.")
+    if len(essays) > settings.BATCH_MAX_ESSAYS:
+        raise ValueError(
+            f"A batch can hold at most {settings.BATCH_MAX_ESSAYS} essays."
+        )
+    return essays
+
+
+def create_batch(user, name, essays):
+    batch = EssayBatch.objects.create(user=user, name=name[:200])
+    BatchEssay.objects.bulk_create(
+        BatchEssay(batch=batch, position=i, name=essay_name, essay=text)
+        for i, (essay_name, text) in enumerate(essays, start=1)
+    )
+    return batch
+
+
+def split_sections(text):
+    parser = SectionStreamParser(initial_section="revised_text")
+    sections = {}
+    for event in parser.feed(text) + parser.close():
+        sections[event.section] = sections.get(event.section, "") + event.text
+    return sections
+
+
+def claim_essay(essay_id):
+    """
+    Take the lease of a pending essay for BATCH_STALE_SECONDS, unless
+    another worker holds it, so that no essay is sent upstream twice.
+    """
+    now = timezone.now()
+    return bool(
+        BatchEssay.objects.filter(pk=essay_id, status=BatchEssay.STATUS_PENDING)
+        .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+        .update(claimed_until=now + timedelta(seconds=settings.BATCH_STALE_SECONDS))
+    )
+
+
+def _release_connection():
+    """
+    Hand this thread's database connection back while it waits on upstream;
+    the final save opens one again. Otherwise every pool thread would hold
+    a connection for the length of its call, more than a connection pool
+    sized for the request threads has.
+    """
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def process_essay(essay_id, client, limiter, user_id, group=None):
+    """
+    Improve one essay and store the result; its row is the checkpoint.
+    Returns None, without calling upstream, for an essay another worker
+    has claimed.
+    """
+    limiter.acquire()
+    if not claim_essay(essay_id):
+        return None
+    try:
+        return _process_claimed(essay_id, client, user_id, group)
+    except BaseException:
+        # Let the next pass retry it rather than wait out the lease
+        BatchEssay.objects.filter(pk=essay_id).update(claimed_until=None)
+        raise
+
+
+def _process_claimed(essay_id, client, user_id, group):
+    essay = BatchEssay.objects.get(pk=essay_id)
+    plain = settings.CELPIP_LOCAL_DIFF
+    route = choose_model(essay.essay, group)
+    payload = celpip_improve_payload(
+        essay.essay, wrap_input=True, plain=plain, model=route.model
+    )
+    _release_connection()
+    started = time.perf_counter()
+    response = client.create_claude_message(payload)
+    seconds = time.perf_counter() - started
+    essay.attempts += 1
+
+    content = (response or {}).get("content") or [{}]
+    text = content[0].get("text")
+    if text:
+        usage = response.get("usage") or {}
+        record_usage(
+            user_id=user_id,
+            model=payload["model"],
+            endpoint="/claude/v1/messages",
+            input_tokens=usage.get("input_tokens") or 0,
+            output_tokens=usage.get("output_tokens") or 0,
+            input_chars=sum(len(m["content"]) for m in payload["messages"]),
+            output_chars=len(text),
+            latency_ms=round(seconds * 1000),
+        )
+        record_latency(route.model, seconds, route.tokens)
+    if text and response.get("stop_reason") == "max_tokens":
+        # Another attempt would be cut off at the same budget
+        essay.status = BatchEssay.STATUS_FAILED
+        essay.error = TRUNCATED_MESSAGE
+    elif text:
+        sections = split_sections(text)
+        revised = sections.get("revised_text", "").strip()
+        if plain:
+            essay.revised_text = highlight(essay.essay, revised)
+            feedback = change_table(essay.essay, revised)
+        else:
+            essay.revised_text = revised
+            feedback = sections.get("grammar_focused_feedback", "").strip()
+        findings = grammar.local_findings(essay.essay)
+        essay.feedback = grammar.merge(feedback, essay.essay, findings)
+        essay.status = BatchEssay.STATUS_DONE
+        essay.error = ""
+    elif essay.attempts >= settings.BATCH_MAX_ATTEMPTS:
+        essay.status = BatchEssay.STATUS_FAILED
+        essay.error = "The upstream call failed."
+    essay.claimed_until = None
+    essay.save(
+        update_fields=[
+            "revised_text",
+            "feedback",
+            "status",
+            "error",
+            "attempts",
+            "claimed_until",
+        ]
+    )
+    return essay.status
+
+
+def claim_batch(batch_id):
+    """
+    Take over a batch nobody is processing: new, or with a heartbeat older
+    than BATCH_STALE_SECONDS because its worker died. The conditional
+    UPDATE makes sure only one worker wins.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.BATCH_STALE_SECONDS)
+    return bool(
+        EssayBatch.objects.filter(pk=batch_id, finished_at__isnull=True)
+        .filter(Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=stale))
+        .update(heartbeat_at=now)
+    )
+
+
+def _heartbeat(batch_id, stop):
+    """Mark the batch alive until `stop` is set, however long calls take."""
+    try:
+        while not stop.wait(settings.BATCH_HEARTBEAT_SECONDS):
+            EssayBatch.objects.filter(pk=batch_id).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def run_batch(batch_id, concurrency=None):
+    """
+    Process the pending essays of a claimed batch with a bounded pool of
+    threads. Essays already done are skipped, so running a batch again
+    resumes it after a crash.
+    """
+    stop = threading.Event()
+    ticker = threading.Thread(
+        target=_heartbeat, args=(batch_id, stop), name=f"batch-heartbeat-{batch_id}"
+    )
+    ticker.start()
+    try:
+        _run_batch(batch_id, concurrency)
+    finally:
+        stop.set()
+        ticker.join()
+
+
+def _run_batch(batch_id, concurrency):
+    batch = EssayBatch.objects.select_related("user").get(pk=batch_id)
+    api_key = Api2dKey.objects.select_related("group").get(user=batch.user)
+    client = Api2dClient(api_key.key, settings.API2D_OPENAI_ENDPOINT)
+    limiter = limiter_for(api_key.key)
+
+    def work(essay_id):
+        try:
+            return process_essay(
+                essay_id, client, limiter, batch.user_id, api_key.group.group
+            )
+        finally:
+            # Pool threads each opened their own connection.
+            connection.close()
+
+    # Each pass retries the essays whose upstream call failed.
+    for _ in range(settings.BATCH_MAX_ATTEMPTS):
+        pending = list(
+            batch.essays.filter(status=BatchEssay.STATUS_PENDING).values_list(
+                "pk", flat=True
+            )
+        )
+        if not pending:
+            break
+        with ThreadPoolExecutor(
+            max_workers=concurrency or settings.BATCH_CONCURRENCY
+        ) as pool:
+            futures = [pool.submit(work, essay_id) for essay_id in pending]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception("Essay of batch %s failed", batch_id)
+
+    # Not the essays another worker is still calling upstream for
+    batch.essays.filter(status=BatchEssay.STATUS_PENDING).filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=timezone.now())
+    ).update(status=BatchEssay.STATUS_FAILED, error="The upstream call failed.")
+    EssayBatch.objects.filter(pk=batch_id).update(finished_at=timezone.now())
+
+
+def start_batch(batch_id):
+    """Claim and run a batch in a background thread of this process."""
+    if not claim_batch(batch_id):
+        return False
+
+    def target():
+        try:
+            run_batch(batch_id)
+        except Exception:
+            logger.exception("Batch %s stopped", batch_id)
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=target, name=f"essay-batch-{batch_id}", daemon=True).start()
+    return True
+
+
+def batch_progress(batch):
+    counts = dict(batch.essays.values_list("status").annotate(n=Count("pk")).order_by())
+    return {status: counts.get(status, 0) for status, _ in BatchEssay.STATUSES}
+
+
+class _StreamBuffer:
+    """Write-only file that hands its bytes out as they are written."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_archive(batch):
+    """
+    Yields a zip of the batch results, one file per essay plus a CSV index,
+    built as it is sent instead of in memory. Only one essay is loaded at a
+    time.
+    """
+    buffer = _StreamBuffer()
+    index = io.StringIO()
+    writer = csv.writer(index)
+    writer.writerow(["position", "name", "status", "file"])
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for essay in batch.essays.iterator(chunk_size=50):
+            filename = ""
+            if essay.status == BatchEssay.STATUS_DONE:
+                filename = f"{essay.position:04d}-{get_valid_filename(essay.name)}.md"
+                archive.writestr(
+                    filename,
+                    f"# {essay.name}\n\n## Essay\n\n{essay.essay}\n\n"
+                    f"## Improved Text\n\n{essay.revised_text}\n\n"
+                    f"## Detailed Suggestions\n\n{essay.feedback}\n",
+                )
+            writer.writerow([essay.position, essay.name, essay.status, filename])
+            yield buffer.drain()
+        archive.writestr("index.csv", index.getvalue())
+    yield buffer.drain()
@@ -0,0 +1,98 @@
+import hashlib
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from django_project.cache_utils import cache_lock, incr
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+UNAVAILABLE_MESSAGE = (
+    "The credits service is temporarily unavailable. Please try again in a "
+    "few minutes."
+)
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """Raised without touching the network while every circuit is open."""
+
+    def __init__(self, message=UNAVAILABLE_MESSAGE):
+        super().__init__(message)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream endpoint, with its state in the shared
+    cache so all workers trip and recover together.
+
+    Closed: calls go through; UPSTREAM_BREAKER_FAILURES failures in a row
+    open the circuit. Open: calls are refused at once, so no worker waits on
+    a dead upstream. After UPSTREAM_BREAKER_RESET_SECONDS the circuit is
+    half-open: up to UPSTREAM_BREAKER_PROBES probe calls are let through,
+    and the first result closes the circuit again or reopens it.
+
+    The probe count is an atomic counter, and state changes run under
+    `cache_lock`, so concurrent workers never let more probes through, even
+    on the file-based cache.
+    """
+
+    def __init__(self, url):
+        digest = hashlib.md5(url.encode("utf-8")).hexdigest()
+        self.key = "breaker:" + digest
+        self.probe_key = "breaker-probe:" + digest
+
+    def _state(self):
+        return cache.get(self.key) or {"state": CLOSED, "failures": 0}
+
+    def state(self):
+        state = self._state()
+        if state["state"] == OPEN and self._reset_due(state):
+            return HALF_OPEN
+        return state["state"]
+
+    def _reset_due(self, state):
+        elapsed = time.time() - state["opened_at"]
+        return elapsed >= settings.UPSTREAM_BREAKER_RESET_SECONDS
+
+    def allow(self):
+        """Whether a call may go out now. Takes a probe slot when half-open."""
+        state = self._state()
+        if state["state"] == CLOSED:
+            return True
+        if state["state"] == OPEN and not self._reset_due(state):
+            return False
+        if state["state"] == OPEN:
+            with cache_lock("breaker"):
+                state = self._state()
+                if state["state"] == OPEN:
+                    cache.set(self.key, {**state, "state": HALF_OPEN}, timeout=None)
+        return self._take_probe()
+
+    def _take_probe(self):
+        # One counter per half-open period; it expires with the period, so a
+        # probe that never reports back does not block the circuit forever.
+        taken = incr(self.probe_key, timeout=settings.UPSTREAM_BREAKER_RESET_SECONDS)
+        return taken <= settings.UPSTREAM_BREAKER_PROBES
+
+    def record_success(self):
+        if self._state() != {"state": CLOSED, "failures": 0}:
+            cache.set(self.key, {"state": CLOSED, "failures": 0}, timeout=None)
+            cache.delete(self.probe_key)
+
+    def record_failure(self):
+        with cache_lock("breaker"):
+            state = self._state()
+            failures = state["failures"] + 1
+            if (
+                state["state"] != CLOSED
+                or failures >= settings.UPSTREAM_BREAKER_FAILURES
+            ):
+                state = {"state": OPEN, "failures": failures, "opened_at": time.time()}
+                cache.delete(self.probe_key)
+            else:
+                state = {**state, "failures": failures}
+            cache.set(self.key, state, timeout=None)
@@ -0,0 +1,60 @@
+import zlib
+
+from django.db import models
+
+# Bodies shorter than this are stored as-is; zlib framing would only make
+# them bigger.
+COMPRESS_MIN_LENGTH = 256
+
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text stored zlib-compressed in a binary column. A one-byte marker tells
+    compressed values from short ones kept uncompressed. The column cannot be
+    filtered or searched in SQL; index a plain copy of the text instead.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("default", "")
+        kwargs.setdefault("blank", True)
+        kwargs["editable"] = True
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.pop("editable", None)
+        return name, path, args, kwargs
+
+    def _check_str_default_value(self):
+        # Values are text on the Python side, so a str default is correct.
+        return []
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        data = value.encode("utf-8")
+        if len(data) < COMPRESS_MIN_LENGTH:
+            return super().get_prep_value(_RAW + data)
+        return super().get_prep_value(_ZLIB + zlib.compress(data))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        value = bytes(value)
+        if value[:1] == _ZLIB:
+            return zlib.decompress(value[1:]).decode("utf-8")
+        return value[1:].decode("utf-8")
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return self.from_db_value(value, None, None)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return models.TextField().formfield(**kwargs)
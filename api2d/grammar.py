@@ -0,0 +1,389 @@
+import re
+from dataclasses import dataclass
+from functools import cache
+
+from django.conf import settings
+
+from .revisions import in_context, tokenize
+
+# Base, simple past and past participle of the irregular verbs learners
+# trip over most
+IRREGULAR_VERBS = """
+begin began begun, break broke broken, bring brought brought,
+build built built, buy bought bought, catch caught caught,
+choose chose chosen, come came come, do did done, draw drew drawn,
+drink drank drunk, drive drove driven, eat ate eaten, fall fell fallen,
+feel felt felt, fight fought fought, find found found, fly flew flown,
+forget forgot forgotten, get got gotten, give gave given, go went gone,
+grow grew grown, hear heard heard, hold held held, keep kept kept,
+know knew known, leave left left, lose lost lost, make made made,
+meet met met, pay paid paid, ride rode ridden, rise rose risen,
+run ran run, say said said, see saw seen, sell sold sold, send sent sent,
+sit sat sat, sleep slept slept, speak spoke spoken, spend spent spent,
+stand stood stood, steal stole stolen, swim swam swum, take took taken,
+teach taught taught, tell told told, think thought thought,
+throw threw thrown, understand understood understood, wear wore worn,
+win won won, write wrote written
+"""
+
+# Regular verbs common in CELPIP answers; none double its last consonant
+REGULAR_VERBS = """
+ask call clean decide enjoy finish help hope like live look love need
+open play remember seem start stay talk try use visit wait walk want
+watch work
+"""
+
+# "Regularized" pasts that are real words
+NOT_ERRORS = {"seed", "sited", "wined", "singed", "ringed", "waked"}
+
+PLURAL_PRONOUNS = {"we", "they", "you"}
+SINGULAR_PRONOUNS = {"he", "she", "it"}
+PLURAL_DETERMINERS = {
+    "the", "these", "those", "my", "your", "his", "her", "our", "their",
+    "many", "some", "all", "both", "several", "few", "two", "three",
+    "four", "five", "ten",
+}  # fmt: skip
+IRREGULAR_PLURALS = {"people", "children", "men", "women", "feet", "teeth"}
+SINGULAR_IN_S = {"news", "series", "species", "physics", "mathematics", "bus"}
+# After these a subject takes the bare verb: "does she keep", "let it go"
+BARE_VERB_AFTER = {
+    "do", "does", "did", "can", "could", "will", "would", "should", "may",
+    "might", "must", "to", "let", "make", "made", "help", "and", "or",
+    "doesn't", "didn't", "don't", "won't", "can't",
+}  # fmt: skip
+
+PLURAL_AGREEMENT = {
+    "was": "were", "is": "are", "has": "have", "does": "do", "doesn't": "don't",
+}  # fmt: skip
+SINGULAR_AGREEMENT = {
+    "were": "was", "are": "is", "have": "has", "do": "does", "don't": "doesn't",
+}  # fmt: skip
+# A noun right after these is not the subject of the verb that follows it:
+# "the cost of the tickets was", "one of the birds was", "each of you has"
+PHRASE_OPENERS = {
+    "of", "from", "in", "with", "on", "at", "for", "about", "by", "near",
+    "like", "without", "than", "one", "each", "every", "everyone",
+    "everybody", "either", "neither", "none",
+}  # fmt: skip
+HAVE = {"have", "has", "had", "having"}
+ADVERB_RE = re.compile(r"already|just|never|ever|not|recently|also|always")
+PLURAL_NOUN_RE = re.compile(r"[a-z]{2,}[^isu]s")
+
+
+@dataclass
+class Finding:
+    first: int  # token indexes, last exclusive
+    last: int
+    correction: str
+    explanation: str
+
+
+@dataclass
+class Lexicon:
+    past: dict  # base -> simple past
+    participle: dict  # base -> past participle
+    wrong_past: dict  # simple past used where the participle belongs
+    participle_as_past: dict  # participle used as the simple past
+    regularized: dict  # "buyed" -> base
+    third_person: dict  # "keeps" -> base
+    past_forms: set
+
+
+def _third_person(base):
+    if base == "have":
+        return "has"
+    if base.endswith(("s", "sh", "ch", "x", "z", "o")):
+        return base + "es"
+    if base.endswith("y") and base[-2] not in "aeiou":
+        return base[:-1] + "ies"
+    return base + "s"
+
+
+def _regular_past(base):
+    if base.endswith("e"):
+        return base + "d"
+    if base.endswith("y") and base[-2] not in "aeiou":
+        return base[:-1] + "ied"
+    return base + "ed"
+
+
+@cache
+def lexicon():
+    """The verb forms, built once per process."""
+    past, participle = {}, {}
+    for entry in IRREGULAR_VERBS.split(","):
+        base, simple, done = entry.split()
+        past[base], participle[base] = simple, done
+    for base in REGULAR_VERBS.split():
+        past[base] = participle[base] = _regular_past(base)
+    irregular = [base for base in past if past[base] != _regular_past(base)]
+    regularized = {}
+    for base in irregular:
+        for wrong in (_regular_past(base), base + base[-1] + "ed"):
+            if wrong not in NOT_ERRORS and wrong != past[base]:
+                regularized[wrong] = base
+    return Lexicon(
+        past=past,
+        participle=participle,
+        wrong_past={past[b]: participle[b] for b in past if past[b] != participle[b]},
+        participle_as_past={
+            participle[b]: past[b] for b in past if participle[b] not in (past[b], b)
+        },
+        regularized=regularized,
+        third_person={_third_person(b): b for b in past},
+        past_forms=set(past.values()) | {"was", "were", "had", "did"},
+    )
+
+
+def _match_case(word, like):
+    return word[:1].upper() + word[1:] if like[:1].isupper() else word
+
+
+def _is_word(token):
+    return token is not None and token.text[:1].isalpha()
+
+
+def _in_past(words, lex):
+    """Whether the text is told in the past tense."""
+    past = sum(w in lex.past_forms for w in words)
+    present = sum(
+        w in ("is", "are", "am", "has", "does") or w in lex.third_person for w in words
+    )
+    return past > present
+
+
+def local_findings(text):
+    """The findings of `check`, or none while CELPIP_LOCAL_GRAMMAR_CHECK is off."""
+    if not settings.CELPIP_LOCAL_GRAMMAR_CHECK or not text:
+        return []
+    return check(text)
+
+
+def check(text):
+    """
+    Findings of a fast rule-based pass over `text` for the errors learners
+    make most: subject-verb agreement ("the birds was"), irregular pasts
+    ("she seen", "I buyed", "I have took") and a bare verb in a past-tense
+    text ("she keep walking"). Rules only fire on clear cases, so the pass
+    finds less than the model does but is rarely wrong. Agreement is not
+    checked for a noun inside a phrase ("the cost of the tickets was"),
+    whose verb belongs to a subject further back.
+    """
+    lex = lexicon()
+    tokens = tokenize(text)
+    words = [t.text.lower() for t in tokens]
+    past_text = _in_past(words, lex)
+    findings = []
+
+    def at(i):
+        return tokens[i] if 0 <= i < len(tokens) else None
+
+    for i, word in enumerate(words):
+        previous = words[i - 1] if i and _is_word(at(i - 1)) else None
+        before = words[i - 2] if i > 1 and _is_word(at(i - 2)) else None
+        plural_noun = (
+            previous
+            and before in PLURAL_DETERMINERS
+            and previous not in SINGULAR_IN_S
+            and (
+                previous in IRREGULAR_PLURALS
+                or bool(PLURAL_NOUN_RE.fullmatch(previous))
+            )
+        )
+        # The word in front of the pronoun, or of the noun's determiner
+        opener = before if previous in PLURAL_PRONOUNS | SINGULAR_PRONOUNS else None
+        if plural_noun:
+            opener = words[i - 3] if i > 2 and _is_word(at(i - 3)) else None
+        embedded = opener in PHRASE_OPENERS
+        plural_subject = (
+            previous in PLURAL_PRONOUNS or bool(plural_noun)
+        ) and not embedded
+        singular_subject = (
+            previous in SINGULAR_PRONOUNS
+            and before not in BARE_VERB_AFTER
+            and not embedded
+        )
+
+        if word in lex.regularized:
+            base = lex.regularized[word]
+            if previous in HAVE:
+                right, kind = lex.participle[base], "participle"
+            else:
+                right, kind = lex.past[base], "simple past"
+            findings.append(
+                Finding(
+                    i,
+                    i + 1,
+                    right,
+                    f'Irregular verb: the {kind} of "{base}" is "{right}"',
+                )
+            )
+        elif word in lex.wrong_past and (
+            previous in HAVE
+            or (before in HAVE and previous and ADVERB_RE.fullmatch(previous))
+        ):
+            right = lex.wrong_past[word]
+            findings.append(
+                Finding(
+                    i,
+                    i + 1,
+                    right,
+                    f'Perfect tense takes the past participle: "{right}", '
+                    f'not "{word}"',
+                )
+            )
+        elif word in lex.participle_as_past and (
+            previous in PLURAL_PRONOUNS | SINGULAR_PRONOUNS | {"i"}
+            and before not in BARE_VERB_AFTER
+        ):
+            right = lex.participle_as_past[word]
+            findings.append(
+                Finding(
+                    i,
+                    i + 1,
+                    right,
+                    f'Incorrect past tense: "{word}" needs "have", the simple '
+                    f'past is "{right}"',
+                )
+            )
+        elif word in PLURAL_AGREEMENT and plural_subject and before != "if":
+            right = PLURAL_AGREEMENT[word]
+            findings.append(
+                Finding(
+                    i,
+                    i + 1,
+                    right,
+                    f'Subject-verb agreement: "{previous}" is plural, so it '
+                    f'should be "{right}"',
+                )
+            )
+        elif word in SINGULAR_AGREEMENT and singular_subject:
+            if word == "were" and before in ("if", "wish"):
+                continue
+            right = SINGULAR_AGREEMENT[word]
+            findings.append(
+                Finding(
+                    i,
+                    i + 1,
+                    right,
+                    f'Subject-verb agreement: "{previous}" is singular, so it '
+                    f'should be "{right}"',
+                )
+            )
+        elif word in lex.third_person and plural_subject:
+            right = lex.third_person[word]
+            findings.append(
+                Finding(
+                    i,
+                    i + 1,
+                    right,
+                    f'Subject-verb agreement: "{previous}" is plural, so it '
+                    f'should be "{right}"',
+                )
+            )
+        elif word in lex.past and word not in lex.past_forms and singular_subject:
+            if past_text:
+                right = lex.past[word]
+                explanation = (
+                    "Verb tense consistency: should be past tense to match "
+                    "the rest of the text"
+                )
+            else:
+                right = _third_person(word)
+                explanation = (
+                    f'Subject-verb agreement: "{previous}" is singular, so it '
+                    f'should be "{right}"'
+                )
+            findings.append(Finding(i, i + 1, right, explanation))
+        elif (
+            word in ("is", "was")
+            and previous == "there"
+            and at(i + 1) is not None
+            and words[i + 1]
+            in ("two", "three", "four", "five", "many", "several", "few", "lots")
+        ):
+            right = PLURAL_AGREEMENT[word]
+            findings.append(
+                Finding(
+                    i,
+                    i + 1,
+                    right,
+                    f'Subject-verb agreement: the subject after "there" is '
+                    f'plural, so it should be "{right}"',
+                )
+            )
+
+    for finding in findings:
+        finding.correction = _match_case(finding.correction, tokens[finding.first].text)
+    return findings
+
+
+def rows(text, findings, context=3):
+    """Table rows of the findings, in the layout of the model's feedback."""
+    tokens = tokenize(text)
+    result = []
+    for finding in findings:
+        start = tokens[finding.first].start
+        end = tokens[finding.last - 1].end
+        corrected = text[:start] + finding.correction + text[end:]
+        corrected_tokens = tokenize(corrected)
+        size = len(tokenize(finding.correction))
+        result.append(
+            "| {} | {} | {} |".format(
+                in_context(text, tokens, finding.first, finding.last, context),
+                in_context(
+                    corrected,
+                    corrected_tokens,
+                    finding.first,
+                    finding.first + size,
+                    context,
+                ),
+                finding.explanation.replace("|", "\\|"),
+            )
+        )
+    return result
+
+
+TABLE_HEADER = [
+    "| Input | Improved | Explanation |",
+    "|-----------|---------|-------------|",
+]
+
+
+def table(text, findings):
+    if not findings:
+        return "No errors found"
+    return "\n".join(TABLE_HEADER + rows(text, findings))
+
+
+def _mentioned(row, feedback_lines):
+    """Whether a row of ours is already a row of the model's table."""
+    cells = [c.strip() for c in row.strip("|").split("|")]
+    wrong = re.findall(r"`([^`]+)`", cells[0])
+    right = re.findall(r"`([^`]+)`", cells[1])
+    for line in feedback_lines:
+        line = line.lower()
+        if all(re.search(rf"\b{re.escape(w.lower())}\b", line) for w in wrong + right):
+            return True
+    return False
+
+
+def merge(feedback, text, findings):
+    """
+    The model's feedback with a row added for each finding the model's
+    table does not have. Feedback without a table, e.g. "No errors found",
+    is kept as it is: the model read the whole text, the rules did not.
+    """
+    if not findings:
+        return feedback
+    lines = feedback.strip().splitlines()
+    table_lines = [n for n, line in enumerate(lines) if line.lstrip().startswith("|")]
+    if not table_lines:
+        return feedback
+    extra = [
+        row
+        for row in rows(text, findings)
+        if not _mentioned(row, [lines[n] for n in table_lines])
+    ]
+    end = table_lines[-1] + 1
+    return "\n".join(lines[:end] + extra + lines[end:])
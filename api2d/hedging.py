@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+# Only for hedged calls, so a slow upstream cannot starve anything else.
+# Every request run here holds a slot until it returns, losers included;
+# with no slot free, calls run unhedged in the caller's thread instead of
+# queueing behind them.
+_slots = threading.BoundedSemaphore(settings.UPSTREAM_HEDGE_MAX_IN_FLIGHT)
+_pool = ThreadPoolExecutor(
+    max_workers=settings.UPSTREAM_HEDGE_MAX_IN_FLIGHT, thread_name_prefix="hedge"
+)
+
+
+def _submit(call):
+    """Run `call` on the pool if a slot is free; None otherwise."""
+    if not _slots.acquire(blocking=False):
+        return None
+    future = _pool.submit(call)
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+class LatencyTracker:
+    """Recent latencies of one kind of call, for choosing the hedge delay."""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def delay(self):
+        """
+        Seconds to wait before hedging: the UPSTREAM_HEDGE_PERCENTILE of the
+        recent latencies, or UPSTREAM_HEDGE_DEFAULT_DELAY until there are
+        enough samples to tell.
+        """
+        with self.lock:
+            samples = sorted(self.samples)
+        if len(samples) < 20:
+            return settings.UPSTREAM_HEDGE_DEFAULT_DELAY
+        index = int(len(samples) * settings.UPSTREAM_HEDGE_PERCENTILE / 100)
+        return samples[min(index, len(samples) - 1)]
+
+
+class HedgeBudget:
+    """
+    Token bucket that lets at most UPSTREAM_HEDGE_BUDGET hedges per call,
+    e.g. 0.1 for one hedge per ten calls. Every call earns that fraction of
+    a token and a hedge spends a whole one, so when upstream slows down for
+    everyone hedging stops at the budget instead of doubling the load.
+    """
+
+    def __init__(self, burst=10):
+        self.burst = burst
+        self.tokens = 0.0
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + settings.UPSTREAM_HEDGE_BUDGET)
+
+    def spend(self):
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def hedged(primary, backup, tracker, budget, ok):
+    """
+    Run `primary()`; if it has not finished after the tracker's delay and
+    the budget allows, start `backup()` as well and return whichever result
+    first passes `ok`. The loser is cancelled if it has not started yet.
+    One that is already in flight cannot be interrupted, so its result is
+    ignored. If neither passes, the primary's outcome is returned or raised.
+    Without a free slot, `primary()` runs unhedged in the calling thread.
+    """
+    budget.earn()
+    started = time.perf_counter()
+    first = _submit(primary)
+    if first is None:
+        try:
+            return primary()
+        finally:
+            tracker.record(time.perf_counter() - started)
+    done, _ = wait([first], timeout=tracker.delay())
+    second = None if done or not budget.spend() else _submit(backup)
+    if second is None:
+        try:
+            return first.result()
+        finally:
+            tracker.record(time.perf_counter() - started)
+
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and ok(future.result()):
+                tracker.record(time.perf_counter() - started)
+                for loser in pending:
+                    loser.cancel()
+                return future.result()
+    tracker.record(time.perf_counter() - started)
+    return first.result()
@@ -0,0 +1,101 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Submission
+
+# Full-text index of Submission. The text columns are compressed, so the
+# database cannot index them directly: a plain copy of the text is indexed
+# when a submission is saved. Postgres keeps it as a tsvector column with a
+# GIN index, SQLite (development) in an FTS5 table keyed by submission id.
+SEARCH_CONFIG = "english"
+FTS_TABLE = "api2d_submission_fts"
+
+
+def index_submission(submission):
+    """Store the searchable text of a saved submission."""
+    text = submission.search_text
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"UPDATE {Submission._meta.db_table} "
+                "SET search_vector = to_tsvector(%s, %s) WHERE id = %s",
+                [SEARCH_CONFIG, text, submission.pk],
+            )
+        elif connection.vendor == "sqlite":
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)",
+                [submission.pk, text],
+            )
+
+
+def unindex_submission(pk):
+    # The Postgres column goes away with the row.
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def _fts5_query(query):
+    # Quote every term so user input cannot use FTS5 operators; terms are
+    # ANDed like websearch_to_tsquery does.
+    return " ".join('"%s"' % term.replace('"', '""') for term in query.split())
+
+
+def search(queryset, query):
+    """Filter a Submission queryset to the rows matching a search query."""
+    query = query.strip()
+    if not query:
+        return queryset
+    if connection.vendor == "postgresql":
+        match = RawSQL(
+            "search_vector @@ websearch_to_tsquery(%s, %s)",
+            [SEARCH_CONFIG, query],
+            output_field=BooleanField(),
+        )
+        return queryset.alias(search_match=match).filter(search_match=True)
+    if connection.vendor == "sqlite":
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [_fts5_query(query)],
+            )
+        )
+    return queryset.none()
+
+
+def encode_cursor(submission):
+    raw = f"{submission.created_at.isoformat()}|{submission.pk}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, pk) of a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+
+def keyset_page(queryset, cursor=None, size=20):
+    """
+    Returns one page of submissions, newest first, and the cursor of the next
+    page (None on the last one). Pages continue from the last row seen rather
+    than an OFFSET, so page 500 costs the same index range scan as page 1.
+    """
+    queryset = queryset.order_by("-created_at", "-id")
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    rows = list(queryset[: size + 1])
+    next_cursor = encode_cursor(rows[size - 1]) if len(rows) > size else None
+    return rows[:size], next_cursor
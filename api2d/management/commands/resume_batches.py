@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api2d.batches import claim_batch, run_batch
+from api2d.models import EssayBatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume the unfinished essay batches whose worker died, i.e. whose "
+        "heartbeat is older than BATCH_STALE_SECONDS. Run it from a scheduler, "
+        "or as a worker process with --every."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=float,
+            help="Keep running, looking for batches every this many seconds.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for batch_id in self.resume():
+                self.stdout.write(f"Resumed batch {batch_id}")
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
+
+    def resume(self):
+        unfinished = EssayBatch.objects.filter(finished_at__isnull=True)
+        for batch_id in unfinished.values_list("pk", flat=True):
+            # Batches still beating belong to a live worker
+            if claim_batch(batch_id):
+                run_batch(batch_id)
+                yield batch_id
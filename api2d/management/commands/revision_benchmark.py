@@ -0,0 +1,92 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api2d.batches import split_sections
+from api2d.revisions import change_table, highlight
+from api2d.utilities import Api2dClient, celpip_improve_payload
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the output tokens and latency of an essay improvement when "
+        "the model writes the highlights and feedback itself and when it only "
+        "writes the revised text and the rest comes from a local word diff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="+",
+            help="Essay .txt files or directories, e.g. tests/fixtures/essays.",
+        )
+        parser.add_argument("--api-key", required=True)
+        parser.add_argument(
+            "--repeat", type=int, default=1, help="Calls per essay and prompt."
+        )
+
+    def handle(self, *args, **options):
+        files = sorted(self.collect(options["paths"]))
+        if not files:
+            raise CommandError("No essays found.")
+        client = Api2dClient(options["api_key"], settings.API2D_OPENAI_ENDPOINT)
+
+        totals = {"full": [0, 0.0], "plain": [0, 0.0]}
+        for path in files:
+            with open(path, encoding="utf-8") as f:
+                essay = f.read()
+            for _ in range(options["repeat"]):
+                full_tokens, full_seconds = self.timed_improvement(client, essay)
+                plain_tokens, plain_seconds = self.timed_improvement(
+                    client, essay, plain=True
+                )
+                totals["full"][0] += full_tokens
+                totals["full"][1] += full_seconds
+                totals["plain"][0] += plain_tokens
+                totals["plain"][1] += plain_seconds
+                self.stdout.write(
+                    f"{path}: {full_tokens} -> {plain_tokens} output tokens, "
+                    f"{full_seconds:.2f}s -> {plain_seconds:.2f}s"
+                )
+
+        (full_tokens, full_seconds), (plain_tokens, plain_seconds) = totals.values()
+        self.stdout.write(
+            f"output tokens: {full_tokens} -> {plain_tokens} "
+            f"({self.saved(full_tokens, plain_tokens)})"
+        )
+        self.stdout.write(
+            f"latency: {full_seconds:.2f}s -> {plain_seconds:.2f}s "
+            f"({self.saved(full_seconds, plain_seconds)})"
+        )
+
+    def collect(self, paths):
+        for path in paths:
+            if os.path.isdir(path):
+                for dirpath, _, filenames in os.walk(path):
+                    for name in filenames:
+                        if name.endswith(".txt"):
+                            yield os.path.join(dirpath, name)
+            else:
+                yield path
+
+    def timed_improvement(self, client, essay, plain=False):
+        """Output tokens and seconds until the page has the whole result."""
+        payload = celpip_improve_payload(essay, wrap_input=True, plain=plain)
+        started = time.perf_counter()
+        response = client.create_claude_message(payload)
+        if response is None:
+            raise CommandError("The improvement call failed.")
+        if plain:
+            text = response["content"][0]["text"]
+            revised = split_sections(text).get("revised_text", "")
+            highlight(essay, revised)
+            change_table(essay, revised)
+        seconds = time.perf_counter() - started
+        return (response.get("usage") or {}).get("output_tokens") or 0, seconds
+
+    def saved(self, before, after):
+        if not before:
+            return "0% saved"
+        return f"{100 * (1 - after / before):.0f}% saved"
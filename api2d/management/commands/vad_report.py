@@ -0,0 +1,99 @@
+import mimetypes
+import os
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+
+from api2d.utilities import Api2dClient
+from api2d.vad import np, trim_upload
+
+AUDIO_EXTENSIONS = {".m4a", ".mp3", ".mp4", ".wav", ".webm"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Report how much silence trimming cuts from a corpus of recordings, "
+        "and optionally the speech-to-text latency with and without it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Audio files or directories.")
+        parser.add_argument(
+            "--api-key",
+            help="Transcribe the original and trimmed audio with this key and "
+            "compare latency.",
+        )
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("numpy is required for silence trimming.")
+        files = sorted(self.collect(options["paths"]))
+        if not files:
+            raise CommandError("No audio files found.")
+        client = None
+        if options["api_key"]:
+            client = Api2dClient(options["api_key"], settings.API2D_OPENAI_ENDPOINT)
+
+        total_original = total_trimmed = 0.0
+        latency_original = latency_trimmed = 0.0
+        for path in files:
+            with open(path, "rb") as f:
+                upload = SimpleUploadedFile(
+                    os.path.basename(path),
+                    f.read(),
+                    mimetypes.guess_type(path)[0] or "application/octet-stream",
+                )
+            trimmed = trim_upload(upload)
+            if trimmed is None:
+                self.stdout.write(f"{path}: not trimmed")
+                continue
+            total_original += trimmed.original_seconds
+            total_trimmed += trimmed.trimmed_seconds
+            line = (
+                f"{path}: {trimmed.original_seconds:.1f}s -> "
+                f"{trimmed.trimmed_seconds:.1f}s "
+                f"({self.cut(trimmed.original_seconds, trimmed.trimmed_seconds)})"
+            )
+            if client:
+                before = self.timed_transcription(client, upload)
+                after = self.timed_transcription(client, trimmed.audio)
+                latency_original += before
+                latency_trimmed += after
+                line += f", STT {before:.2f}s -> {after:.2f}s"
+            self.stdout.write(line)
+
+        self.stdout.write(
+            f"total: {total_original:.1f}s -> {total_trimmed:.1f}s "
+            f"({self.cut(total_original, total_trimmed)})"
+        )
+        if client:
+            self.stdout.write(
+                f"STT latency: {latency_original:.2f}s -> {latency_trimmed:.2f}s"
+            )
+
+    def collect(self, paths):
+        for path in paths:
+            if os.path.isdir(path):
+                for dirpath, _, filenames in os.walk(path):
+                    for name in filenames:
+                        if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                            yield os.path.join(dirpath, name)
+            else:
+                yield path
+
+    def timed_transcription(self, client, audio):
+        audio.seek(0)
+        started = time.perf_counter()
+        if (
+            client.transcribe_audio(audio, settings.API2D_OPENAI_STT_MODEL, "en")
+            is None
+        ):
+            raise CommandError(f"Transcription of {audio.name} failed.")
+        return time.perf_counter() - started
+
+    def cut(self, original, trimmed):
+        if not original:
+            return "0% cut"
+        return f"{100 * (1 - trimmed / original):.0f}% cut"
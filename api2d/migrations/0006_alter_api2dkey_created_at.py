@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api2d", "0005_alter_api2dkey_options_alter_api2dkey_user"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="api2dkey",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
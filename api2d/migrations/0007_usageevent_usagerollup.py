@@ -0,0 +1,138 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api2d", "0006_alter_api2dkey_created_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsageEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("endpoint", models.CharField(max_length=100)),
+                ("input_tokens", models.PositiveIntegerField(default=0)),
+                ("output_tokens", models.PositiveIntegerField(default=0)),
+                ("input_chars", models.PositiveIntegerField(default=0)),
+                ("output_chars", models.PositiveIntegerField(default=0)),
+                ("latency_ms", models.PositiveIntegerField(default=0)),
+                (
+                    "cost",
+                    models.DecimalField(
+                        decimal_places=4,
+                        default=0,
+                        help_text="Credits consumed, as observed from the balance before and after",
+                        max_digits=12,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "key",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="usage_events",
+                        to="api2d.api2dkey",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_events",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Usage Event",
+                "verbose_name_plural": "Usage Events",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "created_at"],
+                        name="api2d_usage_user_id_1a9e99_idx",
+                    ),
+                    models.Index(
+                        fields=["created_at"], name="api2d_usage_created_cfda31_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="UsageRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("model", models.CharField(max_length=100)),
+                ("requests", models.PositiveIntegerField(default=0)),
+                ("input_tokens", models.PositiveBigIntegerField(default=0)),
+                ("output_tokens", models.PositiveBigIntegerField(default=0)),
+                (
+                    "latency_ms",
+                    models.PositiveBigIntegerField(
+                        default=0,
+                        help_text="Sum of latencies, divide by requests for the mean",
+                    ),
+                ),
+                (
+                    "cost",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=14),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Usage Rollup",
+                "verbose_name_plural": "Usage Rollups",
+                "indexes": [
+                    models.Index(
+                        fields=["period", "bucket"],
+                        name="api2d_usage_period_c3842c_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("period", "bucket", "user", "model"),
+                        name="api2d_usagerollup_unique_bucket",
+                    )
+                ],
+            },
+        ),
+    ]
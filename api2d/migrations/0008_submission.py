@@ -0,0 +1,79 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:44
+
+import api2d.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api2d", "0007_usageevent_usagerollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Submission",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("speaking", "Speaking"), ("writing", "Writing")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "summary",
+                    models.CharField(
+                        blank=True,
+                        help_text="Start of the input, for listings",
+                        max_length=200,
+                    ),
+                ),
+                (
+                    "input_text",
+                    api2d.fields.CompressedTextField(blank=True, default=""),
+                ),
+                (
+                    "transcription",
+                    api2d.fields.CompressedTextField(blank=True, default=""),
+                ),
+                (
+                    "revised_text",
+                    api2d.fields.CompressedTextField(blank=True, default=""),
+                ),
+                ("feedback", api2d.fields.CompressedTextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="submissions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Submission",
+                "verbose_name_plural": "Submissions",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-created_at", "-id"],
+                        name="api2d_submission_page_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """RunSQL that only runs on one database vendor."""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, [self.vendor, *args], kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api2d", "0008_submission"),
+    ]
+
+    # Postgres indexes a tsvector column with a GIN index, SQLite
+    # (development) an FTS5 table keyed by submission id; see api2d.history.
+    operations = [
+        VendorRunSQL(
+            "postgresql",
+            sql=[
+                "ALTER TABLE api2d_submission ADD COLUMN search_vector tsvector",
+                "CREATE INDEX api2d_submission_search_idx ON api2d_submission "
+                "USING GIN (search_vector)",
+            ],
+            reverse_sql=[
+                "DROP INDEX api2d_submission_search_idx",
+                "ALTER TABLE api2d_submission DROP COLUMN search_vector",
+            ],
+        ),
+        VendorRunSQL(
+            "sqlite",
+            sql="CREATE VIRTUAL TABLE api2d_submission_fts "
+            "USING fts5(body, tokenize='porter')",
+            reverse_sql="DROP TABLE api2d_submission_fts",
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-19 05:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api2d", "0010_essaybatch"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KeyProvisioning",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("leased_until", models.DateTimeField()),
+                (
+                    "key",
+                    models.CharField(
+                        blank=True,
+                        help_text="The key created upstream, kept until its Api2dKey is saved",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="key_provisioning",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Key Provisioning",
+                "verbose_name_plural": "Key Provisionings",
+            },
+        ),
+    ]
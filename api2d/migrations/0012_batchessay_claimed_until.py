@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-19 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api2d", "0011_keyprovisioning"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batchessay",
+            name="claimed_until",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Lease of the worker calling upstream for the essay",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.1.6 on 2026-10-19 06:32
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api2d", "0012_batchessay_claimed_until"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecordingUpload",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("content_type", models.CharField(max_length=100)),
+                (
+                    "offset",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Bytes committed so far"
+                    ),
+                ),
+                (
+                    "checksum",
+                    models.BigIntegerField(
+                        default=0, help_text="CRC-32 of the committed bytes"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recording_uploads",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Recording Upload",
+                "verbose_name_plural": "Recording Uploads",
+            },
+        ),
+        migrations.CreateModel(
+            name="RecordingSlice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("offset", models.PositiveIntegerField()),
+                ("data", models.BinaryField()),
+                (
+                    "upload",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slices",
+                        to="api2d.recordingupload",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Recording Slice",
+                "verbose_name_plural": "Recording Slices",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("upload", "offset"), name="unique_recording_slice"
+                    )
+                ],
+            },
+        ),
+    ]
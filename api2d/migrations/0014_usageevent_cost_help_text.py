@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-19 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api2d", "0013_recordingupload"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usageevent",
+            name="cost",
+            field=models.DecimalField(
+                decimal_places=4,
+                default=0,
+                help_text="Credits consumed, priced from the token counts",
+                max_digits=12,
+            ),
+        ),
+    ]
@@ -0,0 +1,116 @@
+import logging
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .tokens import estimator
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+QUALITY = "quality"
+
+
+@dataclass
+class Route:
+    model: str
+    reason: str
+    tokens: int
+    predicted: float = None  # seconds, when there were measurements to go on
+
+
+def _key(model):
+    return f"model-latency:{model}"
+
+
+def record_latency(model, seconds, tokens):
+    """
+    Add a call's latency and input tokens to the model's recent
+    measurements. They are kept in the shared cache and drop out after
+    MODEL_ROUTING_WINDOW_SECONDS, so the window follows the load. Updates
+    are read-modify-write without a lock; a lost sample does not matter.
+    """
+    now = time.time()
+    samples = _samples(model, now)
+    samples.append((now, tokens, seconds))
+    cache.set(_key(model), samples[-200:], settings.MODEL_ROUTING_WINDOW_SECONDS)
+
+
+def _samples(model, now):
+    cutoff = now - settings.MODEL_ROUTING_WINDOW_SECONDS
+    # Samples of an older format are skipped
+    return [s for s in cache.get(_key(model), []) if len(s) == 3 and s[0] >= cutoff]
+
+
+def _fit(points):
+    """
+    Least-squares overhead (seconds per call) and rate (seconds per token)
+    of (tokens, seconds) points. With all points at one length there is no
+    telling them apart, and the whole latency is taken as the rate.
+    """
+    count = len(points)
+    mean_tokens = sum(t for t, _ in points) / count
+    mean_seconds = sum(s for _, s in points) / count
+    spread = sum((t - mean_tokens) ** 2 for t, _ in points)
+    if not spread:
+        return 0.0, mean_seconds / max(mean_tokens, 1)
+    rate = sum((t - mean_tokens) * (s - mean_seconds) for t, s in points) / spread
+    rate = max(rate, 0.0)
+    return max(mean_seconds - rate * mean_tokens, 0.0), rate
+
+
+def predicted_latency(model, tokens):
+    """
+    The MODEL_ROUTING_PERCENTILE latency of a call of `tokens` tokens on
+    `model`: a fixed overhead plus a rate per token, fitted to the recent
+    measurements, and the percentile of how far calls were above that fit.
+    None with fewer than 20 measurements, or none of at least half that
+    length to extrapolate from.
+    """
+    points = [(t, s) for _, t, s in _samples(model, time.time())]
+    if len(points) < 20 or tokens > 2 * max(t for t, _ in points):
+        return None
+    overhead, rate = _fit(points)
+    excess = sorted(s - overhead - rate * t for t, s in points)
+    index = int(len(excess) * settings.MODEL_ROUTING_PERCENTILE / 100)
+    return max(overhead + rate * tokens + excess[min(index, len(excess) - 1)], 0.0)
+
+
+def choose_model(text, group=None):
+    """
+    The Claude model for improving `text` for a user of `group`. Groups in
+    MODEL_ROUTING_GROUPS always get the model named there. Otherwise short
+    texts get the quality model, and longer ones too while its predicted
+    latency is within MODEL_ROUTING_TARGET_SECONDS; at peak times, when it
+    is not, they go to the fast model. Every decision is logged.
+    """
+    fast = settings.API2D_CLAUDE_MODEL
+    quality = settings.API2D_CLAUDE_QUALITY_MODEL or fast
+    tokens = estimator.estimate(text, quality)
+    choice = settings.MODEL_ROUTING_GROUPS.get(group)
+    if quality == fast:
+        route = Route(fast, "single model", tokens)
+    elif choice:
+        route = Route(quality if choice == QUALITY else fast, "group", tokens)
+    elif tokens <= settings.MODEL_ROUTING_SHORT_TOKENS:
+        route = Route(quality, "short input", tokens)
+    else:
+        predicted = predicted_latency(quality, tokens)
+        if predicted is None:
+            route = Route(quality, "no measurements", tokens)
+        elif predicted > settings.MODEL_ROUTING_TARGET_SECONDS:
+            route = Route(fast, "over latency target", tokens, predicted)
+        else:
+            route = Route(quality, "within latency target", tokens, predicted)
+    logger.info(
+        "Routed to %s (%s): %d tokens, group %s, predicted p%s %s",
+        route.model,
+        route.reason,
+        route.tokens,
+        group or "-",
+        settings.MODEL_ROUTING_PERCENTILE,
+        "-" if route.predicted is None else f"{route.predicted:.1f}s",
+    )
+    return route
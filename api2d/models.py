@@ -1,8 +1,13 @@
+import uuid
+
 from django.db import models
 from django.db.models import DateTimeField
+from django.utils import timezone
 from django.utils.functional import cached_property
 from datetime import timedelta
 
+from .fields import CompressedTextField
+
 # Create your models here.
 
 
@@ -21,7 +26,7 @@ class Api2dKey(models.Model):
     group = models.ForeignKey(
         Api2dGroup2ExpirationMapping, on_delete=models.CASCADE, related_name="api_keys"
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     expired_at = models.DateTimeField(null=True)
 
     class Meta:
@@ -46,3 +51,267 @@ class Api2dKey(models.Model):
             if not self.expired_at and self.group.validate_days:
                 self.expired_at = created_at + timedelta(days=self.group.validate_days)
         return super().save(*args, **kwargs)
+
+
+class KeyProvisioning(models.Model):
+    """
+    A key being created upstream for a user. The row is the lock: whoever
+    inserts it makes the upstream call, until `leased_until`; the others
+    wait for the Api2dKey to appear.
+    """
+
+    user = models.OneToOneField(
+        "auth.User", on_delete=models.CASCADE, related_name="key_provisioning"
+    )
+    leased_until = models.DateTimeField()
+    key = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="The key created upstream, kept until its Api2dKey is saved",
+    )
+
+    class Meta:
+        verbose_name = "Key Provisioning"
+        verbose_name_plural = "Key Provisionings"
+
+    def __str__(self):
+        return f"{self.user_id} until {self.leased_until:%Y-%m-%d %H:%M:%S}"
+
+
+class UsageEvent(models.Model):
+    """One upstream AI call made on behalf of a user."""
+
+    user = models.ForeignKey(
+        "auth.User", on_delete=models.CASCADE, related_name="usage_events"
+    )
+    key = models.ForeignKey(
+        Api2dKey, on_delete=models.SET_NULL, null=True, related_name="usage_events"
+    )
+    model = models.CharField(max_length=100)
+    endpoint = models.CharField(max_length=100)
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    input_chars = models.PositiveIntegerField(default=0)
+    output_chars = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    cost = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        default=0,
+        help_text="Credits consumed, priced from the token counts",
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Usage Event"
+        verbose_name_plural = "Usage Events"
+        indexes = [
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.model} @ {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class UsageRollup(models.Model):
+    """Hourly and daily totals of UsageEvent, maintained as events are flushed."""
+
+    PERIOD_HOUR = "hour"
+    PERIOD_DAY = "day"
+    PERIODS = [(PERIOD_HOUR, "Hour"), (PERIOD_DAY, "Day")]
+
+    period = models.CharField(max_length=4, choices=PERIODS)
+    bucket = models.DateTimeField()
+    user = models.ForeignKey(
+        "auth.User", on_delete=models.CASCADE, related_name="usage_rollups"
+    )
+    model = models.CharField(max_length=100)
+    requests = models.PositiveIntegerField(default=0)
+    input_tokens = models.PositiveBigIntegerField(default=0)
+    output_tokens = models.PositiveBigIntegerField(default=0)
+    latency_ms = models.PositiveBigIntegerField(
+        default=0, help_text="Sum of latencies, divide by requests for the mean"
+    )
+    cost = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+
+    class Meta:
+        verbose_name = "Usage Rollup"
+        verbose_name_plural = "Usage Rollups"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "bucket", "user", "model"],
+                name="api2d_usagerollup_unique_bucket",
+            )
+        ]
+        indexes = [models.Index(fields=["period", "bucket"])]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} {self.model}"
+
+
+class Submission(models.Model):
+    """A speaking or writing attempt with the feedback it received."""
+
+    KIND_SPEAKING = "speaking"
+    KIND_WRITING = "writing"
+    KINDS = [(KIND_SPEAKING, "Speaking"), (KIND_WRITING, "Writing")]
+
+    user = models.ForeignKey(
+        "auth.User", on_delete=models.CASCADE, related_name="submissions"
+    )
+    kind = models.CharField(max_length=10, choices=KINDS)
+    summary = models.CharField(
+        max_length=200, blank=True, help_text="Start of the input, for listings"
+    )
+    input_text = CompressedTextField()
+    transcription = CompressedTextField()
+    revised_text = CompressedTextField()
+    feedback = CompressedTextField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    # Large bodies that history listings do not need.
+    BODY_FIELDS = ["input_text", "transcription", "revised_text", "feedback"]
+
+    class Meta:
+        verbose_name = "Submission"
+        verbose_name_plural = "Submissions"
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="api2d_submission_page_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} @ {self.created_at:%Y-%m-%d %H:%M}"
+
+    def save(self, *args, **kwargs):
+        if not self.summary:
+            self.summary = (self.input_text or self.transcription)[:200]
+        return super().save(*args, **kwargs)
+
+    @property
+    def search_text(self):
+        return "\n".join(
+            text
+            for text in (
+                self.input_text,
+                self.transcription,
+                self.revised_text,
+                self.feedback,
+            )
+            if text
+        )
+
+
+class EssayBatch(models.Model):
+    """A set of essays uploaded together for feedback."""
+
+    user = models.ForeignKey(
+        "auth.User", on_delete=models.CASCADE, related_name="essay_batches"
+    )
+    name = models.CharField(max_length=200)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Last sign of life of the worker processing the batch",
+    )
+
+    class Meta:
+        verbose_name = "Essay Batch"
+        verbose_name_plural = "Essay Batches"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def is_finished(self):
+        return self.finished_at is not None
+
+
+class BatchEssay(models.Model):
+    """One essay of an EssayBatch; its status is the batch checkpoint."""
+
+    STATUS_PENDING = "pending"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUSES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    batch = models.ForeignKey(
+        EssayBatch, on_delete=models.CASCADE, related_name="essays"
+    )
+    position = models.PositiveIntegerField()
+    name = models.CharField(max_length=200)
+    essay = CompressedTextField()
+    revised_text = CompressedTextField()
+    feedback = CompressedTextField()
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_PENDING)
+    error = models.CharField(max_length=200, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Lease of the worker calling upstream for the essay",
+    )
+
+    class Meta:
+        verbose_name = "Batch Essay"
+        verbose_name_plural = "Batch Essays"
+        ordering = ["batch", "position"]
+        indexes = [models.Index(fields=["batch", "status"])]
+
+    def __str__(self):
+        return self.name
+
+
+class RecordingUpload(models.Model):
+    """
+    A recording uploaded in slices while it is being recorded. Kept in the
+    database, not on local disk, so that its slices may reach any instance.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        "auth.User", on_delete=models.CASCADE, related_name="recording_uploads"
+    )
+    name = models.CharField(max_length=100)
+    content_type = models.CharField(max_length=100)
+    offset = models.PositiveIntegerField(default=0, help_text="Bytes committed so far")
+    checksum = models.BigIntegerField(
+        default=0, help_text="CRC-32 of the committed bytes"
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Recording Upload"
+        verbose_name_plural = "Recording Uploads"
+
+    def __str__(self):
+        return f"{self.name} ({self.offset} bytes)"
+
+
+class RecordingSlice(models.Model):
+    """The bytes of a RecordingUpload from `offset` on."""
+
+    upload = models.ForeignKey(
+        RecordingUpload, on_delete=models.CASCADE, related_name="slices"
+    )
+    offset = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        verbose_name = "Recording Slice"
+        verbose_name_plural = "Recording Slices"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["upload", "offset"], name="unique_recording_slice"
+            )
+        ]
@@ -0,0 +1,109 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .breaker import UNAVAILABLE_MESSAGE
+from .models import Api2dGroup2ExpirationMapping, Api2dKey, KeyProvisioning
+from .utilities import Api2dClient
+
+logger = logging.getLogger(__name__)
+
+STILL_PROVISIONING_MESSAGE = (
+    "Your API key is still being created. Please reload the page in a moment."
+)
+
+
+def _acquire(user):
+    """
+    Take the provisioning lease of `user`: insert the row, or take over one
+    whose lease ran out because its request died. The unique user and the
+    conditional UPDATE make sure only one request wins.
+    """
+    now = timezone.now()
+    leased_until = now + timedelta(seconds=settings.KEY_PROVISIONING_LEASE_SECONDS)
+    try:
+        with transaction.atomic():
+            KeyProvisioning.objects.create(user=user, leased_until=leased_until)
+        return True
+    except IntegrityError:
+        return bool(
+            KeyProvisioning.objects.filter(user=user, leased_until__lt=now).update(
+                leased_until=leased_until
+            )
+        )
+
+
+def _provision(user):
+    """Create the key upstream and save it, holding the lease."""
+    provisioning = KeyProvisioning.objects.filter(user=user).first()
+    if provisioning is None:
+        # Deleted since we took it over: its previous holder finished after
+        # all, with the key or with a failure
+        api_key = Api2dKey.objects.filter(user=user).first()
+        if api_key is None:
+            raise ValueError(UNAVAILABLE_MESSAGE)
+        return api_key
+    key = provisioning.key
+    group = Api2dGroup2ExpirationMapping.objects.first()
+    if not key:
+        client = Api2dClient(settings.API2D_ADMIN_KEY, settings.API2D_API_ENDPOINT)
+        keys = client.call_custom_key_save(
+            type_id=group.type_id,
+            n=1,
+            timeout=(
+                settings.UPSTREAM_CONNECT_TIMEOUT,
+                settings.KEY_PROVISIONING_TIMEOUT,
+            ),
+        )
+        if not keys:
+            # api2d is down, or its circuit is open and we did not even try.
+            # Release the lease so the waiting requests get this answer.
+            KeyProvisioning.objects.filter(user=user).delete()
+            raise ValueError(UNAVAILABLE_MESSAGE)
+        key = keys[0]["key"]
+        # Kept before the Api2dKey is saved: a request taking over after
+        # this one died reuses it instead of creating another key.
+        KeyProvisioning.objects.filter(user=user).update(key=key)
+    try:
+        with transaction.atomic():
+            api_key = Api2dKey.objects.create(
+                key=key, user=user, group=group, created_at=timezone.now()
+            )
+            KeyProvisioning.objects.filter(user=user).delete()
+    except IntegrityError:
+        # Saved meanwhile by a request whose lease we took over as it expired
+        api_key = Api2dKey.objects.get(user=user)
+        KeyProvisioning.objects.filter(user=user).delete()
+    return api_key
+
+
+def provision_key(user):
+    """
+    The Api2dKey of `user`, created upstream if they have none. Only one
+    request per user makes the upstream call; concurrent ones (a second
+    tab, a retried page) wait for its key, or its failure, instead of
+    creating a key of their own. Raises ValueError with a message for the
+    user when the key could not be created.
+    """
+    deadline = time.monotonic() + settings.KEY_PROVISIONING_WAIT_SECONDS
+    while True:
+        api_key = Api2dKey.objects.filter(user=user).first()
+        if api_key:
+            return api_key
+        if _acquire(user):
+            return _provision(user)
+        if time.monotonic() >= deadline:
+            raise ValueError(STILL_PROVISIONING_MESSAGE)
+        time.sleep(settings.KEY_PROVISIONING_POLL_SECONDS)
+        if (
+            not KeyProvisioning.objects.filter(user=user).exists()
+            and not Api2dKey.objects.filter(user=user).exists()
+        ):
+            # The request we waited for failed; share its outcome rather
+            # than calling upstream again right away
+            logger.info("Key provisioning for user %s failed elsewhere", user.pk)
+            raise ValueError(UNAVAILABLE_MESSAGE)
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RecordingSlice, RecordingUpload
+
+SWEEP_KEY = "recordings:swept"
+
+
+class RecordingUploadError(Exception):
+    """A chunk that cannot be appended, with the state to resume from."""
+
+    def __init__(self, message, status, state=None):
+        super().__init__(message)
+        self.status = status
+        self.state = state
+
+
+class RecordingUploads:
+    """
+    Recordings uploaded in slices while they are being recorded. Each upload
+    is a RecordingUpload with its name, content type, committed length and
+    the CRC-32 of those bytes, and a RecordingSlice per slice. Both are in
+    the database, so the slices of one recording may reach any instance.
+
+    A slice names the offset it starts at and the CRC-32 of the whole upload
+    once it is appended, so a lost, repeated or corrupted slice is caught
+    before it gets into the audio. A slice is committed in one transaction
+    with the new length, under a row lock, so concurrent or half-written
+    slices cannot interleave. Uploads are only seen by their user and are
+    dropped after `ttl` seconds, by a sweep run at most every
+    `sweep_seconds`.
+    """
+
+    def __init__(self, ttl, sweep_seconds=10 * 60):
+        self.ttl = ttl
+        self.sweep_seconds = sweep_seconds
+
+    def _get(self, user_id, upload_id, lock=False):
+        uploads = RecordingUpload.objects.filter(
+            user_id=user_id,
+            created_at__gte=timezone.now() - timedelta(seconds=self.ttl),
+        )
+        if lock:
+            uploads = uploads.select_for_update()
+        try:
+            return uploads.get(pk=upload_id)
+        except (RecordingUpload.DoesNotExist, ValidationError):
+            raise RecordingUploadError("Unknown upload.", 404)
+
+    @staticmethod
+    def state(upload):
+        return {"offset": upload.offset, "checksum": f"{upload.checksum:08x}"}
+
+    def create(self, user_id, name, content_type):
+        if cache.add(SWEEP_KEY, 1, timeout=self.sweep_seconds):
+            self.sweep()
+        upload = RecordingUpload.objects.create(
+            user_id=user_id,
+            name=os.path.basename(name)[:100] or "recording.m4a",
+            content_type=content_type[:100] or "application/octet-stream",
+        )
+        return str(upload.pk), upload
+
+    def status(self, user_id, upload_id):
+        return self._get(user_id, upload_id)
+
+    def append(self, user_id, upload_id, offset, data, checksum):
+        """
+        Append a slice that starts at `offset`. `checksum` is the expected
+        CRC-32 of the upload after it, as hex. Returns the updated upload.
+        """
+        with transaction.atomic():
+            upload = self._get(user_id, upload_id, lock=True)
+            if offset != upload.offset:
+                raise RecordingUploadError(
+                    "The slice does not start where the upload ends.",
+                    409,
+                    self.state(upload),
+                )
+            if offset + len(data) > settings.TRANSCRIBE_MAX_UPLOAD_SIZE:
+                raise RecordingUploadError("Audio file is too large.", 413)
+            crc = zlib.crc32(data, upload.checksum)
+            if f"{crc:08x}" != checksum.lower():
+                raise RecordingUploadError(
+                    "The slice does not match its checksum.", 422, self.state(upload)
+                )
+            RecordingSlice.objects.create(upload=upload, offset=offset, data=data)
+            upload.offset = offset + len(data)
+            upload.checksum = crc
+            upload.save(update_fields=["offset", "checksum"])
+        return upload
+
+    def open(self, user_id, upload_id):
+        """The committed bytes as an uploaded file, and their SHA-256."""
+        upload = self._get(user_id, upload_id)
+        # Spilled to disk past 1 MB, like Django's own uploads
+        f = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        hasher = hashlib.sha256()
+        slices = (
+            upload.slices.filter(offset__lt=upload.offset)
+            .order_by("offset")
+            .values_list("data", flat=True)
+        )
+        for data in slices.iterator(chunk_size=20):
+            data = bytes(data)
+            hasher.update(data)
+            f.write(data)
+        f.seek(0)
+        audio = UploadedFile(
+            f, name=upload.name, content_type=upload.content_type, size=upload.offset
+        )
+        return audio, hasher.hexdigest()
+
+    def remove(self, user_id, upload_id):
+        RecordingUpload.objects.filter(user_id=user_id, pk=upload_id).delete()
+
+    def sweep(self):
+        """Remove uploads older than the TTL, e.g. abandoned recordings."""
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        RecordingUpload.objects.filter(created_at__lt=cutoff).delete()
+
+
+recording_uploads = RecordingUploads(settings.RECORDING_UPLOAD_TTL)
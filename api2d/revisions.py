@@ -0,0 +1,122 @@
+import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+
+# Words (with inner apostrophes, e.g. "don't") and single punctuation marks.
+# Whitespace is not a token, so reflowed lines are not changes.
+TOKEN_RE = re.compile(r"\w+(?:['’]\w+)*|[^\w\s]")
+
+CHANGED = "Changed"
+ADDED = "Added"
+REMOVED = "Removed"
+KINDS = {"insert": ADDED, "delete": REMOVED, "replace": CHANGED}
+
+
+@dataclass
+class Token:
+    text: str
+    start: int
+    end: int
+
+
+@dataclass
+class Change:
+    """One run of differing tokens, with the token ranges on both sides."""
+
+    kind: str
+    original: tuple  # (first, last) token indexes, last exclusive
+    revised: tuple
+
+
+def tokenize(text):
+    return [Token(m.group(), m.start(), m.end()) for m in TOKEN_RE.finditer(text)]
+
+
+def word_changes(original_tokens, revised_tokens):
+    """The runs of tokens that differ between the original and the revision."""
+    matcher = SequenceMatcher(
+        None,
+        [t.text for t in original_tokens],
+        [t.text for t in revised_tokens],
+        autojunk=False,
+    )
+    return [
+        Change(KINDS[tag], (i1, i2), (j1, j2))
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def _span(text, tokens, first, last):
+    """The text of tokens[first:last], with the whitespace between them."""
+    if first >= last:
+        return ""
+    return text[tokens[first].start : tokens[last - 1].end]
+
+
+def highlight(original, revised):
+    """
+    The revised text with every added or changed phrase wrapped in
+    backticks, the markup the pages already render as highlights.
+    Punctuation-only changes are left unmarked.
+    """
+    revised = revised.replace("`", "")
+    revised_tokens = tokenize(revised)
+    changes = word_changes(tokenize(original), revised_tokens)
+    parts, position = [], 0
+    for change in changes:
+        first, last = change.revised
+        phrase = _span(revised, revised_tokens, first, last)
+        if not re.search(r"\w", phrase):
+            continue
+        start, end = revised_tokens[first].start, revised_tokens[last - 1].end
+        parts.append(revised[position:start])
+        parts.append(f"`{phrase}`")
+        position = end
+    parts.append(revised[position:])
+    return "".join(parts)
+
+
+def _cell(text):
+    return " ".join(text.split()).replace("|", "\\|")
+
+
+def in_context(text, tokens, first, last, context):
+    """The tokens first:last in backticks, between `context` tokens each side."""
+    start = max(0, first - context)
+    # Start the context at a word, not at the end of the previous sentence
+    while start < first and not re.match(r"\w", tokens[start].text):
+        start += 1
+    before = _span(text, tokens, start, first)
+    changed = _span(text, tokens, first, last)
+    after = _span(text, tokens, last, min(len(tokens), last + context))
+    middle = f"`{changed}`" if changed else "…"
+    return _cell(" ".join(part for part in (before, middle, after) if part))
+
+
+def change_table(original, revised, context=3, max_rows=30):
+    """
+    A Markdown table of the word-level changes, one row per change with a
+    few words of context, in the layout of the grammar feedback the model
+    used to write. "No errors found" when the texts only differ in spacing.
+    """
+    revised = revised.replace("`", "")
+    original_tokens, revised_tokens = tokenize(original), tokenize(revised)
+    changes = word_changes(original_tokens, revised_tokens)
+    if not changes:
+        return "No errors found"
+    rows = [
+        "| Input | Improved | Explanation |",
+        "|-----------|---------|-------------|",
+    ]
+    for change in changes[:max_rows]:
+        rows.append(
+            "| {} | {} | {} |".format(
+                in_context(original, original_tokens, *change.original, context),
+                in_context(revised, revised_tokens, *change.revised, context),
+                change.kind,
+            )
+        )
+    if len(changes) > max_rows:
+        rows.append(f"| … | … | {len(changes) - max_rows} more changes |")
+    return "\n".join(rows)
@@ -0,0 +1,66 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .breaker import OPEN, CircuitBreaker
+
+
+def endpoint_list(value):
+    """An endpoint setting as a list; a single URL is a list of one."""
+    if isinstance(value, str):
+        value = [value]
+    return [url.rstrip("/") for url in value]
+
+
+class EndpointRouter:
+    """
+    Orders equivalent upstream endpoints by their recent latency. Each
+    endpoint has an exponentially weighted moving average of its response
+    time, kept in the shared cache so every gunicorn worker routes on what
+    all of them observed. Endpoints whose circuit breaker is open go last.
+
+    Updates are read-modify-write without a lock; a lost update between
+    two workers only delays the average by one sample.
+    """
+
+    def __init__(self, endpoints):
+        self.endpoints = endpoint_list(endpoints)
+
+    def _key(self, url):
+        return "routing:" + hashlib.md5(url.encode("utf-8")).hexdigest()
+
+    def _states(self):
+        keys = {self._key(url): url for url in self.endpoints}
+        found = cache.get_many(keys)
+        return {url: found.get(key, {}) for key, url in keys.items()}
+
+    def candidates(self):
+        """Endpoints to try, best first. Open circuits come last."""
+        states = self._states()
+
+        def rank(url):
+            down = CircuitBreaker(url).state() == OPEN
+            # Endpoints without a sample yet go first, to get measured.
+            return (down, states[url].get("ewma_ms", 0))
+
+        return sorted(self.endpoints, key=rank)
+
+    def best(self):
+        return self.candidates()[0]
+
+    def record_success(self, url, latency_ms):
+        key = self._key(url)
+        state = cache.get(key, {})
+        ewma = state.get("ewma_ms")
+        alpha = settings.UPSTREAM_EWMA_ALPHA
+        state["ewma_ms"] = (
+            latency_ms if ewma is None else alpha * latency_ms + (1 - alpha) * ewma
+        )
+        cache.set(key, state, timeout=None)
+
+    def stats(self):
+        return {
+            url: {**state, "circuit": CircuitBreaker(url).state()}
+            for url, state in self._states().items()
+        }
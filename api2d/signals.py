@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .history import index_submission, unindex_submission
+from .models import Submission
+
+
+@receiver(post_save, sender=Submission)
+def submission_saved(sender, instance, **kwargs):
+    """Keep the full-text index in step with the compressed text columns."""
+    index_submission(instance)
+
+
+@receiver(post_delete, sender=Submission)
+def submission_deleted(sender, instance, **kwargs):
+    unindex_submission(instance.pk)
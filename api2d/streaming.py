@@ -0,0 +1,289 @@
+import json
+import logging
+from dataclasses import dataclass
+
+from . import grammar
+from .revisions import change_table, highlight
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ("revised_text", "grammar_focused_feedback")
+
+SECTION_START = "section_start"
+SECTION_DELTA = "section_delta"
+SECTION_END = "section_end"
+# The whole text of a section, replacing what was streamed so far
+SECTION_REPLACE = "section_replace"
+# The findings of the local grammar check, sent before the model's answer
+GRAMMAR_CHECK = "grammar_check"
+# The answer is unusable, e.g. cut off at max_tokens; the sections streamed
+# so far are still closed and `done` still follows
+ERROR = "error"
+
+TRUNCATED_MESSAGE = (
+    "The answer was cut off because it got too long. "
+    "Please try again with a shorter text."
+)
+
+
+@dataclass
+class SectionEvent:
+    type: str
+    section: str
+    text: str = ""
+
+    def to_sse(self):
+        data = json.dumps({"section": self.section, "text": self.text})
+        return f"event: {self.type}\ndata: {data}\n\n"
+
+
+class SectionStreamParser:
+    """
+    Splits streamed model output into the sections of the CELPIP prompt as
+    it arrives. `feed` takes each text chunk and returns the events that
+    chunk completes: section_start when an opening tag is seen, section_delta
+    for text inside a section and section_end on the closing tag.
+
+    A tag may be split over several chunks, so a trailing "<..." that could
+    still become a known tag is held back until the next chunk decides it.
+    Text outside the known sections is dropped. The prompt prefills the
+    first opening tag, so the stream can start already inside a section,
+    and the final closing tag is the stop sequence, which the API never
+    sends; `close` ends whatever section is still open.
+    """
+
+    def __init__(self, sections=SECTIONS, initial_section=None):
+        self.tags = {}
+        for name in sections:
+            self.tags[f"<{name}>"] = (SECTION_START, name)
+            self.tags[f"</{name}>"] = (SECTION_END, name)
+        self.buffer = ""
+        self.section = None
+        self.events = []
+        if initial_section:
+            self._start(initial_section)
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        while self.buffer:
+            lt = self.buffer.find("<")
+            if lt == -1:
+                self._text(self.buffer)
+                self.buffer = ""
+                break
+            if lt:
+                self._text(self.buffer[:lt])
+                self.buffer = self.buffer[lt:]
+            tag = self._match_tag()
+            if tag is None:
+                # Could still become a tag once more text arrives.
+                break
+            if tag:
+                self.buffer = self.buffer[len(tag) :]
+                kind, name = self.tags[tag]
+                if kind == SECTION_START:
+                    self._start(name)
+                elif name == self.section:
+                    self._end()
+            else:
+                # A "<" that is not one of our tags, e.g. in the feedback HTML.
+                self._text("<")
+                self.buffer = self.buffer[1:]
+        return self._drain()
+
+    def close(self):
+        """Flush held-back text and end the open section, if any."""
+        if self.buffer:
+            self._text(self.buffer)
+            self.buffer = ""
+        if self.section:
+            self._end()
+        return self._drain()
+
+    def _match_tag(self):
+        """The complete tag at the start of the buffer, "" if it cannot be
+        one, or None if it is a prefix of one."""
+        prefix = False
+        for tag in self.tags:
+            if self.buffer.startswith(tag):
+                return tag
+            if tag.startswith(self.buffer):
+                prefix = True
+        return None if prefix else ""
+
+    def _start(self, name):
+        if self.section:
+            self._end()
+        self.section = name
+        self.events.append(SectionEvent(SECTION_START, name))
+
+    def _end(self):
+        self.events.append(SectionEvent(SECTION_END, self.section))
+        self.section = None
+
+    def _text(self, text):
+        if not self.section or not text:
+            return
+        last = self.events[-1] if self.events else None
+        if last and last.type == SECTION_DELTA and last.section == self.section:
+            last.text += text
+        else:
+            self.events.append(SectionEvent(SECTION_DELTA, self.section, text))
+
+    def _drain(self):
+        events, self.events = self.events, []
+        return events
+
+
+def anthropic_text_deltas(lines, usage=None):
+    """
+    Reads the server-sent events of a streaming Anthropic Messages response
+    and yields ("text", chunk) for each text delta and ("usage", dict) with
+    the token counts once the message is complete. If the model stopped at
+    max_tokens, ("truncated", stop_reason) comes right before the usage.
+    The counts are collected in `usage`, if given, so a caller that stops
+    reading early still has those seen so far.
+    """
+    usage = {} if usage is None else usage
+    stop_reason = None
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        event = json.loads(line[len("data:") :])
+        kind = event.get("type")
+        if kind == "content_block_delta":
+            text = event.get("delta", {}).get("text")
+            if text:
+                yield "text", text
+        elif kind == "message_start":
+            usage.update(event.get("message", {}).get("usage") or {})
+        elif kind == "message_delta":
+            usage.update(event.get("usage") or {})
+            stop_reason = event.get("delta", {}).get("stop_reason") or stop_reason
+        elif kind == "message_stop":
+            break
+    if stop_reason == "max_tokens":
+        yield "truncated", stop_reason
+    yield "usage", usage
+
+
+def _done(usage, model):
+    data = {"usage": usage}
+    if model:
+        data["model"] = model
+    return f"event: done\ndata: {json.dumps(data)}\n\n"
+
+
+def _error(message):
+    data = {"error": message}
+    return f"event: {ERROR}\ndata: {json.dumps(data)}\n\n"
+
+
+def _truncated(model):
+    logger.warning("Improvement by %s was cut off at max_tokens", model)
+    return _error(TRUNCATED_MESSAGE)
+
+
+def _grammar_check(original, findings):
+    data = {"count": len(findings), "table": grammar.table(original, findings)}
+    return f"event: {GRAMMAR_CHECK}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_sections(
+    lines, initial_section=SECTIONS[0], model=None, original=None, on_usage=None
+):
+    """
+    Turns a streaming Anthropic response into section events formatted as
+    server-sent events, followed by a `done` event carrying the token usage
+    and the model, if given. `on_usage` is called with the usage and the
+    length of the generated text when the stream ends, also when it is
+    closed early, with the counts seen until then. An answer cut off at
+    max_tokens gets an `error` event before its sections close.
+
+    With the `original` text and CELPIP_LOCAL_GRAMMAR_CHECK on, the findings
+    of the local grammar check come first, in a grammar_check event, and
+    once the model's feedback is complete it is replaced by the feedback
+    with those findings merged in.
+    """
+    feedback_section = SECTIONS[1]
+    findings = grammar.local_findings(original)
+    if findings:
+        yield _grammar_check(original, findings)
+    parser = SectionStreamParser(initial_section=initial_section)
+    feedback = ""
+    usage = {}
+    chars = 0
+    try:
+        for kind, value in anthropic_text_deltas(lines, usage):
+            if kind == "truncated":
+                yield _truncated(model)
+                continue
+            if kind == "text":
+                chars += len(value)
+                events = parser.feed(value)
+            else:
+                events = parser.close()
+            for event in events:
+                if event.section == feedback_section and event.type == SECTION_DELTA:
+                    feedback += event.text
+                elif findings and event == SectionEvent(SECTION_END, feedback_section):
+                    yield SectionEvent(
+                        SECTION_REPLACE,
+                        feedback_section,
+                        grammar.merge(feedback, original, findings),
+                    ).to_sse()
+                yield event.to_sse()
+            if kind == "usage":
+                yield _done(value, model)
+    finally:
+        if on_usage:
+            on_usage(usage, chars)
+
+
+def stream_revision(lines, original, model=None, on_usage=None):
+    """
+    Like `stream_sections`, for a response with only the plain revised text
+    (`celpip_improve_payload(plain=True)`). The revised text is streamed as
+    it comes; once it is complete it is replaced by the same text with the
+    changes highlighted, and the feedback section is the table of changes,
+    both from a word diff against the `original`, with the findings of the
+    local grammar check merged in.
+    """
+    name, feedback = SECTIONS
+    findings = grammar.local_findings(original)
+    if findings:
+        yield _grammar_check(original, findings)
+    parser = SectionStreamParser(sections=(name,), initial_section=name)
+    revised = ""
+    usage = {}
+    chars = 0
+    try:
+        for kind, value in anthropic_text_deltas(lines, usage):
+            if kind == "truncated":
+                yield _truncated(model)
+                continue
+            if kind == "text":
+                chars += len(value)
+                events = parser.feed(value)
+            else:
+                events = parser.close()
+            for event in events:
+                if event.type == SECTION_DELTA:
+                    revised += event.text
+                elif event.type == SECTION_END:
+                    yield SectionEvent(
+                        SECTION_REPLACE, name, highlight(original, revised)
+                    ).to_sse()
+                yield event.to_sse()
+                if event.type == SECTION_END:
+                    table = grammar.merge(
+                        change_table(original, revised), original, findings
+                    )
+                    yield SectionEvent(SECTION_START, feedback).to_sse()
+                    yield SectionEvent(SECTION_DELTA, feedback, table).to_sse()
+                    yield SectionEvent(SECTION_END, feedback).to_sse()
+            if kind == "usage":
+                yield _done(value, model)
+    finally:
+        if on_usage:
+            on_usage(usage, chars)
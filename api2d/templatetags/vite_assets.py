@@ -0,0 +1,78 @@
+import hashlib
+import json
+from functools import lru_cache
+
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@lru_cache(maxsize=1)
+def _cached_manifest():
+    return _read_manifest()
+
+
+def _read_manifest():
+    """The manifest and the MD5 of its file, or ({}, "") if it is unreadable."""
+    try:
+        with open(settings.VITE_MANIFEST_PATH, "rb") as f:
+            data = f.read()
+        return json.loads(data), hashlib.md5(data).hexdigest()
+    except (OSError, ValueError):
+        return {}, ""
+
+
+def _manifest():
+    # Read once per process, except in DEBUG where `npm run watch` rewrites
+    # the manifest between requests.
+    if settings.DEBUG:
+        return _read_manifest()
+    return _cached_manifest()
+
+
+def load_manifest():
+    """Returns the Vite build manifest."""
+    return _manifest()[0]
+
+
+def manifest_version():
+    """A hash of the Vite build manifest, which changes with every build."""
+    return _manifest()[1]
+
+
+def _collect(manifest, key, scripts, styles, seen):
+    if key in seen or key not in manifest:
+        return
+    seen.add(key)
+    chunk = manifest[key]
+    scripts.append(chunk["file"])
+    styles.extend(chunk.get("css", []))
+    for imported in chunk.get("imports", []):
+        _collect(manifest, imported, scripts, styles, seen)
+
+
+@register.simple_tag
+def vite_preload(*entries):
+    """
+    Emits modulepreload and stylesheet links for the chunks a page mounts,
+    e.g. {% vite_preload "src/django-pages/api2d/CelpipSpeaking.svelte" %}.
+
+    URLs are built from the Vite base rather than {% static %}, because the
+    browser imports chunks by their Vite-hashed names and the preload has to
+    hit the same URL to be reused.
+    """
+    manifest = load_manifest()
+    scripts, styles, seen = [], [], set()
+    for entry in entries:
+        _collect(manifest, entry, scripts, styles, seen)
+
+    base = settings.STATIC_URL + "frontend/"
+    links = format_html_join(
+        "\n", '<link rel="stylesheet" href="{}{}">', ((base, f) for f in styles)
+    )
+    preloads = format_html_join(
+        "\n", '<link rel="modulepreload" href="{}{}">', ((base, f) for f in scripts)
+    )
+    return format_html("{}\n{}", links, preloads)
@@ -0,0 +1,83 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UsageEvent
+
+IMPROVE = "improve"
+REVISE = "revise"
+
+
+class InputTooLong(ValueError):
+    """A text whose estimated size is over CELPIP_MAX_INPUT_TOKENS."""
+
+
+class TokenEstimator:
+    """
+    Estimates the tokens of a text from its length, without a tokenizer or
+    a network call. The characters per token of each model are calibrated
+    from the recorded usage events, which keep both the characters sent and
+    the tokens the API counted, and cached for `ttl` seconds. Until a model
+    has `min_events` events the `default` ratio is used.
+    """
+
+    def __init__(self, default=3.5, sample=500, min_events=20, ttl=3600):
+        self.default = default
+        self.sample = sample
+        self.min_events = min_events
+        self.ttl = ttl
+
+    def calibrate(self, model):
+        events = list(
+            UsageEvent.objects.filter(
+                model=model, input_tokens__gt=0, input_chars__gt=0
+            )
+            .order_by("-created_at")
+            .values_list("input_chars", "input_tokens")[: self.sample]
+        )
+        if len(events) < self.min_events:
+            return self.default
+        chars = sum(c for c, _ in events)
+        tokens = sum(t for _, t in events)
+        # Guard against events recorded with the wrong character counts
+        return min(max(chars / tokens, 1.5), 6.0)
+
+    def chars_per_token(self, model):
+        return cache.get_or_set(
+            f"tokens:chars-per-token:{model}",
+            lambda: self.calibrate(model),
+            self.ttl,
+        )
+
+    def estimate(self, text, model):
+        if not text:
+            return 0
+        return math.ceil(len(text) / self.chars_per_token(model))
+
+
+estimator = TokenEstimator(ttl=settings.TOKEN_CALIBRATION_SECONDS)
+
+
+def check_input(text, model):
+    """Raise InputTooLong before a text too long to improve goes upstream."""
+    tokens = estimator.estimate(text, model)
+    if tokens > settings.CELPIP_MAX_INPUT_TOKENS:
+        raise InputTooLong(
+            f"The text is too long ({tokens} tokens, at most "
+            f"{settings.CELPIP_MAX_INPUT_TOKENS})."
+        )
+    return tokens
+
+
+def max_tokens_for(text, model, task=IMPROVE):
+    """
+    The output budget of an improvement of `text`: the revision is about as
+    long as the text plus what the model adds to it, and the feedback of
+    the IMPROVE task comes on top, so the budget is a multiple of the input
+    plus a fixed overhead, within CELPIP_MAX_TOKENS_RANGE.
+    """
+    ratio, overhead = settings.CELPIP_MAX_TOKENS[task]
+    low, high = settings.CELPIP_MAX_TOKENS_RANGE
+    budget = math.ceil(estimator.estimate(text, model) * ratio) + overhead
+    return min(max(budget, low), high)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from django_project.cache_utils import incr
+
+logger = logging.getLogger(__name__)
+
+HITS_KEY = "transcripts:hits"
+MISSES_KEY = "transcripts:misses"
+BYTES_KEY = "transcripts:bytes"
+SWEEP_KEY = "transcripts:swept"
+
+
+class TranscriptStore:
+    """
+    Content-addressed store of speech-to-text results on the local disk.
+    Entries are keyed by the SHA-256 of the audio plus the model and language
+    used, so an identical re-upload maps to the same file. The file mtime is
+    the last access time: hits touch it, and once the store is over
+    `max_bytes` the least recently used entries are removed. Entries older
+    than `ttl` seconds are dropped regardless.
+
+    Eviction walks the whole store, so it does not run on every write: a
+    byte counter in the shared cache triggers it once the store may be over
+    budget, and expired entries are swept at most every `sweep_seconds`.
+    """
+
+    def __init__(self, root, ttl, max_bytes, sweep_seconds=60 * 60):
+        self.root = os.fspath(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_seconds = sweep_seconds
+
+    def _path(self, digest, model, language):
+        key = hashlib.sha256(f"{digest}:{model}:{language}".encode("utf-8"))
+        name = key.hexdigest()
+        return os.path.join(self.root, name[:2], name + ".json")
+
+    def get(self, digest, model, language):
+        path = self._path(digest, model, language)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            incr(MISSES_KEY)
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            self._remove(path)
+            incr(MISSES_KEY)
+            return None
+        os.utime(path)
+        incr(HITS_KEY)
+        return entry["result"]
+
+    def put(self, digest, model, language, result):
+        path = self._path(digest, model, language)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename, so concurrent readers never
+        # see a partial entry.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"created": time.time(), "result": result}, f)
+            size = f.tell()
+        os.replace(tmp, path)
+        # Without the counter (a cleared cache) the size is unknown: walk
+        total = incr(BYTES_KEY, size) if cache.get(BYTES_KEY) is not None else None
+        if total is None or total > self.max_bytes:
+            self.evict()
+        elif cache.add(SWEEP_KEY, 1, timeout=self.sweep_seconds):
+            # The first write after the interval, in whichever worker
+            self.evict()
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Remove expired entries, then the least recently used over budget."""
+        now = time.time()
+        entries = []
+        for path, size, accessed in self._entries():
+            # An entry not read for longer than the TTL is expired too; this
+            # avoids opening every file to read its creation time.
+            if now - accessed > self.ttl:
+                self._remove(path)
+            else:
+                entries.append((accessed, size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+        # Entries written meanwhile by other workers are counted next time
+        cache.set(BYTES_KEY, total, timeout=None)
+        cache.set(SWEEP_KEY, 1, timeout=self.sweep_seconds)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        hits = cache.get(HITS_KEY, 0)
+        misses = cache.get(MISSES_KEY, 0)
+        sizes = [size for _, size, _ in self._entries()]
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(sizes),
+            "bytes": sum(sizes),
+            "max_bytes": self.max_bytes,
+        }
+
+
+transcript_store = TranscriptStore(
+    root=settings.TRANSCRIPT_CACHE_DIR,
+    ttl=settings.TRANSCRIPT_CACHE_TTL,
+    max_bytes=settings.TRANSCRIPT_CACHE_MAX_BYTES,
+)
@@ -0,0 +1,28 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Computes the SHA-256 of each uploaded file while it is being received,
+    so the digest is ready without reading the file back. Chunks are passed
+    on unchanged to the handlers after it, which still store the file.
+    Digests end up in `request.upload_digests`, keyed by field name.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        request.upload_digests = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_digests[self.field_name] = self.hasher.hexdigest()
+        return None
@@ -2,15 +2,51 @@ from django.urls import path
 from .views import (
     ApiKeyView,
     ApiKeyDeleteView,
+    api_key_credits,
     celpip_writting,
     celpip_speaking,
+    usage_event,
+    submission_create,
+    submission_history,
+    submission_detail,
+    transcribe_audio,
+    transcribe_stats,
+    recording_create,
+    recording_upload,
+    recording_transcribe,
+    improve_stream,
+    EssayBatchView,
+    batch_detail,
+    batch_download,
 )
 
 app_name = "api2d"
 
 urlpatterns = [
     path("api-key/", ApiKeyView.as_view(), name="api-key"),
+    path("api-key/credits/", api_key_credits, name="api-key-credits"),
     path("api-key/delete/", ApiKeyDeleteView.as_view(), name="api-key-delete"),
     path("celpip/speaking/", celpip_speaking, name="celpip-speaking"),
     path("celpip/writting/", celpip_writting, name="celpip-writing"),
+    path("celpip/transcribe/", transcribe_audio, name="transcribe"),
+    path("celpip/recordings/", recording_create, name="recording-create"),
+    path(
+        "celpip/recordings/<uuid:upload_id>/",
+        recording_upload,
+        name="recording-upload",
+    ),
+    path(
+        "celpip/recordings/<uuid:upload_id>/transcribe/",
+        recording_transcribe,
+        name="recording-transcribe",
+    ),
+    path("celpip/improve/stream/", improve_stream, name="improve-stream"),
+    path("celpip/transcribe/stats/", transcribe_stats, name="transcribe-stats"),
+    path("usage/", usage_event, name="usage"),
+    path("batches/", EssayBatchView.as_view(), name="batch-list"),
+    path("batches/<int:pk>/", batch_detail, name="batch-detail"),
+    path("batches/<int:pk>/download/", batch_download, name="batch-download"),
+    path("history/", submission_history, name="submission-list"),
+    path("history/new/", submission_create, name="submission-create"),
+    path("history/<int:pk>/", submission_detail, name="submission-detail"),
 ]
@@ -0,0 +1,217 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F
+
+from .models import Api2dKey, UsageEvent, UsageRollup
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FIELDS = ("requests", "input_tokens", "output_tokens", "latency_ms", "cost")
+COUNT_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "input_chars",
+    "output_chars",
+    "latency_ms",
+)
+# PositiveIntegerField on Postgres, the narrowest of the backends
+MAX_COUNT = 2**31 - 1
+COST_PLACES = Decimal("0.0001")
+
+
+def _bucket(created_at, period):
+    hour = created_at.replace(minute=0, second=0, microsecond=0)
+    if period == UsageRollup.PERIOD_DAY:
+        return hour.replace(hour=0)
+    return hour
+
+
+def update_rollups(events):
+    """
+    Add a batch of events to the hourly and daily rollups. Each bucket is a
+    single UPDATE ... SET x = x + n, with an INSERT for new buckets, so
+    concurrent flushes from several workers add up instead of overwriting.
+    """
+    totals = defaultdict(Counter)
+    for event in events:
+        for period, _ in UsageRollup.PERIODS:
+            key = (
+                period,
+                _bucket(event.created_at, period),
+                event.user_id,
+                event.model,
+            )
+            total = totals[key]
+            total["requests"] += 1
+            total["input_tokens"] += event.input_tokens
+            total["output_tokens"] += event.output_tokens
+            total["latency_ms"] += event.latency_ms
+            total["cost"] += event.cost
+
+    for (period, bucket, user_id, model), total in totals.items():
+        lookup = dict(period=period, bucket=bucket, user_id=user_id, model=model)
+        increments = {field: F(field) + total[field] for field in ROLLUP_FIELDS}
+        if UsageRollup.objects.filter(**lookup).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                UsageRollup.objects.create(
+                    **lookup, **{field: total[field] for field in ROLLUP_FIELDS}
+                )
+        except IntegrityError:
+            # Another worker created the bucket in the meantime.
+            UsageRollup.objects.filter(**lookup).update(**increments)
+
+
+class UsageBuffer:
+    """
+    Collects UsageEvent instances in memory and writes them with one
+    bulk_create from a background thread, so recording usage never waits on
+    the database. Events are flushed every `flush_seconds`, as soon as
+    `max_events` are queued, and at interpreter exit. With `flush_seconds=0`
+    no thread is started and a full buffer is flushed by the caller instead.
+    """
+
+    def __init__(self, max_events, flush_seconds):
+        self.max_events = max_events
+        self.flush_seconds = flush_seconds
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        # Called again in a forked worker: threads and locks do not survive fork.
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._events = []
+        self._thread = None
+
+    def add(self, event):
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            self._events.append(event)
+            full = len(self._events) >= self.max_events
+            if self._thread is None and self.flush_seconds:
+                self._thread = threading.Thread(
+                    target=self._run, name="usage-buffer", daemon=True
+                )
+                self._thread.start()
+        if full and not self.flush_seconds:
+            self.flush()
+        elif full:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush usage events")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+
+        try:
+            key_ids = dict(
+                Api2dKey.objects.filter(
+                    user_id__in={event.user_id for event in events}
+                ).values_list("user_id", "id")
+            )
+        except DatabaseError:
+            # The database is unreachable; keep the batch for the next flush.
+            logger.exception("Re-queued %s usage events", len(events))
+            with self._lock:
+                self._events[:0] = events
+            return 0
+        for event in events:
+            event.key_id = key_ids.get(event.user_id)
+
+        try:
+            with transaction.atomic():
+                UsageEvent.objects.bulk_create(events)
+                update_rollups(events)
+            return len(events)
+        except (DatabaseError, ArithmeticError, ValueError):
+            logger.exception("Bulk write of %s usage events failed", len(events))
+        # Write them one by one, so an event the database refuses does not
+        # take the rest of the batch down with it.
+        saved = 0
+        for event in events:
+            event.pk = None
+            event._state.adding = True
+            try:
+                with transaction.atomic():
+                    event.save(force_insert=True)
+                    update_rollups([event])
+            except (DatabaseError, ArithmeticError, ValueError):
+                logger.exception(
+                    "Dropped usage event of user %s: %s",
+                    event.user_id,
+                    {name: getattr(event, name) for name in COUNT_FIELDS + ("cost",)},
+                )
+                continue
+            saved += 1
+        return saved
+
+
+buffer = UsageBuffer(
+    max_events=settings.USAGE_BUFFER_MAX_EVENTS,
+    flush_seconds=settings.USAGE_BUFFER_FLUSH_SECONDS,
+)
+
+
+def usage_cost(model, input_tokens, output_tokens):
+    """Credits of a call at the USAGE_MODEL_PRICES of its model (0 if unlisted)."""
+    prices = settings.USAGE_MODEL_PRICES.get(model)
+    if prices is None:
+        return Decimal(0)
+    input_price, output_price = (Decimal(str(price)) for price in prices)
+    return (input_price * input_tokens + output_price * output_tokens) / 1_000_000
+
+
+def usage_event(**fields):
+    """
+    A UsageEvent of `fields` that fits its columns, priced with `usage_cost`
+    unless a cost is given. Raises ValidationError for values the database
+    would refuse: counts out of range, or a cost that is not finite or has
+    too many digits.
+    """
+    event = UsageEvent(**fields)
+    errors = {
+        name: f"Must be between 0 and {MAX_COUNT}."
+        for name in COUNT_FIELDS
+        if not 0 <= getattr(event, name) <= MAX_COUNT
+    }
+    if errors:
+        raise ValidationError(errors)
+    if "cost" not in fields:
+        event.cost = usage_cost(event.model, event.input_tokens, event.output_tokens)
+    cost = Decimal(event.cost)
+    if cost.is_finite() and cost.adjusted() < 8:
+        event.cost = cost.quantize(COST_PLACES)
+    event.clean_fields(exclude=["user", "key", "created_at"])
+    return event
+
+
+def record_usage(**fields):
+    """
+    Queue a usage event; it is written on the next buffer flush. Raises
+    ValidationError, see `usage_event`.
+    """
+    buffer.add(usage_event(**fields))
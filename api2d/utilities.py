@@ -1,26 +1,181 @@
 import requests
+import urllib3
 import json
+import time
 from dataclasses import dataclass
 from datetime import datetime
 import logging
 
+from django.conf import settings
+
+from .breaker import CircuitBreaker, UpstreamUnavailable
+from .hedging import HedgeBudget, LatencyTracker, hedged
+from .routing import EndpointRouter
+from .tokens import IMPROVE, REVISE, max_tokens_for
+
+# Per process, like the thread pool hedges run on
+_hedge_latency = {}
+_hedge_budget = HedgeBudget()
+
+
+def celpip_improve_payload(text, wrap_input=False, plain=False, model=None):
+    """
+    Claude Messages payload asking for the revised text and the feedback of
+    a CELPIP answer. Written essays are wrapped in <user_input>, like the
+    writing page always did; speaking transcriptions are sent as they are.
+    With `plain` the model is only asked for the revised text, without
+    highlights or feedback, which are then worked out by `api2d.revisions`.
+    max_tokens is sized from the length of the text. `model` is the one
+    chosen by `api2d.model_routing`, API2D_CLAUDE_MODEL by default.
+    """
+    model = model or settings.API2D_CLAUDE_MODEL
+    max_tokens = max_tokens_for(text, model, REVISE if plain else IMPROVE)
+    if wrap_input:
+        text = "<user_input>" + text + "</user_input>"
+    if plain:
+        prompt = settings.CLAUDE_CELPIP_REVISE_SYSTEM_PROMPT
+        stop = "</revised_text>"
+    else:
+        prompt = settings.CLAUDE_CELPIP_WRITTING_SYSTEM_PROMPT
+        stop = "</grammar_focused_feedback>"
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": text},
+            # Prefilled, so the answer starts inside <revised_text>
+            {"role": "assistant", "content": "<revised_text>"},
+        ],
+        "stop_sequences": [stop],
+        "max_tokens": max_tokens,
+    }
+
+
+def _never_sent(error):
+    """Whether a request failed before it reached the endpoint."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
 
 class Api2dClient:
     """Client for interacting with the API2D API"""
 
     def __init__(self, api_key, base_url):
-        self.base_url = base_url
+        # base_url may be a list of equivalent endpoints
+        self.router = EndpointRouter(base_url)
+        self.base_url = self.router.endpoints[0]
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
 
-    def call_custom_key_save(self, type_id, n):
+    def _post(self, path, **kwargs):
+        return self._request("POST", path, **kwargs)
+
+    def _get(self, path, **kwargs):
+        return self._request("GET", path, idempotent=True, **kwargs)
+
+    def _request(
+        self,
+        method,
+        path,
+        failover=True,
+        hedge=False,
+        idempotent=False,
+        rotate=0,
+        **kwargs,
+    ):
+        """
+        Send the request to the endpoint with the best recent latency.
+        Connection errors, timeouts and 5xx responses trip the endpoint's
+        circuit breaker and, unless `failover` is off for a call that must
+        not be repeated, the next endpoint is tried. Endpoints with an open
+        circuit are skipped without a request; if that leaves none,
+        UpstreamUnavailable is raised at once. The last 5xx response is
+        returned if every endpoint answered with one.
+
+        A request that may have reached the endpoint, e.g. one that timed
+        out reading the answer, is only repeated elsewhere for `idempotent`
+        calls: the others may already be billed.
+
+        With `hedge`, for idempotent calls only, a second copy goes out
+        first to the next endpoint if the call is slower than usual; see
+        `hedging.hedged`. Hedged calls wait UPSTREAM_HEDGE_READ_TIMEOUT at
+        most, so a losing copy does not hold its hedging slot for long.
+        `rotate` moves that many endpoints to the back.
+        """
+        idempotent = idempotent or hedge
+        if hedge and settings.UPSTREAM_HEDGE_ENABLED:
+            kwargs.setdefault(
+                "timeout",
+                (
+                    settings.UPSTREAM_CONNECT_TIMEOUT,
+                    settings.UPSTREAM_HEDGE_READ_TIMEOUT,
+                ),
+            )
+            tracker = _hedge_latency.setdefault(path, LatencyTracker())
+            return hedged(
+                lambda: self._request(
+                    method, path, failover, idempotent=True, **kwargs
+                ),
+                lambda: self._request(
+                    method, path, failover, idempotent=True, rotate=1, **kwargs
+                ),
+                tracker,
+                _hedge_budget,
+                ok=lambda response: response.status_code < 500,
+            )
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (
+                settings.UPSTREAM_CONNECT_TIMEOUT,
+                settings.UPSTREAM_READ_TIMEOUT,
+            )
+        candidates = self.router.candidates()
+        candidates = candidates[rotate:] + candidates[:rotate]
+        if not failover:
+            candidates = candidates[:1]
+        send = requests.get if method == "GET" else requests.post
+        error = response = None
+        for url in candidates:
+            breaker = CircuitBreaker(url)
+            if not breaker.allow():
+                continue
+            # Uploads are read by the previous attempt
+            for upload in (kwargs.get("files") or {}).values():
+                upload[1].seek(0)
+            started = time.perf_counter()
+            try:
+                response = send(url + path, **kwargs)
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                breaker.record_failure()
+                if not (idempotent or _never_sent(e)):
+                    raise
+                error = e
+                continue
+            if response.status_code >= 500:
+                breaker.record_failure()
+                continue
+            breaker.record_success()
+            self.router.record_success(url, (time.perf_counter() - started) * 1000)
+            return response
+        if response is not None:
+            return response
+        raise error or UpstreamUnavailable()
+
+    def call_custom_key_save(self, type_id, n, timeout=None):
         try:
-            response = requests.post(
-                f"{self.base_url}/custom_key/save",
+            # Not retried on another endpoint: it could create the keys twice
+            response = self._post(
+                "/custom_key/save",
+                failover=False,
                 headers=self.headers,
                 data=json.dumps({"type_id": type_id, "n": n}),
+                timeout=timeout,
             )
             response.raise_for_status()  # Raise an exception for HTTP errors
             return response.json()["data"]["custom_key_array"]
@@ -32,8 +187,9 @@ class Api2dClient:
     def call_custom_key_search_key(self, key):
         try:
             # need to be replace with search key when external bug is fixed
-            response = requests.post(
-                f"{self.base_url}/custom_key/search_key",
+            response = self._post(
+                "/custom_key/search_key",
+                hedge=True,
                 headers=self.headers,
                 data=json.dumps({"query": key}),
             )
@@ -44,6 +200,64 @@ class Api2dClient:
             logging.error(f"Error fetching API key info: {e}")
             return None
 
+    def get_credits(self):
+        """The credit grants of the key, with its `total_available`."""
+        try:
+            response = self._get(
+                "/dashboard/billing/credit_grants", hedge=True, headers=self.headers
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error fetching credits: {e}")
+            return None
+
+    def transcribe_audio(self, audio, model, language):
+        try:
+            # requests sets the multipart Content-Type with its boundary
+            headers = {"Authorization": self.headers["Authorization"]}
+            response = self._post(
+                "/v1/audio/transcriptions",
+                headers=headers,
+                data={"model": model, "language": language},
+                files={"file": (audio.name, audio, audio.content_type)},
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error transcribing audio: {e}")
+            return None
+
+    def create_claude_message(self, payload):
+        try:
+            response = self._post(
+                "/claude/v1/messages",
+                headers=self.headers,
+                data=json.dumps(payload),
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error creating Claude message: {e}")
+            return None
+
+    def stream_claude_message(self, payload):
+        """Returns the decoded SSE lines of a streaming Claude Messages call."""
+        try:
+            response = self._post(
+                "/claude/v1/messages",
+                headers=self.headers,
+                data=json.dumps({**payload, "stream": True}),
+                stream=True,
+            )
+            response.raise_for_status()
+            # text/event-stream without a charset would be read as ISO-8859-1
+            response.encoding = "utf-8"
+            return response.iter_lines(decode_unicode=True)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error streaming Claude message: {e}")
+            return None
+
     def get_key(self, key):
         key_array = self.call_custom_key_search_key(key)
         if len(key_array) > 1:
@@ -0,0 +1,280 @@
+import io
+import logging
+import os
+import subprocess
+import tempfile
+import wave
+from dataclasses import dataclass, field
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - trimming is skipped without numpy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+# Speech is anything this far above the noise floor of the recording...
+THRESHOLD_DB = 12
+# ...but never quieter than this, so a silent recording is not all speech.
+MIN_SPEECH_DB = -50
+# Frames kept around each speech run, so word onsets and tails survive.
+PAD_MS = 200
+# Pauses longer than this are shortened to this length.
+MAX_PAUSE_MS = 400
+
+
+@dataclass
+class TimestampMap:
+    """
+    Maps times in the trimmed audio back to the original recording. Each
+    segment is (trimmed_start, original_start, duration) in seconds; the
+    trimmed audio is the segments played back to back.
+    """
+
+    segments: list = field(default_factory=list)
+
+    def to_original(self, t):
+        for trimmed_start, original_start, duration in reversed(self.segments):
+            if t >= trimmed_start:
+                return original_start + min(t - trimmed_start, duration)
+        return t
+
+    @property
+    def duration(self):
+        if not self.segments:
+            return 0.0
+        trimmed_start, _, duration = self.segments[-1]
+        return trimmed_start + duration
+
+
+@dataclass
+class TrimmedAudio:
+    audio: SimpleUploadedFile
+    timestamps: TimestampMap
+    original_seconds: float
+    trimmed_seconds: float
+
+
+def frame_energy_db(samples, frame_len):
+    """RMS energy of each frame in dBFS, for int16 samples."""
+    n_frames = -(-len(samples) // frame_len)
+    padded = np.zeros(n_frames * frame_len, dtype=np.float32)
+    padded[: len(samples)] = samples
+    frames = padded.reshape(n_frames, frame_len) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def speech_frames(energy_db, pad_frames):
+    """Boolean mask of the frames that belong to speech."""
+    noise_floor = np.percentile(energy_db, 10)
+    speech = energy_db > max(noise_floor + THRESHOLD_DB, MIN_SPEECH_DB)
+    if pad_frames:
+        kernel = np.ones(2 * pad_frames + 1)
+        speech = np.convolve(speech, kernel, mode="same") > 0
+    return speech
+
+
+def keep_segments(speech, max_pause_frames):
+    """
+    Frame ranges [start, end) to keep: every speech run plus up to
+    `max_pause_frames` of the pause after it. Leading and trailing silence
+    is dropped.
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    if not len(starts):
+        return []
+    ends = ends.copy()
+    ends[:-1] = np.minimum(starts[1:], ends[:-1] + max_pause_frames)
+
+    segments = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if segments and segments[-1][1] == start:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end])
+    return segments
+
+
+def trim_silence(samples, sample_rate=SAMPLE_RATE):
+    """
+    Drop leading and trailing silence from int16 PCM and shorten long pauses.
+    Returns the trimmed samples and the TimestampMap back to the original.
+    Audio shorter than one frame, e.g. an empty or header-only WAV, is
+    returned unchanged.
+    """
+    frame_len = sample_rate * FRAME_MS // 1000
+    if len(samples) < frame_len:
+        timestamps = TimestampMap()
+        if len(samples):
+            timestamps.segments.append((0.0, 0.0, len(samples) / sample_rate))
+        return samples, timestamps
+    speech = speech_frames(
+        frame_energy_db(samples, frame_len), pad_frames=PAD_MS // FRAME_MS
+    )
+    segments = keep_segments(speech, max_pause_frames=MAX_PAUSE_MS // FRAME_MS)
+
+    pieces, timestamps, position = [], TimestampMap(), 0
+    for start, end in segments:
+        piece = samples[start * frame_len : min(end * frame_len, len(samples))]
+        timestamps.segments.append(
+            (
+                position / sample_rate,
+                start * frame_len / sample_rate,
+                len(piece) / sample_rate,
+            )
+        )
+        pieces.append(piece)
+        position += len(piece)
+    trimmed = np.concatenate(pieces) if pieces else samples[:0]
+    return trimmed, timestamps
+
+
+def read_wav(data):
+    """Samples of a 16-bit mono WAV at SAMPLE_RATE, or None for anything else."""
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            if (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) != (
+                1,
+                2,
+                SAMPLE_RATE,
+            ):
+                return None
+            return np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+    except (wave.Error, EOFError):
+        return None
+
+
+def encode_wav(samples, sample_rate=SAMPLE_RATE):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def encode_flac(samples, sample_rate=SAMPLE_RATE):
+    """
+    Lossless FLAC of int16 PCM, about half the size of the WAV, or None
+    when ffmpeg is not available.
+    """
+    try:
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-nostdin",
+                "-loglevel",
+                "error",
+                "-f",
+                "s16le",
+                "-ac",
+                "1",
+                "-ar",
+                str(sample_rate),
+                "-i",
+                "pipe:0",
+                "-f",
+                "flac",
+                "pipe:1",
+            ],
+            input=samples.astype("<i2").tobytes(),
+            capture_output=True,
+            check=True,
+            timeout=60,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("Could not encode FLAC, sending WAV: %s", e)
+        return None
+    return result.stdout
+
+
+def decode_audio(path):
+    """Decode any audio file ffmpeg understands to mono int16 PCM."""
+    result = subprocess.run(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-i",
+            path,
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-ar",
+            str(SAMPLE_RATE),
+            "pipe:1",
+        ],
+        capture_output=True,
+        check=True,
+        timeout=60,
+    )
+    return np.frombuffer(result.stdout, dtype="<i2")
+
+
+def load_samples(upload):
+    data = upload.read()
+    upload.seek(0)
+    samples = read_wav(data)
+    if samples is not None:
+        return samples
+    if hasattr(upload, "temporary_file_path"):
+        return decode_audio(upload.temporary_file_path())
+    # MP4/M4A keep their index at the end, so ffmpeg needs a seekable file
+    # rather than a pipe.
+    suffix = os.path.splitext(upload.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as f:
+        f.write(data)
+        f.flush()
+        return decode_audio(f.name)
+
+
+def trim_upload(upload):
+    """
+    Trim the silences of an uploaded recording into a FLAC (a WAV without
+    ffmpeg) ready to send upstream. Returns None when the audio cannot be
+    decoded, or when trimming would not make it shorter or the upload
+    smaller; the original is sent as-is then.
+    """
+    if np is None:
+        return None
+    try:
+        samples = load_samples(upload)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning("Could not decode %s for trimming: %s", upload.name, e)
+        return None
+
+    trimmed, timestamps = trim_silence(samples)
+    if not len(trimmed) or len(trimmed) >= len(samples):
+        return None
+    data, extension, content_type = encode_flac(trimmed), ".flac", "audio/flac"
+    if data is None:
+        data, extension, content_type = encode_wav(trimmed), ".wav", "audio/wav"
+    # A compressed recording can be smaller than its trimmed PCM
+    if len(data) >= upload.size:
+        return None
+    name = os.path.splitext(upload.name)[0] + extension
+    return TrimmedAudio(
+        audio=SimpleUploadedFile(name, data, content_type),
+        timestamps=timestamps,
+        original_seconds=len(samples) / SAMPLE_RATE,
+        trimmed_seconds=len(trimmed) / SAMPLE_RATE,
+    )
+
+
+def restore_timings(result, timestamps):
+    """Map segment and word times of a transcription back onto the original."""
+    for key in ("segments", "words"):
+        for item in result.get(key) or []:
+            for edge in ("start", "end"):
+                if isinstance(item.get(edge), (int, float)):
+                    item[edge] = round(timestamps.to_original(item[edge]), 3)
+    return result
@@ -1,15 +1,40 @@
+import json
+import time
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.views.generic import View, DeleteView
-from django.urls import reverse_lazy
+from django.views.decorators.csrf import csrf_exempt, csrf_protect, ensure_csrf_cookie
+from django.views.decorators.http import require_http_methods, require_POST
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse, reverse_lazy
 from django import forms
-from .models import Api2dKey, Api2dGroup2ExpirationMapping
-from django.conf import settings
-from .utilities import Api2dClient
+from .models import Api2dKey, EssayBatch, Submission
 from django.conf import settings
+from .breaker import UNAVAILABLE_MESSAGE
+from .utilities import Api2dClient, celpip_improve_payload
+from .routing import EndpointRouter
+from .usage import record_usage
+from .history import keyset_page, search
+from .recordings import RecordingUploadError, recording_uploads
+from .transcripts import transcript_store
+from .uploads import HashingUploadHandler
+from .vad import restore_timings, trim_upload
+from .streaming import stream_revision, stream_sections
+from .tokens import InputTooLong, check_input
+from .model_routing import choose_model, record_latency
+from .provisioning import provision_key
+from .batches import (
+    batch_progress,
+    create_batch,
+    parse_essays,
+    start_batch,
+    stream_archive,
+)
 
 
 class MP3UploadForm(forms.Form):
@@ -37,6 +62,35 @@ class MP3UploadForm(forms.Form):
         return mp3_file
 
 
+class EssayBatchForm(forms.Form):
+    """Form for uploading a batch of essays"""
+
+    name = forms.CharField(
+        label="Batch Name",
+        max_length=200,
+        widget=forms.TextInput(attrs={"class": "form-control"}),
+    )
+    essays_file = forms.FileField(
+        label="Essays",
+        help_text='A CSV with "name" and "essay" columns, or a zip of .txt files.',
+        widget=forms.FileInput(attrs={"accept": ".csv,.zip", "class": "form-control"}),
+    )
+
+    def clean_essays_file(self):
+        essays_file = self.cleaned_data["essays_file"]
+        try:
+            essays = parse_essays(essays_file)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        # Refused here rather than failing one by one once the batch runs
+        for name, text in essays:
+            try:
+                check_input(text, settings.API2D_CLAUDE_MODEL)
+            except InputTooLong as e:
+                raise forms.ValidationError(f"{name}: {e}")
+        return essays
+
+
 class ApiKeyForm(forms.ModelForm):
     """Form for adding a new API key"""
 
@@ -65,30 +119,31 @@ class ApiKeyView(LoginRequiredMixin, View):
                 "has_api_key": True,
                 "api_key": api_key,
                 "form": form,
-                "api2d_openai_endpoint": settings.API2D_OPENAI_ENDPOINT,
             }
         except Api2dKey.DoesNotExist:
-            client = Api2dClient(settings.API2D_ADMIN_KEY, settings.API2D_API_ENDPOINT)
-
-            key_group = Api2dGroup2ExpirationMapping.objects.first()
             try:
-                api2d_key_instance = client.call_custom_key_save(
-                    type_id=key_group.type_id, n=1
-                )
-                api_key = Api2dKey.objects.create(
-                    key=api2d_key_instance[0]["key"],
-                    user=request.user,
-                    group=key_group,
-                    created_at=timezone.now(),
-                )
+                # Single-flight per user: a second tab waits for this key
+                provision_key(request.user)
                 return redirect("api2d:api-key")
             except ValueError as e:
                 messages.error(request, str(e))
-                return redirect("api2d:api-key")
+                # Not a redirect to this view: it would try again at once
+                context = {"has_api_key": False, "form": ApiKeyForm()}
 
         return render(request, "api2d/api_key_list.html", context)
 
 
+@login_required
+def api_key_credits(request):
+    """The available credits of the user's key, looked up with hedging."""
+    api_key = get_object_or_404(Api2dKey, user=request.user)
+    client = Api2dClient(api_key.key, settings.API2D_OPENAI_ENDPOINT)
+    credits = client.get_credits()
+    if credits is None:
+        return JsonResponse({"error": UNAVAILABLE_MESSAGE}, status=502)
+    return JsonResponse({"total_available": credits.get("total_available")})
+
+
 class ApiKeyDeleteView(LoginRequiredMixin, DeleteView):
     """View to delete the user's API key"""
 
@@ -109,6 +164,7 @@ class ApiKeyDeleteView(LoginRequiredMixin, DeleteView):
 
 
 @login_required
+@ensure_csrf_cookie
 def celpip_speaking(request):
     """Serve the MP3 processing page"""
     try:
@@ -119,10 +175,15 @@ def celpip_speaking(request):
             return redirect("api2d:api-key")
         context = {
             "api_key": api_key.key,
-            "api2d_openai_endpoint": settings.API2D_OPENAI_ENDPOINT,  # Updated to use Django's endpoint
+            "api2d_openai_endpoint": EndpointRouter(
+                settings.API2D_OPENAI_ENDPOINT
+            ).best(),
             "api2d_openai_stt_model": settings.API2D_OPENAI_STT_MODEL,
-            "api2d_openai_txt_model": settings.API2D_CLAUDE_MODEL,
-            "celpip_improve_sys_prompt": settings.CLAUDE_CELPIP_WRITTING_SYSTEM_PROMPT,
+            "usage_url": reverse("api2d:usage"),
+            "submission_url": reverse("api2d:submission-create"),
+            "improve_stream_url": reverse("api2d:improve-stream"),
+            "transcribe_url": reverse("api2d:transcribe"),
+            "recording_upload_url": reverse("api2d:recording-create"),
         }
         return render(request, "api2d/CelpipSpeaking.html", context)
     except Api2dKey.DoesNotExist:
@@ -131,6 +192,7 @@ def celpip_speaking(request):
 
 
 @login_required
+@ensure_csrf_cookie
 def celpip_writting(request):
     try:
         # Get the user's API key
@@ -140,9 +202,11 @@ def celpip_writting(request):
             return redirect("api2d:api-key")
         context = {
             "api_key": api_key.key,
-            "api2d_openai_endpoint": settings.API2D_OPENAI_ENDPOINT,  # Updated to use Django's endpoint
-            "api2d_claude_model": settings.API2D_CLAUDE_MODEL,
-            "celpip_writting_system_prompt": settings.CLAUDE_CELPIP_WRITTING_SYSTEM_PROMPT,
+            "api2d_openai_endpoint": EndpointRouter(
+                settings.API2D_OPENAI_ENDPOINT
+            ).best(),
+            "submission_url": reverse("api2d:submission-create"),
+            "improve_stream_url": reverse("api2d:improve-stream"),
         }
         return render(request, "api2d/CelpipWritting.html", context)
     except Api2dKey.DoesNotExist:
@@ -150,5 +214,344 @@ def celpip_writting(request):
         return redirect("api2d:api-key")
 
 
+@login_required
+@require_POST
+def usage_event(request):
+    """
+    Record the usage of one upstream call made by the browser. The cost is
+    worked out from the model and token counts; the browser cannot set it.
+    """
+    try:
+        data = json.loads(request.body)
+        record_usage(
+            user_id=request.user.pk,
+            model=str(data["model"])[:100],
+            endpoint=str(data["endpoint"])[:100],
+            input_tokens=max(0, int(data.get("input_tokens") or 0)),
+            output_tokens=max(0, int(data.get("output_tokens") or 0)),
+            input_chars=max(0, int(data.get("input_chars") or 0)),
+            output_chars=max(0, int(data.get("output_chars") or 0)),
+            latency_ms=max(0, int(data.get("latency_ms") or 0)),
+        )
+    except (ValueError, KeyError, TypeError, ValidationError):
+        return JsonResponse({"error": "Invalid usage event."}, status=400)
+    return JsonResponse({"status": "queued"}, status=202)
+
+
+@csrf_exempt
+@login_required
+def transcribe_audio(request):
+    """
+    Transcribe an uploaded recording, reusing the stored result when the
+    same audio was transcribed before. The upload is hashed as it streams in;
+    the handler has to be installed before anything reads request.POST, which
+    is why CSRF is checked in the inner view instead of by the middleware.
+    """
+    request.upload_handlers.insert(0, HashingUploadHandler(request))
+    return _transcribe_audio(request)
+
+
+@csrf_protect
+@require_POST
+def _transcribe_audio(request):
+    audio = request.FILES.get("file")
+    if audio is None:
+        return JsonResponse({"error": "No audio file was uploaded."}, status=400)
+    if audio.size > settings.TRANSCRIBE_MAX_UPLOAD_SIZE:
+        return JsonResponse({"error": "Audio file is too large."}, status=400)
+    api_key = Api2dKey.objects.filter(user=request.user).first()
+    if api_key is None:
+        return JsonResponse({"error": "No API key."}, status=403)
+
+    language = request.POST.get("language", "en")[:10]
+    return _transcription(api_key, audio, request.upload_digests["file"], language)
+
+
+def _transcription(api_key, audio, digest, language):
+    """Transcribe audio with the SHA-256 `digest`, or reuse the stored result."""
+    model = settings.API2D_OPENAI_STT_MODEL
+    result = transcript_store.get(digest, model, language)
+    if result is not None:
+        return JsonResponse({**result, "cached": True})
+
+    trimmed = trim_upload(audio) if settings.TRANSCRIBE_TRIM_SILENCE else None
+    client = Api2dClient(api_key.key, settings.API2D_OPENAI_ENDPOINT)
+    result = client.transcribe_audio(
+        trimmed.audio if trimmed else audio, model, language
+    )
+    if result is None:
+        return JsonResponse({"error": "Transcription failed."}, status=502)
+    if trimmed:
+        result = restore_timings(result, trimmed.timestamps)
+        result["trim"] = {
+            "original_seconds": round(trimmed.original_seconds, 2),
+            "trimmed_seconds": round(trimmed.trimmed_seconds, 2),
+        }
+    transcript_store.put(digest, model, language, result)
+    return JsonResponse({**result, "cached": False})
+
+
+@login_required
+@require_POST
+def recording_create(request):
+    """Start an upload of a recording that is sent in slices as it is made."""
+    try:
+        data = json.loads(request.body or "{}")
+        name = str(data.get("name") or "recording.m4a")
+        content_type = str(data.get("content_type") or "audio/mp4")
+    except (ValueError, AttributeError):
+        return JsonResponse({"error": "Invalid request."}, status=400)
+    upload_id, upload = recording_uploads.create(request.user.pk, name, content_type)
+    return JsonResponse(
+        {"id": upload_id, **recording_uploads.state(upload)}, status=201
+    )
+
+
+@login_required
+@require_http_methods(["GET", "PUT"])
+def recording_upload(request, upload_id):
+    """
+    GET returns how much of the upload arrived, to resume from. PUT appends
+    the slice in the body, which starts at the X-Upload-Offset and brings the
+    CRC-32 of the upload to the X-Upload-Checksum (8 hex digits).
+    """
+    try:
+        if request.method == "GET":
+            upload = recording_uploads.status(request.user.pk, str(upload_id))
+        else:
+            try:
+                offset = int(request.headers["X-Upload-Offset"])
+                checksum = request.headers["X-Upload-Checksum"]
+            except (KeyError, ValueError):
+                return JsonResponse({"error": "Invalid slice headers."}, status=400)
+            upload = recording_uploads.append(
+                request.user.pk, str(upload_id), offset, request.body, checksum
+            )
+    except RecordingUploadError as e:
+        return JsonResponse({"error": str(e), **(e.state or {})}, status=e.status)
+    return JsonResponse(recording_uploads.state(upload))
+
+
+@login_required
+@require_POST
+def recording_transcribe(request, upload_id):
+    """Transcribe a recording once its last slice is in, then drop the upload."""
+    api_key = Api2dKey.objects.filter(user=request.user).first()
+    if api_key is None:
+        return JsonResponse({"error": "No API key."}, status=403)
+    try:
+        data = json.loads(request.body or "{}")
+        language = str(data.get("language") or "en")[:10]
+        audio, digest = recording_uploads.open(request.user.pk, str(upload_id))
+    except (ValueError, AttributeError):
+        return JsonResponse({"error": "Invalid request."}, status=400)
+    except RecordingUploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    if audio.size == 0:
+        audio.close()
+        return JsonResponse({"error": "The recording is empty."}, status=400)
+    with audio:
+        response = _transcription(api_key, audio, digest, language)
+    if response.status_code == 200:
+        recording_uploads.remove(request.user.pk, str(upload_id))
+    return response
+
+
+def _recorded(events, route, started, answer, **fields):
+    """
+    Pass the events on, then record how long the whole answer took and the
+    usage the stream reported into `answer`, so the ledger does not depend
+    on the browser reporting it. If the browser goes away mid-answer, the
+    tokens counted until then are recorded, but not the latency.
+    """
+    finished = False
+    try:
+        yield from events
+        finished = True
+    finally:
+        seconds = time.perf_counter() - started
+        if finished:
+            record_latency(route.model, seconds, route.tokens)
+        if answer.get("usage"):
+            record_usage(
+                model=route.model,
+                endpoint="/claude/v1/messages",
+                input_tokens=answer["usage"].get("input_tokens") or 0,
+                output_tokens=answer["usage"].get("output_tokens") or 0,
+                output_chars=answer["chars"],
+                latency_ms=round(seconds * 1000),
+                **fields,
+            )
+
+
+@login_required
+@require_POST
+def improve_stream(request):
+    """
+    Ask Claude to revise a text and stream the revised text and the feedback
+    back as server-sent events, section by section, while it is generated.
+    """
+    try:
+        data = json.loads(request.body)
+        text = str(data["text"])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Invalid request."}, status=400)
+    api_key = Api2dKey.objects.filter(user=request.user).select_related("group").first()
+    if api_key is None:
+        return JsonResponse({"error": "No API key."}, status=403)
+    if api_key.expired_at and api_key.expired_at < timezone.now():
+        return JsonResponse(
+            {"error": "Your API key has expired. Please renew it."}, status=403
+        )
+
+    route = choose_model(text, api_key.group.group)
+    try:
+        check_input(text, route.model)
+    except InputTooLong as e:
+        return JsonResponse({"error": str(e)}, status=413)
+
+    plain = settings.CELPIP_LOCAL_DIFF
+    client = Api2dClient(api_key.key, settings.API2D_OPENAI_ENDPOINT)
+    payload = celpip_improve_payload(
+        text,
+        wrap_input=data.get("kind") == Submission.KIND_WRITING,
+        plain=plain,
+        model=route.model,
+    )
+    started = time.perf_counter()
+    lines = client.stream_claude_message(payload)
+    if lines is None:
+        return JsonResponse({"error": "Improvement failed."}, status=502)
+    answer = {}
+
+    def on_usage(usage, chars):
+        answer.update(usage=usage, chars=chars)
+
+    if plain:
+        events = stream_revision(lines, text, model=route.model, on_usage=on_usage)
+    else:
+        events = stream_sections(
+            lines, model=route.model, original=text, on_usage=on_usage
+        )
+    events = _recorded(
+        events,
+        route,
+        started,
+        answer,
+        user_id=request.user.pk,
+        input_chars=sum(len(m["content"]) for m in payload["messages"]),
+    )
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Keep proxies from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@staff_member_required
+def transcribe_stats(request):
+    """Hit rate and size of the transcription cache."""
+    return JsonResponse(transcript_store.stats())
+
+
+@login_required
+@require_POST
+def submission_create(request):
+    """Save a finished speaking or writing attempt to the user's history."""
+    try:
+        data = json.loads(request.body)
+        if data["kind"] not in dict(Submission.KINDS):
+            raise ValueError(data["kind"])
+        submission = Submission.objects.create(
+            user=request.user,
+            kind=data["kind"],
+            input_text=str(data.get("input_text") or ""),
+            transcription=str(data.get("transcription") or ""),
+            revised_text=str(data.get("revised_text") or ""),
+            feedback=str(data.get("feedback") or ""),
+        )
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Invalid submission."}, status=400)
+    return JsonResponse(
+        {
+            "id": submission.pk,
+            "url": reverse("api2d:submission-detail", args=[submission.pk]),
+        },
+        status=201,
+    )
+
+
+@login_required
+def submission_history(request):
+    """List the user's past attempts, newest first, optionally searched."""
+    query = request.GET.get("q", "")
+    submissions = Submission.objects.filter(user=request.user).defer(
+        *Submission.BODY_FIELDS
+    )
+    submissions, next_cursor = keyset_page(
+        search(submissions, query),
+        cursor=request.GET.get("after"),
+        size=settings.SUBMISSION_HISTORY_PAGE_SIZE,
+    )
+    context = {
+        "submissions": submissions,
+        "query": query,
+        "next_cursor": next_cursor,
+    }
+    return render(request, "api2d/submission_list.html", context)
+
+
+@login_required
+def submission_detail(request, pk):
+    submission = get_object_or_404(Submission, pk=pk, user=request.user)
+    return render(request, "api2d/submission_detail.html", {"submission": submission})
+
+
+class EssayBatchView(LoginRequiredMixin, View):
+    """List the user's essay batches and upload new ones"""
+
+    def get(self, request, *args, **kwargs):
+        return self.render(request, EssayBatchForm())
+
+    def post(self, request, *args, **kwargs):
+        form = EssayBatchForm(request.POST, request.FILES)
+        if not Api2dKey.objects.filter(user=request.user).exists():
+            messages.error(request, "积分不足，请先充值。")
+            return redirect("api2d:api-key")
+        if not form.is_valid():
+            return self.render(request, form)
+        batch = create_batch(
+            request.user, form.cleaned_data["name"], form.cleaned_data["essays_file"]
+        )
+        start_batch(batch.pk)
+        return redirect("api2d:batch-detail", pk=batch.pk)
+
+    def render(self, request, form):
+        context = {
+            "form": form,
+            "batches": EssayBatch.objects.filter(user=request.user)[:50],
+        }
+        return render(request, "api2d/batch_list.html", context)
+
+
+@login_required
+def batch_detail(request, pk):
+    # Read-only: batches are started by the upload and resumed by the
+    # resume_batches command, never by a page view
+    batch = get_object_or_404(EssayBatch, pk=pk, user=request.user)
+    context = {"batch": batch, "progress": batch_progress(batch)}
+    return render(request, "api2d/batch_detail.html", context)
+
+
+@login_required
+def batch_download(request, pk):
+    batch = get_object_or_404(EssayBatch, pk=pk, user=request.user)
+    response = StreamingHttpResponse(
+        stream_archive(batch), content_type="application/zip"
+    )
+    response["Content-Disposition"] = f'attachment; filename="batch-{batch.pk}.zip"'
+    return response
+
+
 def home_page_view(request):
     return render(request, "api2d/home.html")
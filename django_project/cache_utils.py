@@ -0,0 +1,48 @@
+"""
+Counters and locks on the default cache that hold across processes. Redis,
+memcached and the local-memory cache make `add` and `incr` atomic; the
+file-based fallback does not, so with it they run under a lock file in the
+cache directory, which every worker of the host shares.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: the thread lock is all there is
+    fcntl = None
+
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def cache_lock(name="default"):
+    """Serialize a read-modify-write of the cache, if the backend needs it."""
+    backend = caches["default"]
+    if not isinstance(backend, FileBasedCache):
+        yield
+        return
+    os.makedirs(backend._dir, exist_ok=True)
+    with _thread_lock, open(os.path.join(backend._dir, f".{name}.lock"), "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def incr(key, delta=1, timeout=None):
+    """Add `delta` to the counter `key`, created at 0, and return it."""
+    with cache_lock("counters"):
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            cache.add(key, 0, timeout=timeout)
+            return cache.incr(key, delta)
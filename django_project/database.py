@@ -0,0 +1,66 @@
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+
+PERSISTENT = "persistent"
+POOL = "pool"
+PGBOUNCER = "pgbouncer"
+MODES = (PERSISTENT, POOL, PGBOUNCER)
+
+
+def database_config(
+    mode=PERSISTENT, threads=1, pool_min_size=1, pool_max_size=None, url=None
+):
+    """
+    A DATABASES entry, from `url` or else DATABASE_URL, for a connection mode:
+
+    persistent: each thread keeps its connection for ten minutes and checks
+        it before every request. Simple, but every gunicorn worker thread
+        holds a Postgres connection slot.
+    pool: each process shares a psycopg 3 pool between its `threads`
+        request threads, plus a few for background batch threads, so a host
+        needs about workers * pool_max_size slots. Also the mode for ASGI,
+        where persistent connections are not reused between requests.
+    pgbouncer: behind a pgbouncer transaction pooler. Connections to it
+        are cheap and kept without a health check, server-side cursors and
+        prepared statements are off because consecutive transactions may run
+        on different server connections.
+    """
+    if mode not in MODES:
+        raise ImproperlyConfigured(
+            f"DATABASE_CONNECTION_MODE must be one of {', '.join(MODES)}, "
+            f"not {mode!r}."
+        )
+
+    def parse(**kwargs):
+        if url:
+            return dj_database_url.parse(url, **kwargs)
+        return dj_database_url.config(**kwargs)
+
+    if mode == PERSISTENT:
+        return parse(conn_max_age=600, conn_health_checks=True)
+
+    if mode == PGBOUNCER:
+        config = parse(conn_max_age=600, disable_server_side_cursors=True)
+        if _has_psycopg3():
+            # psycopg 3 prepares statements it sees repeatedly
+            config.setdefault("OPTIONS", {})["prepare_threshold"] = None
+        return config
+
+    config = parse()
+    if config.get("ENGINE") != "django.db.backends.postgresql":
+        raise ImproperlyConfigured("The pool connection mode needs PostgreSQL.")
+    config.setdefault("OPTIONS", {})["pool"] = {
+        "min_size": pool_min_size,
+        "max_size": pool_max_size or threads + 4,
+        # Seconds a request waits for a free connection before failing
+        "timeout": 10,
+    }
+    return config
+
+
+def _has_psycopg3():
+    try:
+        import psycopg  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,187 @@
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = "db_primary"
+# Shared by all workers: reads stay on the primary until then after a write
+PRIMARY_UNTIL_KEY = "replicas:primary_until"
+# Shared by all workers: the usable replicas of the last health check
+HEALTH_KEY = "replicas:usable"
+
+# Whether this request (or thread) must read from the primary, and whether
+# it wrote one of the replicated models
+_pinned = ContextVar("replica_pinned", default=False)
+_wrote = ContextVar("replica_wrote", default=False)
+
+# Per process, refreshed every REPLICA_CHECK_SECONDS, see usable_replicas()
+_health = {"checked_at": None, "usable": [], "primary_until": 0}
+_health_lock = threading.Lock()
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def primary_lsn():
+    """The primary's current WAL position, or None if it has none to give."""
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != "postgresql":
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_current_wal_lsn()::text")
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        logger.warning("Cannot read the primary's WAL position", exc_info=True)
+        return None
+
+
+def replica_lag(alias, lsn=None):
+    """
+    Seconds the replica is behind its primary, or 0 where that cannot lag
+    (e.g. a second SQLite database used for testing). A replica that has
+    replayed the primary's WAL up to `lsn` is not behind, however long ago
+    its last replayed transaction was: an idle primary writes nothing.
+    Otherwise the lag is the age of that transaction.
+    """
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+            "WHEN pg_last_wal_replay_lsn() >= %s::pg_lsn THEN 0 "
+            "ELSE COALESCE("
+            "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END",
+            [lsn],
+        )
+        return float(cursor.fetchone()[0])
+
+
+def _check(alias, lsn):
+    try:
+        lag = replica_lag(alias, lsn)
+    except DatabaseError:
+        logger.warning("Replica %s is unreachable", alias, exc_info=True)
+        return False
+    if lag > settings.REPLICA_MAX_LAG_SECONDS:
+        logger.warning("Replica %s is %.1fs behind", alias, lag)
+        return False
+    return True
+
+
+def _probe():
+    """Check every replica against the primary's WAL position."""
+    lsn = primary_lsn()
+    return [alias for alias in replica_aliases() if _check(alias, lsn)]
+
+
+def usable_replicas():
+    """
+    Replicas within REPLICA_MAX_LAG_SECONDS of the primary, or none while
+    reads are pinned to the primary after a write. Checked at most every
+    REPLICA_CHECK_SECONDS, so routing a read adds no query: the result is
+    shared with the other workers through the cache, and one thread per
+    process refreshes it while the others keep using the last one.
+    """
+    now = time.monotonic()
+    with _health_lock:
+        checked_at = _health["checked_at"]
+        due = checked_at is None or now - checked_at >= settings.REPLICA_CHECK_SECONDS
+        if due:
+            _health["checked_at"] = now
+    if due:
+        # Outside the lock: a slow or unreachable replica must not stall
+        # every other read of the process
+        usable = cache.get(HEALTH_KEY)
+        if usable is None:
+            usable = _probe()
+            cache.set(HEALTH_KEY, usable, settings.REPLICA_CHECK_SECONDS)
+        primary_until = cache.get(PRIMARY_UNTIL_KEY, 0)
+        with _health_lock:
+            _health["usable"] = usable
+            _health["primary_until"] = max(_health["primary_until"], primary_until)
+    with _health_lock:
+        if time.time() < _health["primary_until"]:
+            return []
+        return _health["usable"]
+
+
+def pin_to_primary():
+    """Send this request's remaining replicated reads to the primary."""
+    _pinned.set(True)
+    _wrote.set(True)
+    until = time.time() + settings.REPLICA_MAX_LAG_SECONDS
+    with _health_lock:
+        _health["primary_until"] = until
+    cache.set(PRIMARY_UNTIL_KEY, until, settings.REPLICA_MAX_LAG_SECONDS)
+
+
+class ReplicaRouter:
+    """
+    Sends reads of the hot, rarely written models in REPLICA_MODELS (pages,
+    notifications, the current site) to a healthy read replica; everything
+    else, and every write, goes to the primary.
+
+    A write to one of those models pins the writer to the primary for
+    REPLICA_MAX_LAG_SECONDS (see ReplicaPinMiddleware), so they read their
+    own write. Other workers also stay on the primary for that long, so the
+    shared layout cache is not refilled from a replica that is behind.
+    Replicas further behind than that, or unreachable, are skipped.
+    """
+
+    def _replicated(self, model):
+        return model._meta.label_lower in settings.REPLICA_MODELS
+
+    def db_for_read(self, model, **hints):
+        # Not None: Django would otherwise read related rows of an object
+        # loaded from a replica from that same replica
+        if not self._replicated(model) or _pinned.get():
+            return DEFAULT_DB_ALIAS
+        replicas = usable_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if self._replicated(model) and replica_aliases():
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaPinMiddleware:
+    """
+    Keeps a client that wrote a replicated model on the primary for
+    REPLICA_MAX_LAG_SECONDS, with a cookie so it holds across workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE,
+                    "1",
+                    max_age=settings.REPLICA_MAX_LAG_SECONDS,
+                    httponly=True,
+                    samesite="Lax",
+                )
+            return response
+        finally:
+            _pinned.reset(pinned)
+            _wrote.reset(wrote)
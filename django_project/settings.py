@@ -10,10 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
-import dj_database_url
 from dotenv import load_dotenv
 
+from django_project.database import PERSISTENT, database_config
+
 load_dotenv()  # This loads the .env file
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,8 +55,11 @@ MIDDLEWARE = [
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    # Keeps clients on the primary database after their writes
+    "django_project.replicas.ReplicaPinMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Caches the logged-in user, see AUTH_USER_CACHE_TIMEOUT
+    "users.middleware.CachedAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     # Add the account middleware:
@@ -84,6 +89,7 @@ TEMPLATES = [
                 "django.contrib.messages.context_processors.messages",
                 "django.template.context_processors.request",
                 "pages.context_processors.active_notifications",
+                "pages.context_processors.layout_cache",
             ],
         },
     },
@@ -136,6 +142,21 @@ STATICFILES_DIRS = [
 # The absolute path to the directory where collectstatic will collect static files for deployment.
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Where `manage.py fastboot --collect` records the sources it collected from;
+# kept out of STATIC_ROOT so it is not served.
+FASTBOOT_FINGERPRINT_FILE = BASE_DIR / ".fastboot.json"
+
+# Hashed static files never change, so WhiteNoise serves them with
+# `Cache-Control: immutable`. Matches Django's manifest names (12 hex chars) and
+# the Vite chunks, which are imported by their own 8 character hash.
+WHITENOISE_IMMUTABLE_FILE_TEST = (
+    r"\.[0-9a-f]{12}\.[^/]+$|^/static/frontend/assets/[^/]+\.[\w-]{8}\.[^/.]+$"
+)
+
+# Vite build manifest, read by the `vite_preload` template tag to preload the
+# chunks each page mounts.
+VITE_MANIFEST_PATH = BASE_DIR / "static" / "frontend" / ".vite" / "manifest.json"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -183,13 +204,200 @@ FILE_UPLOAD_PERMISSIONS = 0o644
 
 SITE_ID = 1
 
+# Cache shared by every gunicorn worker on every host: layout fragments and
+# their invalidation, the upstream breakers and routing, model latencies and
+# the transcript counters. CACHE_URL points it at Redis (redis://, rediss://)
+# or memcached (memcached://host:port, needs pymemcache), whose incr and add
+# are atomic. Without it the cache falls back to files under tmp/, which only
+# the workers of a single host share, whose incr is not atomic and whose
+# culling lists the directory; fine for development and one-host deploys.
+CACHE_URL = os.environ.get("CACHE_URL", "")
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith("memcached://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": CACHE_URL.removeprefix("memcached://"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": BASE_DIR / "tmp" / "django_cache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+# Sessions are read through the cache and written to the database, so a warm
+# request does not query django_session.
+#
+# "django.contrib.sessions.backends.signed_cookies" also needs no session
+# queries, but is not the default after reviewing what it would put in the
+# cookie. It holds the whole session, signed with SECRET_KEY but not encrypted:
+# the user id, auth backend path, session auth hash (an HMAC of the password
+# hash) and allauth's login/verification state are all readable by the client.
+# A copied cookie also stays valid until it expires, because logout cannot
+# revoke it server-side. Only a password change rotates the hash and ends it.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Seconds a logged-in user stays cached by CachedAuthenticationMiddleware.
+# Saving or deleting the user drops the entry immediately.
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Usage events reported by the practice pages are buffered in each worker and
+# bulk-inserted when this many are queued or every N seconds, whichever first.
+USAGE_BUFFER_MAX_EVENTS = 100
+USAGE_BUFFER_FLUSH_SECONDS = 5
+
+# Submissions per page on the history page
+SUBMISSION_HISTORY_PAGE_SIZE = 20
+
+# Speech-to-text results keyed by a hash of the uploaded audio, so a repeated
+# upload is not transcribed (and billed) again
+TRANSCRIPT_CACHE_DIR = BASE_DIR / "tmp" / "transcripts"
+TRANSCRIPT_CACHE_TTL = 60 * 60 * 24 * 30
+TRANSCRIPT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+TRANSCRIBE_MAX_UPLOAD_SIZE = 25 * 1024 * 1024
+# Cut leading/trailing silence and shorten long pauses before speech-to-text
+# (needs numpy, and ffmpeg for anything but 16 kHz mono WAV). The result is
+# sent as FLAC, or WAV without ffmpeg, and only when smaller than the upload.
+TRANSCRIBE_TRIM_SILENCE = True
+# How long an unfinished recording uploaded in slices while recording is kept
+# (in the database, see api2d.recordings)
+RECORDING_UPLOAD_TTL = 60 * 60
+
+# Have the model write only the revised text and work out the highlights and
+# the table of changes with a local word diff (see `manage.py
+# revision_benchmark` for the tokens and latency it saves)
+CELPIP_LOCAL_DIFF = False
+
+# Run the rule-based grammar check of `api2d.grammar` on each text and add
+# its findings to the model's feedback. Off until its rules have been checked
+# against real answers: a wrong finding looks like the model's own advice
+CELPIP_LOCAL_GRAMMAR_CHECK = False
+
+# Output budget (max_tokens) of an improvement: the estimated tokens of the
+# text times the task's ratio plus its overhead, kept within the range. Texts
+# over CELPIP_MAX_INPUT_TOKENS are refused before any upstream call. Token
+# estimates use characters per token calibrated from the usage events
+# (recalibrated every TOKEN_CALIBRATION_SECONDS).
+CELPIP_MAX_TOKENS = {"improve": (3.0, 512), "revise": (2.0, 128)}
+CELPIP_MAX_TOKENS_RANGE = (256, 4096)
+CELPIP_MAX_INPUT_TOKENS = 3000
+TOKEN_CALIBRATION_SECONDS = 60 * 60
+
+# Model per improvement: texts up to MODEL_ROUTING_SHORT_TOKENS get
+# API2D_CLAUDE_QUALITY_MODEL, longer ones too while its recent latency (the
+# percentile over the window) says they finish within the target, and the
+# faster API2D_CLAUDE_MODEL otherwise. Groups may be pinned to "fast" or
+# "quality", e.g. {"trial": "fast"}.
+MODEL_ROUTING_TARGET_SECONDS = 20
+MODEL_ROUTING_PERCENTILE = 95
+MODEL_ROUTING_SHORT_TOKENS = 250
+MODEL_ROUTING_WINDOW_SECONDS = 10 * 60
+MODEL_ROUTING_GROUPS = {}
+
+# Creating a user's key upstream: the request that took the lease has
+# KEY_PROVISIONING_LEASE_SECONDS to finish before another may take over,
+# concurrent requests for the same user wait up to
+# KEY_PROVISIONING_WAIT_SECONDS for its result. The upstream call gives up
+# after KEY_PROVISIONING_TIMEOUT seconds, well within the lease, so a slow
+# call cannot outlive it and have a second key created meanwhile.
+KEY_PROVISIONING_LEASE_SECONDS = 30
+KEY_PROVISIONING_TIMEOUT = 10
+KEY_PROVISIONING_WAIT_SECONDS = 15
+KEY_PROVISIONING_POLL_SECONDS = 0.2
+
+# Credits per million input and output tokens of each model, used to price
+# the usage events, e.g. {"claude-3-5-haiku-latest": (8000, 40000)}. Calls to
+# unlisted models are recorded at no cost.
+USAGE_MODEL_PRICES = {}
+
+# Batch essay feedback: upstream calls in flight per batch, calls a minute per
+# API key, how often a running batch shows it is alive, and how long a batch
+# (or an essay's call) may go without that before another worker resumes it.
+# Well above the upstream timeouts, so a slow call never looks dead.
+BATCH_CONCURRENCY = 16
+BATCH_RATE_LIMIT_PER_MINUTE = 300
+BATCH_HEARTBEAT_SECONDS = 15
+BATCH_STALE_SECONDS = 300
+BATCH_MAX_ATTEMPTS = 2
+BATCH_MAX_ESSAYS = 500
+# Uncompressed bytes of one .txt essay of a zip upload, and of all of them
+BATCH_MAX_ESSAY_BYTES = 100 * 1024
+BATCH_MAX_ARCHIVE_BYTES = 20 * 1024 * 1024
+
+# Routing between equivalent upstream endpoints (a list in API2D_*_ENDPOINT):
+# weight of the newest latency sample
+UPSTREAM_EWMA_ALPHA = 0.3
+
+# Circuit breaker per upstream endpoint: failures in a row that open it, how
+# long it stays open before probing, and how many probe calls go out then
+UPSTREAM_BREAKER_FAILURES = 5
+UPSTREAM_BREAKER_RESET_SECONDS = 30
+UPSTREAM_BREAKER_PROBES = 1
+
+# Seconds to connect to, and to wait for a response from, an upstream endpoint
+UPSTREAM_CONNECT_TIMEOUT = 3.05
+UPSTREAM_READ_TIMEOUT = 120
+
+# Hedging of idempotent upstream lookups: a second copy goes out after the
+# given percentile of recent latencies (the default delay, in seconds, until
+# there are enough samples), and at most UPSTREAM_HEDGE_BUDGET hedges per call.
+# Hedged calls give up reading after UPSTREAM_HEDGE_READ_TIMEOUT seconds, and
+# at most UPSTREAM_HEDGE_MAX_IN_FLIGHT of them run at once per process
+UPSTREAM_HEDGE_ENABLED = True
+UPSTREAM_HEDGE_PERCENTILE = 95
+UPSTREAM_HEDGE_DEFAULT_DELAY = 1.0
+UPSTREAM_HEDGE_BUDGET = 0.1
+UPSTREAM_HEDGE_READ_TIMEOUT = 10
+UPSTREAM_HEDGE_MAX_IN_FLIGHT = 8
+
+# Upper bound, in seconds, for the cached navbar/notification/footer fragments
+# in base.html. They are also invalidated on Notification and Site changes.
+LAYOUT_CACHE_TIMEOUT = 600
+
+# How processes hold database connections: "persistent", "pool" (psycopg 3,
+# shared by the request threads of a process) or "pgbouncer" (behind a
+# transaction pooler). See django_project/database.py. Sized from the gunicorn
+# threads per worker; DATABASE_POOL_MAX_SIZE overrides the pool size.
+DATABASE_CONNECTION_MODE = os.environ.get("DATABASE_CONNECTION_MODE", PERSISTENT)
+
+_connection_options = dict(
+    threads=int(os.environ.get("GUNICORN_THREADS", 1)),
+    pool_min_size=int(os.environ.get("DATABASE_POOL_MIN_SIZE", 1)),
+    pool_max_size=int(os.environ.get("DATABASE_POOL_MAX_SIZE", 0)) or None,
+)
 DATABASES = {
-    "default": dj_database_url.config(
-        conn_max_age=600,
-        conn_health_checks=True,
-    ),
+    "default": database_config(DATABASE_CONNECTION_MODE, **_connection_options),
 }
 
+# Read replicas, from comma separated DATABASE_REPLICA_URLS. Reads of the
+# REPLICA_MODELS go to a replica at most REPLICA_MAX_LAG_SECONDS behind; after
+# a write to one of them, reads stay on the primary for that long. Replica lag
+# is checked against the primary's WAL position every REPLICA_CHECK_SECONDS,
+# and the result is shared by all workers through the cache.
+for _number, _url in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(",")), start=1
+):
+    DATABASES[f"replica{_number}"] = {
+        **database_config(
+            DATABASE_CONNECTION_MODE, url=_url.strip(), **_connection_options
+        ),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["django_project.replicas.ReplicaRouter"]
+REPLICA_MODELS = ["pages.page", "pages.notification", "sites.site"]
+REPLICA_MAX_LAG_SECONDS = 5
+REPLICA_CHECK_SECONDS = 2
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -208,6 +416,10 @@ LOGGING = {
             "level": "WARNING",
             "propagate": True,
         },
+        # One line per routing decision, for auditing
+        "api2d.model_routing": {
+            "level": "INFO",
+        },
     },
 }
 
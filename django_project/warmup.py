@@ -0,0 +1,95 @@
+"""
+Work a fresh process would otherwise do on its first requests, run from
+gunicorn.conf.py. `warm_shared` runs once in the master before the workers
+fork, so what it loads is shared copy-on-write; `warm_worker` runs in each
+worker after the fork, for what cannot cross a fork.
+"""
+
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.urls import get_resolver
+
+
+def _timed(timings, name, func):
+    started = time.perf_counter()
+    result = func()
+    timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _compile_templates():
+    """Compile the project's templates into the cached template loader."""
+    count = 0
+    for engine in engines.all():
+        for directory in getattr(engine, "dirs", []):
+            for path in Path(directory).rglob("*.html"):
+                try:
+                    engine.get_template(path.relative_to(directory).as_posix())
+                except Exception:
+                    # A broken template fails its own page, not the boot
+                    continue
+                count += 1
+    return count
+
+
+def warm_shared():
+    """URL resolvers, templates, the Vite manifest and the lexicons."""
+    from api2d import grammar
+    from api2d.templatetags.vite_assets import load_manifest
+
+    timings = {}
+    _timed(timings, "urls", lambda: get_resolver().reverse_dict)
+    _timed(timings, "templates", _compile_templates)
+    _timed(timings, "vite manifest", load_manifest)
+    _timed(timings, "grammar lexicon", grammar.lexicon)
+    # Nothing opened here may be inherited by the workers
+    connections.close_all()
+    return timings
+
+
+def _open_connections(threads):
+    for connection in connections.all():
+        connection.ensure_connection()
+        # Django connections belong to a thread: with several request
+        # threads the one opened here would only hold a slot, unless it
+        # goes back to a pool for them to share
+        if threads > 1 and "pool" not in connection.settings_dict["OPTIONS"]:
+            connection.close()
+
+
+def _upstream_state():
+    from api2d.routing import EndpointRouter
+
+    for endpoints in (settings.API2D_OPENAI_ENDPOINT, settings.API2D_API_ENDPOINT):
+        EndpointRouter(endpoints).candidates()
+
+
+def warm_worker(threads=1):
+    """Database connections and the shared cache with the routing state."""
+    timings = {}
+    _timed(timings, "databases", lambda: _open_connections(threads))
+    _timed(timings, "upstream routing", _upstream_state)
+    return timings
+
+
+def memory_usage():
+    """
+    Resident and proportional set size of this process in MB. RSS counts
+    pages shared with the master in full; PSS splits them between the
+    processes sharing them, so it shows what preloading saves. Linux only.
+    """
+    usage = {}
+    try:
+        with open(f"/proc/{os.getpid()}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    usage[name.lower()] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return usage
@@ -1,11 +1,7 @@
-// Import all your Svelte components here
-import ExampleComponent from '@/components/ExampleComponent.svelte';
-import Recorder from '@/components/Recorder.svelte';
-import TextInput from '@/components/TextInput.svelte';
-import MarkdownArea from '@/components/MarkdownArea.svelte';
-import CelpipWritting from '@/django-pages/api2d/CelpipWritting.svelte';
-import CelpipSpeaking from '@/django-pages/api2d/CelpipSpeaking.svelte';
-import { mount } from 'svelte';
+// Svelte components are loaded on demand: each loader below becomes its own
+// chunk, so pages without a matching data-svelte-component download nothing
+// beyond this small entry file.
+import type { Component } from 'svelte';
 
 console.log('main.ts loaded')
 
@@ -41,49 +37,57 @@ function parseDataset(element: HTMLElement): ComponentProps {
   return props;
 }
 
-// Map of component names to their implementations
-const components = {
-  'recorder': Recorder,
-  'textInput': TextInput,
-  'markdownArea': MarkdownArea,
-  'celpipWritting': CelpipWritting,
-  'celpipSpeaking': CelpipSpeaking,
+// Map of component names to lazy loaders. Keep the import paths in sync with
+// the `{% vite_preload %}` tags in the Django templates.
+const components: Record<string, () => Promise<{ default: Component<any> }>> = {
+  'recorder': () => import('@/components/Recorder.svelte'),
+  'textInput': () => import('@/components/TextInput.svelte'),
+  'markdownArea': () => import('@/components/MarkdownArea.svelte'),
+  'markdownContent': () => import('@/components/MarkdownContent.svelte'),
+  'celpipWritting': () => import('@/django-pages/api2d/CelpipWritting.svelte'),
+  'celpipSpeaking': () => import('@/django-pages/api2d/CelpipSpeaking.svelte'),
 
   // Add more components here as needed
 };
 
 // Auto-initialize components when the DOM is loaded
-if (typeof window !== 'undefined') {
-  document.addEventListener('DOMContentLoaded', () => {
-    console.log('DOMContentLoaded event triggered')
-    Object.entries(components).forEach(([id, Component]) => {
-      const elements = document.querySelectorAll<HTMLElement>(`[data-svelte-component="${id}"]`);
-      
+function initComponents() {
+  Object.entries(components).forEach(async ([id, load]) => {
+    const elements = document.querySelectorAll<HTMLElement>(`[data-svelte-component="${id}"]`);
+    if (elements.length === 0) return;
+
+    try {
+      // The svelte runtime is shared by every component chunk, so it is
+      // fetched alongside the first component rather than with this entry.
+      const [{ mount }, { default: Component }] = await Promise.all([import('svelte'), load()]);
+
       elements.forEach((element) => {
         try {
-          // Debug the raw dataset
-          console.log('Raw dataset:', { ...element.dataset });
-          
           // Use our type-safe parser
           const props = parseDataset(element);
-          console.log(`Creating component with props:`, props);
-          
-          // Debug the Component constructor
-          console.log('Component constructor:', Component);
-          
-          // Create the component with the parsed props
-          console.log('Creating component with:', { target: element, props });
+          console.log(`Creating ${id} component with props:`, props);
+
           const component = mount(Component, {
             target: element,
             props: props
           });
-          
+
           console.log(`Successfully initialized ${id} component`, component);
-          return component;
         } catch (error) {
           console.error(`Error initializing ${id} component:`, error);
         }
       });
-    });
+    } catch (error) {
+      console.error(`Error loading ${id} component:`, error);
+    }
   });
 }
+
+if (typeof window !== 'undefined') {
+  // Module scripts are deferred, so the DOM may already be parsed.
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', initComponents);
+  } else {
+    initComponents();
+  }
+}
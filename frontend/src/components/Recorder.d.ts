@@ -8,10 +8,12 @@ declare module '*.svelte' {
         showPlayButton?: boolean;
         fileName?: string;
         metadata?: Record<string, any>;
+        uploadUrl?: string;
         onRecordingComplete?: (detail: {
             blob: Blob;
             fileName: string;
             metadata: Record<string, any>;
+            upload?: import('@/utils/chunkedUpload').ChunkedUpload | null;
         }) => void;
     }
     
@@ -270,6 +270,35 @@ export class ApiClient {
     }
 
     
+    /**
+     * Report the usage of an upstream call to the Django usage ledger.
+     * Failures are logged and swallowed: usage reporting must never break
+     * the practice page.
+     * @param {string} usageUrl - URL of the Django usage endpoint
+     * @param {Object} event - Model, endpoint, token counts and latency
+     */
+    async recordUsage(usageUrl: string, event: Record<string, any>): Promise<void> {
+        try {
+            await this.post(usageUrl, event);
+        } catch (error) {
+            console.error('Error recording usage:', error);
+        }
+    }
+
+    /**
+     * Save a finished attempt to the user's submission history.
+     * Like recordUsage, failures are logged and swallowed.
+     * @param {string} submissionUrl - URL of the Django submission endpoint
+     * @param {Object} submission - Kind, input, transcription, revised text and feedback
+     */
+    async saveSubmission(submissionUrl: string, submission: Record<string, any>): Promise<void> {
+        try {
+            await this.post(submissionUrl, submission);
+        } catch (error) {
+            console.error('Error saving submission:', error);
+        }
+    }
+
     /**
      * Transcribe audio file using OpenAI's API
      * @param {File} file - The audio file to transcribe
@@ -322,6 +351,81 @@ export class ApiClient {
         }
     }
 
+    /**
+     * Transcribe audio through the Django transcription endpoint, which
+     * returns the stored result for a recording it has seen before.
+     * @param {string} transcribeUrl - URL of the Django transcription endpoint
+     * @param {File} file - The audio file to transcribe
+     * @param {string} [language="en"] - The language of the audio
+     * @returns {Promise<Object>} The transcription, with `cached` set on a repeat upload
+     */
+    async transcribeCached(transcribeUrl: string, file: File, language = "en"): Promise<any> {
+        const formData = new FormData();
+        formData.append("file", file);
+        formData.append("language", language);
+
+        // As in transcribeAudio, let the browser set the multipart Content-Type
+        const headers: Record<string, string> = {};
+        if (this.useCsrf && this.csrfToken) {
+            headers['X-CSRFToken'] = this.csrfToken;
+        }
+        const response = await fetch(transcribeUrl, {
+            method: 'POST',
+            body: formData,
+            headers: headers,
+            credentials: 'same-origin',
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Failed to transcribe audio');
+        }
+        return data;
+    }
+
+    /**
+     * POST to a Django endpoint that answers with server-sent events and
+     * hand each event to `onEvent` as it arrives.
+     * @param {string} url - URL of the streaming endpoint
+     * @param {Object} data - JSON body of the request
+     * @param {Function} onEvent - Called with the event name and its parsed data
+     */
+    async streamEvents(url: string, data: any, onEvent: (event: string, data: any) => void): Promise<void> {
+        const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+        if (this.useCsrf && this.csrfToken) {
+            headers['X-CSRFToken'] = this.csrfToken;
+        }
+        const response = await fetch(url, {
+            method: 'POST',
+            body: JSON.stringify(data),
+            headers: headers,
+            credentials: 'same-origin',
+        });
+        if (!response.ok || !response.body) {
+            const errorData = await response.json().catch(() => ({}));
+            throw new ApiError(errorData.error || `HTTP error! status: ${response.status}`, response.status, response, errorData);
+        }
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += value;
+            // Events are separated by a blank line; the last piece may be partial
+            const blocks = buffer.split('\n\n');
+            buffer = blocks.pop() ?? '';
+            for (const block of blocks) {
+                let event = 'message';
+                let payload = '';
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) payload += line.slice(6);
+                }
+                onEvent(event, payload ? JSON.parse(payload) : null);
+            }
+        }
+    }
+
     /**
      * Call OpenAI's Chat Completions API
      * @param {string} apiKey - OpenAI API key
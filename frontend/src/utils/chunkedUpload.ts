@@ -0,0 +1,141 @@
+// CRC-32 (IEEE), the same checksum as Python's zlib.crc32
+const CRC_TABLE = (() => {
+    const table = new Uint32Array(256);
+    for (let n = 0; n < 256; n++) {
+        let c = n;
+        for (let k = 0; k < 8; k++) {
+            c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+        }
+        table[n] = c >>> 0;
+    }
+    return table;
+})();
+
+/**
+ * Continue a CRC-32 over more bytes, so the checksum of a whole upload is
+ * rolled forward slice by slice.
+ */
+export function crc32(bytes: Uint8Array, crc = 0): number {
+    crc = ~crc >>> 0;
+    for (let i = 0; i < bytes.length; i++) {
+        crc = CRC_TABLE[(crc ^ bytes[i]) & 0xff] ^ (crc >>> 8);
+    }
+    return ~crc >>> 0;
+}
+
+const hex = (crc: number) => crc.toString(16).padStart(8, '0');
+
+function csrfToken(): string | undefined {
+    return document.cookie
+        .split('; ')
+        .find(row => row.startsWith('csrftoken='))
+        ?.split('=')[1];
+}
+
+/**
+ * Upload of a recording in slices while it is being recorded, so only the
+ * last slice is left to send when recording stops. Slices are sent one at a
+ * time, each with its offset and the rolling CRC-32 of the upload; when the
+ * server reports a different offset (a slice lost or repeated on a flaky
+ * connection) the upload resumes from the server's offset.
+ */
+export class ChunkedUpload {
+    private uploadUrl = '';
+    private bytes = new Uint8Array(0);
+    private crc = 0;
+    private sent = 0;
+    private queue: Promise<void>;
+    private error: Error | null = null;
+
+    constructor(createUrl: string, name: string, contentType: string) {
+        this.queue = this.run(async () => {
+            const { data } = await this.request(createUrl, 'POST', JSON.stringify({ name, content_type: contentType }), {
+                'Content-Type': 'application/json',
+            });
+            this.uploadUrl = `${createUrl}${data.id}/`;
+        });
+    }
+
+    /** Queue a MediaRecorder timeslice. */
+    append(slice: Blob): void {
+        this.queue = this.queue.then(() => this.run(async () => {
+            const data = new Uint8Array(await slice.arrayBuffer());
+            const bytes = new Uint8Array(this.bytes.length + data.length);
+            bytes.set(this.bytes);
+            bytes.set(data, this.bytes.length);
+            this.bytes = bytes;
+            this.crc = crc32(data, this.crc);
+            await this.flush();
+        }));
+    }
+
+    /**
+     * Wait for the queued slices, then transcribe the recording. Throws if
+     * any part of the upload failed, so the caller can send the whole file.
+     */
+    async transcribe(language = 'en'): Promise<any> {
+        await this.queue;
+        if (this.error) throw this.error;
+        const { data } = await this.request(
+            `${this.uploadUrl}transcribe/`, 'POST', JSON.stringify({ language }),
+            { 'Content-Type': 'application/json' },
+        );
+        return data;
+    }
+
+    // Once a step failed the rest are skipped; the error is kept for transcribe()
+    private async run(step: () => Promise<void>): Promise<void> {
+        if (this.error) return;
+        try {
+            await step();
+        } catch (error) {
+            this.error = error instanceof Error ? error : new Error(String(error));
+        }
+    }
+
+    private async flush(attempt = 0): Promise<void> {
+        if (this.sent >= this.bytes.length) return;
+        const body = this.bytes.subarray(this.sent);
+        let response;
+        try {
+            response = await this.request(this.uploadUrl, 'PUT', body, {
+                'Content-Type': 'application/octet-stream',
+                'X-Upload-Offset': String(this.sent),
+                'X-Upload-Checksum': hex(this.crc),
+            }, [409, 422]);
+        } catch (error) {
+            // Network error: try again, the server tells if the slice got in
+            if (attempt >= 3 || !(error instanceof TypeError)) throw error;
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+            return this.flush(attempt + 1);
+        }
+        const { status, data } = response;
+        if (status === 200) {
+            this.sent = data.offset;
+            return;
+        }
+        // Out of step with the server: resend from where it is
+        if (attempt >= 3 || data.offset === undefined || data.offset > this.bytes.length) {
+            throw new Error(data.error || 'Failed to upload the recording');
+        }
+        this.sent = data.offset;
+        await this.flush(attempt + 1);
+    }
+
+    private async request(
+        url: string, method: string, body: BodyInit, headers: Record<string, string>, expected: number[] = [],
+    ): Promise<{ status: number; data: any }> {
+        const token = csrfToken();
+        const response = await fetch(url, {
+            method,
+            body,
+            headers: token ? { ...headers, 'X-CSRFToken': token } : headers,
+            credentials: 'same-origin',
+        });
+        const data = await response.json();
+        if (!response.ok && !expected.includes(response.status)) {
+            throw new Error(data.error || `Upload request failed (${response.status})`);
+        }
+        return { status: response.status, data };
+    }
+}
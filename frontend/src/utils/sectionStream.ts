@@ -0,0 +1,57 @@
+import type { ApiClient } from './apiClient';
+
+export type SectionResult = {
+    sections: Record<string, string>;
+    usage: Record<string, number>;
+    // The model the server routed the request to
+    model?: string;
+};
+
+const FEEDBACK = 'grammar_focused_feedback';
+
+/**
+ * Stream an improvement from the Django streaming endpoint. `onSection` is
+ * called with the text of a section so far every time it grows, so the
+ * revised text can be shown while the feedback is still being generated.
+ * The local grammar check arrives first and is shown as the feedback until
+ * the model's feedback, with the local findings merged in, replaces it.
+ * An `error` event, e.g. for an answer cut off at max_tokens, is thrown once
+ * the stream has ended, so the server still gets to record its usage.
+ */
+export async function streamImprovement(
+    client: ApiClient,
+    url: string,
+    data: Record<string, any>,
+    onSection: (section: string, text: string) => void,
+): Promise<SectionResult> {
+    const result: SectionResult = { sections: {}, usage: {} };
+    let localFindings = false;
+    let error = '';
+    await client.streamEvents(url, data, (event, payload) => {
+        if (event === 'grammar_check') {
+            localFindings = payload.count > 0;
+            if (localFindings) onSection(FEEDBACK, payload.table);
+        } else if (event === 'section_start') {
+            result.sections[payload.section] = '';
+        } else if (event === 'section_delta') {
+            result.sections[payload.section] = (result.sections[payload.section] ?? '') + payload.text;
+            // Keep the local findings up until the merged feedback comes
+            if (payload.section !== FEEDBACK || !localFindings) {
+                onSection(payload.section, result.sections[payload.section]);
+            }
+        } else if (event === 'section_replace') {
+            // The finished section, e.g. the revised text with its highlights
+            result.sections[payload.section] = payload.text;
+            onSection(payload.section, payload.text);
+        } else if (event === 'done') {
+            result.usage = payload.usage ?? {};
+            result.model = payload.model;
+        } else if (event === 'error') {
+            error = payload.error;
+        }
+    });
+    if (error) {
+        throw new Error(error);
+    }
+    return result;
+}
@@ -9,10 +9,15 @@ export default defineConfig(({ command }) => ({
       '@': path.resolve('./src')
     }
   },
-  base: command === 'build' ? '/static/' : '/',
+  // Chunks are imported relative to this base, so it must match where
+  // collectstatic serves the build output.
+  base: command === 'build' ? '/static/frontend/' : '/',
   build: {
     outDir: '../static/frontend',
     emptyOutDir: true,
+    // .vite/manifest.json maps each lazily imported component to its chunk and
+    // dependencies; the `vite_preload` template tag reads it.
+    manifest: true,
     rollupOptions: {
       input: {
         // main: './index.html',
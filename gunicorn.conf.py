@@ -0,0 +1,91 @@
+"""
+Gunicorn settings, read from ./gunicorn.conf.py (or `-c gunicorn.conf.py`).
+
+The app is loaded once in the master and the workers are forked from it,
+so Django, allauth, dynaconf and the warmed caches are shared copy-on-write
+instead of being imported by every worker. Each worker then opens its own
+connections before it takes requests. Worker RSS/PSS and the latency of the
+first request of each worker are logged, to see what this buys.
+"""
+
+import os
+import time
+
+# Sizing: GUNICORN_WORKERS processes (WEB_CONCURRENCY is what hosts set),
+# each with GUNICORN_THREADS request threads. Streamed improvements hold a
+# thread for as long as the model writes, so the default is threaded.
+_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else 1
+workers = int(
+    os.environ.get("GUNICORN_WORKERS")
+    or os.environ.get("WEB_CONCURRENCY")
+    or _cpus * 2 + 1
+)
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# The database pool is sized from the same variable (settings.py)
+os.environ["GUNICORN_THREADS"] = str(threads)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+# Above the upstream read timeout, so a slow model answer is not cut off
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 150))
+graceful_timeout = 30
+keepalive = 5
+
+loglevel = "info"
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from django_project.warmup import memory_usage, warm_shared
+
+    timings = warm_shared()
+    server.log.info("Warmed before fork: %s; master %s", timings, memory_usage())
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from django_project.warmup import warm_worker
+
+    try:
+        timings = warm_worker(threads)
+    except Exception:
+        # A database that is not up yet must not keep the worker from booting
+        worker.log.exception("Worker warm-up failed")
+        return
+    worker.log.info("Worker %s warmed: %s", worker.pid, timings)
+
+
+def post_worker_init(worker):
+    from django_project.warmup import memory_usage, warm_shared, warm_worker
+
+    if not preload_app:
+        # Each worker loaded the app itself, so it warms it itself
+        try:
+            timings = warm_shared(), warm_worker(threads)
+        except Exception:
+            # As in post_fork: boot the worker anyway
+            worker.log.exception("Worker warm-up failed")
+        else:
+            worker.log.info("Worker %s warmed: %s %s", worker.pid, *timings)
+    worker.log.info("Worker %s ready: %s", worker.pid, memory_usage())
+
+
+def pre_request(worker, req):
+    if not hasattr(worker, "first_request_started"):
+        worker.first_request_started = time.perf_counter()
+
+
+def post_request(worker, req, environ, resp):
+    if getattr(worker, "first_request_logged", False):
+        return
+    worker.first_request_logged = True
+    worker.log.info(
+        "Worker %s first request %s in %.0f ms",
+        worker.pid,
+        req.path,
+        (time.perf_counter() - worker.first_request_started) * 1000,
+    )
@@ -1,9 +1,16 @@
 from django.contrib import admin
 from django.utils import timezone
 from django.utils.html import format_html
+from django_project.admin_utils import EstimatedCountPaginator, MonthListFilter
 from .models import Page, Notification
 
 
+class StartMonthFilter(MonthListFilter):
+    title = "start month"
+    parameter_name = "start_month"
+    field_name = "start_date"
+
+
 @admin.register(Page)
 class PageAdmin(admin.ModelAdmin):
     list_display = (
@@ -40,10 +47,11 @@ class NotificationAdmin(admin.ModelAdmin):
         "start_date",
         "end_date",
     )
-    list_filter = ("is_active", "message_type", "start_date")
+    list_filter = ("is_active", "message_type", StartMonthFilter)
     search_fields = ("title", "message")
-    date_hierarchy = "start_date"
     ordering = ("-start_date",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {"fields": ("title", "message", "message_type", "is_active")}),
         (
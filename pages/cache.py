@@ -0,0 +1,78 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import Notification, Page
+
+LAYOUT_VERSION_KEY = "pages:layout_version"
+
+
+def _seconds_until_next_notification_change(now):
+    """
+    Notifications switch on and off by date without being saved, so the layout
+    version must expire at the next start or end date.
+    """
+    upcoming = Notification.objects.filter(is_active=True).aggregate(
+        next_start=Min("start_date", filter=Q(start_date__gt=now)),
+        next_end=Min("end_date", filter=Q(end_date__gt=now)),
+    )
+    timeout = settings.LAYOUT_CACHE_TIMEOUT
+    for boundary in upcoming.values():
+        if boundary is not None:
+            timeout = min(timeout, (boundary - now).total_seconds())
+    return max(1, int(timeout))
+
+
+def layout_version():
+    """
+    Returns a token that changes whenever the cached layout fragments in
+    base.html go stale: on Notification or Site changes and whenever a
+    scheduled notification starts or ends.
+    """
+    version = cache.get(LAYOUT_VERSION_KEY)
+    if version is None:
+        version = f"{time.time_ns():x}"
+        timeout = _seconds_until_next_notification_change(timezone.now())
+        cache.set(LAYOUT_VERSION_KEY, version, timeout)
+    return version
+
+
+def invalidate_layout():
+    """Drops every cached layout fragment by retiring the current version."""
+    cache.delete(LAYOUT_VERSION_KEY)
+
+
+def page_cache_key(slug):
+    return f"pages:page_updated:{slug}"
+
+
+def page_updated_at(slug):
+    """
+    When the active page with this slug last changed, or None if there is
+    no such page. Cached, so a warm conditional GET needs no query.
+    """
+    key = page_cache_key(slug)
+    cached = cache.get(key)
+    if cached is None:
+        updated_at = (
+            Page.objects.filter(slug=slug, is_active=True)
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+        # Bounded, since a renamed slug or a queryset update is not seen
+        cache.set(key, {"updated_at": updated_at}, settings.LAYOUT_CACHE_TIMEOUT)
+        return updated_at
+    return cached["updated_at"]
+
+
+def invalidate_page(slug):
+    cache.delete(page_cache_key(slug))
+
+
+def layout_changed_at(version):
+    """The time a `layout_version` token was issued, for Last-Modified."""
+    return datetime.fromtimestamp(int(version, 16) / 1e9, tz=dt_timezone.utc)
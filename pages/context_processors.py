@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.utils import timezone
+from .cache import layout_version
 from .models import Notification
 
 
@@ -20,3 +22,15 @@ def active_notifications(request):
     )
 
     return {"notifications": notifications}
+
+
+def layout_cache(request):
+    """
+    Context processor providing the key and timeout for the cached base.html
+    fragments. `layout_version` is passed uncalled so the cache lookup only
+    happens when a template renders a fragment.
+    """
+    return {
+        "layout_version": layout_version,
+        "layout_cache_timeout": settings.LAYOUT_CACHE_TIMEOUT,
+    }
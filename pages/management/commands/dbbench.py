@@ -0,0 +1,98 @@
+import threading
+import time
+
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark request throughput against database connections in use, "
+        "for the current DATABASE_CONNECTION_MODE. Each simulated request "
+        "goes through the request_started/request_finished signals, so "
+        "connections are opened, reused, returned to the pool or closed as "
+        "they would be under gunicorn."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            default="1,4,8,16",
+            help="Comma separated numbers of concurrent request threads.",
+        )
+        parser.add_argument(
+            "--seconds", type=float, default=5, help="Duration of each run."
+        )
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(n) for n in options["threads"].split(",")]
+        except ValueError:
+            raise CommandError("--threads must be comma separated integers.")
+        alias = options["database"]
+        connection = connections[alias]
+        pool = connection.settings_dict.get("OPTIONS", {}).get("pool")
+        self.stdout.write(
+            f"{connection.vendor}, conn_max_age="
+            f"{connection.settings_dict.get('CONN_MAX_AGE')}, pool={pool or 'off'}"
+        )
+        self.stdout.write(f"{'threads':>8} {'req/s':>10} {'p95 ms':>8} {'conns':>6}")
+        for threads in levels:
+            rate, p95, peak = self.run(alias, threads, options["seconds"])
+            self.stdout.write(
+                f"{threads:>8} {rate:>10.1f} {p95:>8.1f} "
+                f"{'n/a' if peak is None else peak:>6}"
+            )
+        connections.close_all()
+
+    def run(self, alias, threads, seconds):
+        deadline = time.perf_counter() + seconds
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                try:
+                    # About what a page costs: a couple of small queries
+                    Site.objects.using(alias).filter(pk=1).exists()
+                    Site.objects.using(alias).count()
+                finally:
+                    request_finished.send(sender=self.__class__)
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            connections.close_all()
+
+        samples = []
+        done = threading.Event()
+        sampler = threading.Thread(target=self.sample, args=(alias, samples, done))
+        sampler.start()
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        done.set()
+        sampler.join()
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+        return len(latencies) / seconds, p95, max(samples, default=None)
+
+    def sample(self, alias, samples, done):
+        """Peak backends on this database, without the sampler's own."""
+        connection = connections[alias]
+        if connection.vendor != "postgresql":
+            return
+        while not done.wait(0.1):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                )
+                samples.append(cursor.fetchone()[0])
+        connection.close()
@@ -0,0 +1,184 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+# Same defaults collectstatic uses, so the fingerprint covers exactly the
+# files that would be collected.
+IGNORE_PATTERNS = ["CVS", ".*", "*~"]
+
+
+def static_fingerprint():
+    """
+    Hash the path, size and mtime of every file the staticfiles finders
+    would collect. Returns the digest and the list of collected paths.
+    """
+    entries = []
+    for finder in finders.get_finders():
+        for path, storage in finder.list(IGNORE_PATTERNS):
+            prefix = getattr(storage, "prefix", None)
+            name = os.path.join(prefix, path) if prefix else path
+            stat = os.stat(storage.path(path))
+            entries.append((name.replace(os.sep, "/"), stat.st_size, stat.st_mtime_ns))
+
+    entries.sort()
+    digest = hashlib.sha256()
+    for name, size, mtime in entries:
+        digest.update(f"{name}\0{size}\0{mtime}\n".encode("utf-8"))
+    return digest.hexdigest(), [name for name, _, _ in entries]
+
+
+def read_fingerprint():
+    try:
+        with open(settings.FASTBOOT_FINGERPRINT_FILE) as f:
+            return json.load(f).get("static")
+    except (OSError, ValueError):
+        return None
+
+
+def write_fingerprint(fingerprint):
+    with open(settings.FASTBOOT_FINGERPRINT_FILE, "w") as f:
+        json.dump({"static": fingerprint}, f)
+
+
+def manifest_covers(paths):
+    """Check that the WhiteNoise manifest lists every source path."""
+    manifest_name = getattr(staticfiles_storage, "manifest_name", None)
+    if not manifest_name:
+        # Not a manifest storage, nothing to compare against.
+        return False
+    try:
+        with staticfiles_storage.manifest_storage.open(manifest_name) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    hashed = manifest.get("paths", {})
+    return all(path in hashed for path in paths)
+
+
+def migration_fingerprint(graph):
+    digest = hashlib.sha256()
+    for app_label, name in sorted(graph.nodes):
+        digest.update(f"{app_label}.{name}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def static_up_to_date():
+    """
+    Whether the collected files match the sources: the fingerprint stored
+    by `fastboot --collect` is current and the manifest lists every path.
+    Returns the verdict and the number of source files.
+    """
+    fingerprint, paths = static_fingerprint()
+    return read_fingerprint() == fingerprint and manifest_covers(paths), len(paths)
+
+
+def collect_static():
+    fingerprint, _ = static_fingerprint()
+    call_command("collectstatic", interactive=False, verbosity=0)
+    write_fingerprint(fingerprint)
+
+
+def migration_plan(database=DEFAULT_DB_ALIAS):
+    """The migration graph and the migrations not applied to `database`."""
+    executor = MigrationExecutor(connections[database])
+    graph = executor.loader.graph
+    return graph, executor.migration_plan(graph.leaf_nodes())
+
+
+class Command(BaseCommand):
+    help = (
+        "At build time (`fastboot --collect`), run collectstatic and store the "
+        "fingerprint of the sources. At start, verify the collected files, "
+        "migrate only when needed, then exec the given server command "
+        "(e.g. `fastboot gunicorn django_project.wsgi`)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to check for unapplied migrations.",
+        )
+        parser.add_argument(
+            "--collect",
+            action="store_true",
+            help="Run collectstatic and store the fingerprint, for the build.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Run collectstatic and migrate even if nothing changed.",
+        )
+        parser.add_argument(
+            "server",
+            nargs=argparse.REMAINDER,
+            help="Command to exec once the app is ready.",
+        )
+
+    def handle(self, *args, **options):
+        boot_started = time.perf_counter()
+        force = options["force"]
+
+        started = time.perf_counter()
+        if options["collect"]:
+            collect_static()
+            self.timing("collectstatic", started, "ran")
+            return
+
+        up_to_date, count = static_up_to_date()
+        if up_to_date and not force:
+            self.timing("static check", started, f"{count} files up to date")
+        elif force:
+            collect_static()
+            self.timing("collectstatic", started, "ran, forced")
+        else:
+            # Collected in the build phase, so every container shares the
+            # work; a stale image is a build problem, not one to redo here.
+            raise CommandError(
+                "Collected static files do not match the sources. Run "
+                "`manage.py fastboot --collect` in the build."
+            )
+
+        started = time.perf_counter()
+        graph, plan = migration_plan(options["database"])
+        self.timing(
+            "migration check",
+            started,
+            f"graph {migration_fingerprint(graph)[:12]}, {len(plan)} unapplied",
+        )
+
+        started = time.perf_counter()
+        if plan or force:
+            call_command("migrate", database=options["database"], interactive=False)
+            self.timing("migrate", started, "ran")
+        else:
+            self.timing("migrate", started, "skipped, nothing to apply")
+
+        connections.close_all()
+        self.timing("boot total", boot_started)
+
+        server = options["server"]
+        if server and server[0] == "--":
+            server = server[1:]
+        if not server:
+            return
+        self.stdout.flush()
+        try:
+            os.execvp(server[0], server)
+        except OSError as e:
+            raise CommandError(f"Could not exec {server[0]}: {e}")
+
+    def timing(self, step, started, detail=""):
+        elapsed = time.perf_counter() - started
+        suffix = f" ({detail})" if detail else ""
+        self.stdout.write(f"fastboot: {step} {elapsed:.3f}s{suffix}")
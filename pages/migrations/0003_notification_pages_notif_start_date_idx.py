@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pages", "0002_notification"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["start_date"], name="pages_notif_start_date_idx"
+            ),
+        ),
+    ]
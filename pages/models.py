@@ -43,6 +43,7 @@ class Notification(models.Model):
         verbose_name_plural = _("Notifications")
         indexes = [
             models.Index(fields=["is_active", "start_date", "end_date"]),
+            models.Index(fields=["start_date"], name="pages_notif_start_date_idx"),
         ]
 
     def __str__(self):
@@ -0,0 +1,19 @@
+from django.contrib.sites.models import Site
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_layout, invalidate_page
+from .models import Notification, Page
+
+
+@receiver([post_save, post_delete], sender=Notification)
+@receiver([post_save, post_delete], sender=Site)
+def layout_content_changed(sender, **kwargs):
+    """Drop the cached base.html fragments when what they render changes."""
+    invalidate_layout()
+
+
+@receiver([post_save, post_delete], sender=Page)
+def page_changed(sender, instance, **kwargs):
+    """Drop the cached validators of the page's conditional GETs."""
+    invalidate_page(instance.slug)
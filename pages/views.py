@@ -1,12 +1,69 @@
+import hashlib
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import DetailView, View
 from django.contrib import messages
-from django.utils.translation import gettext_lazy as _
+from django.utils.decorators import method_decorator
+from django.utils.translation import get_language, gettext_lazy as _
 from django.http import Http404, HttpResponseRedirect
 from django.urls import reverse
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from api2d.templatetags.vite_assets import manifest_version
+from .cache import layout_changed_at, layout_version, page_updated_at
 from .models import Page
 
 
+def page_validators(request, slug="home"):
+    """
+    Returns (etag, last_modified) for a page view, computed once per request.
+    Both are None, so the page is always rendered, when there is no active
+    page or when flash messages are waiting to be shown once.
+
+    The ETag covers everything the response depends on: the page, the
+    notifications and site (the layout version), the user and language the
+    navbar is rendered for, and the frontend build.
+    """
+    if not hasattr(request, "_page_validators"):
+        updated_at = page_updated_at(slug)
+        if updated_at is None or len(messages.get_messages(request)):
+            request._page_validators = (None, None)
+        else:
+            version = layout_version()
+            parts = [
+                slug,
+                updated_at.isoformat(),
+                version,
+                get_language() or "",
+                str(request.user.pk or ""),
+                manifest_version(),
+            ]
+            etag = hashlib.md5("\0".join(parts).encode("utf-8")).hexdigest()
+            request._page_validators = (
+                etag,
+                max(updated_at, layout_changed_at(version)),
+            )
+    return request._page_validators
+
+
+def page_etag(request, **kwargs):
+    return page_validators(request, **kwargs)[0]
+
+
+def page_last_modified(request, **kwargs):
+    return page_validators(request, **kwargs)[1]
+
+
+# Conditional GET: unchanged pages get a 304 without rendering. The response
+# varies with the session cookie, since it shows who is logged in.
+page_conditional = [
+    vary_on_cookie,
+    condition(etag_func=page_etag, last_modified_func=page_last_modified),
+]
+
+
+@method_decorator(page_conditional, name="dispatch")
 class PageDetailView(DetailView):
     model = Page
     template_name = "pages/page_detail.html"
@@ -23,6 +80,7 @@ class PageDetailView(DetailView):
         return context
 
 
+@method_decorator(page_conditional, name="dispatch")
 class HomePageView(View):
     """View to display the home page based on the Page model with slug 'home'"""
 
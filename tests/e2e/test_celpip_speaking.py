@@ -55,19 +55,19 @@ class TestCelpipSpeaking(DjangoE2ETestCase):
             page = self.open(self.upload_url, playwright)
 
             # Enable request interception
-            page.route(
-                "**/v1/audio/transcriptions*",
-                lambda route: route.fulfill(
-                    status=200,
-                    content_type="application/json",
-                    body=json.dumps(
-                        {
-                            "text": "This is a test transcription from the mock API",
-                            "usage": {"final_total": 200},
-                        }
-                    ),
+            transcription_mock = lambda route: route.fulfill(
+                status=200,
+                content_type="application/json",
+                body=json.dumps(
+                    {
+                        "text": "This is a test transcription from the mock API",
+                        "usage": {"final_total": 200},
+                    }
                 ),
             )
+            page.route("**/v1/audio/transcriptions*", transcription_mock)
+            # The page transcribes through Django's caching endpoint
+            page.route("**/celpip/transcribe/", transcription_mock)
 
             page.route(
                 "**/dashboard/billing/credit_grants*",
@@ -117,6 +117,24 @@ class TestCelpipSpeaking(DjangoE2ETestCase):
                 ),
             )
 
+            # The page streams the improvement through Django
+            page.route(
+                "**/celpip/improve/stream/",
+                lambda route: route.fulfill(
+                    status=200,
+                    content_type="text/event-stream",
+                    body=(
+                        'event: section_start\ndata: {"section": "revised_text", "text": ""}\n\n'
+                        'event: section_delta\ndata: {"section": "revised_text", "text": "This is a test revised text"}\n\n'
+                        'event: section_end\ndata: {"section": "revised_text", "text": ""}\n\n'
+                        'event: section_start\ndata: {"section": "grammar_focused_feedback", "text": ""}\n\n'
+                        'event: section_delta\ndata: {"section": "grammar_focused_feedback", "text": "Test feedback"}\n\n'
+                        'event: section_end\ndata: {"section": "grammar_focused_feedback", "text": ""}\n\n'
+                        'event: done\ndata: {"usage": {"output_tokens": 10}}\n\n'
+                    ),
+                ),
+            )
+
             page.reload()
 
             try:
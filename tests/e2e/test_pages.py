@@ -98,6 +98,31 @@ class TestHomePageView(DjangoE2ETestCase):
                 )
             ).to_be_visible()
 
+    def test_homepage_loads_assets_from_own_origin(self):
+        """Test that the layout does not depend on third-party CDNs."""
+        from pages.models import Page
+
+        Page.objects.create(
+            title="Home",
+            slug="home",
+            content="# Welcome!",
+            is_active=True,
+        )
+
+        with sync_playwright() as playwright:
+            browser = self.setup_browser(playwright)
+            self.page = browser.new_page()
+            requested = []
+            self.page.on("request", lambda request: requested.append(request.url))
+            self.page.goto(f"{self.live_server_url}/")
+            self.page.wait_for_load_state("networkidle")
+
+            expect(self.page.locator('h1:has-text("Welcome!")')).to_be_visible()
+            third_party = [
+                url for url in requested if not url.startswith(self.live_server_url)
+            ]
+            assert third_party == []
+
     @pytest.mark.skip(
         reason="Home page is automatically created in the database when visiting the"
     )
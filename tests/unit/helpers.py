@@ -0,0 +1,14 @@
+from django.test import override_settings
+
+# Unit tests render templates without running collectstatic, so the manifest
+# storage would fail on every {% static %} tag. They also get a private
+# in-memory cache instead of the on-disk one the dev server uses.
+unit_test_settings = override_settings(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    },
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
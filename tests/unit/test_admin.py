@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey
+from pages.models import Notification
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+
+@unit_test_settings
+class TestApi2dKeyAdmin(TestCase):
+    """Test that the API key changelist does not grow with the table."""
+
+    url = "/admin/api2d/api2dkey/"
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(self.admin)
+        self.group = Api2dGroup2ExpirationMapping.objects.create(
+            group="default", type_id="1", validate_days=30
+        )
+
+    def add_keys(self, count, prefix="sk"):
+        for i in range(count):
+            user = User.objects.create_user(f"{prefix}-user-{i}")
+            Api2dKey.objects.create(
+                key=f"{prefix}-{i}",
+                user=user,
+                group=self.group,
+                created_at=timezone.now(),
+            )
+
+    def changelist_queries(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+        assert response.status_code == 200
+        return response, [q["sql"] for q in ctx.captured_queries]
+
+    def test_query_count_is_flat(self):
+        self.add_keys(2)
+        self.changelist_queries()  # warm the session and user caches
+        _, few = self.changelist_queries()
+        self.add_keys(10, prefix="more")
+        _, many = self.changelist_queries()
+
+        assert len(many) == len(few)
+
+    def test_search_matches_prefix_only(self):
+        self.add_keys(2, prefix="abc")
+        self.add_keys(2, prefix="xyz")
+
+        response, queries = self.changelist_queries(q="abc")
+
+        self.assertContains(response, "abc-0")
+        self.assertNotContains(response, "xyz-0")
+        # No leading wildcard, so the unique indexes can serve the lookup.
+        assert any("'abc%'" in q for q in queries)
+        assert not any("%abc" in q for q in queries)
+        # One indexed lookup per field, combined by id
+        assert any("UNION" in q for q in queries)
+
+    def test_search_matches_username_prefix(self):
+        self.add_keys(1, prefix="abc")
+        self.add_keys(1, prefix="xyz")
+
+        response, _ = self.changelist_queries(q="xyz-user")
+
+        self.assertContains(response, "xyz-0")
+        self.assertNotContains(response, "abc-0")
+
+    def test_month_filter(self):
+        self.add_keys(1, prefix="old")
+        self.add_keys(1, prefix="new")
+        old = Api2dKey.objects.get(key="old-0")
+        Api2dKey.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=70)
+        )
+        month = timezone.localtime(timezone.now()).strftime("%Y-%m")
+
+        response, _ = self.changelist_queries(created_month=month)
+
+        self.assertContains(response, "new-0")
+        self.assertNotContains(response, "old-0")
+
+
+@unit_test_settings
+class TestNotificationAdmin(TestCase):
+    def test_changelist_renders_start_month_buckets(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        Notification.objects.create(title="Maintenance", message="Tonight")
+
+        response = self.client.get("/admin/pages/notification/")
+
+        assert response.status_code == 200
+        self.assertContains(response, timezone.now().strftime("%B %Y"))
@@ -0,0 +1,293 @@
+import io
+import time
+import zipfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from api2d.batches import (
+    RateLimiter,
+    claim_batch,
+    claim_essay,
+    create_batch,
+    parse_essays,
+    run_batch,
+    stream_archive,
+)
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey, BatchEssay
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+REPLY = {
+    "content": [{"text": "Better essay.</revised_text><grammar_focused_feedback>Tips"}],
+    "usage": {"input_tokens": 100, "output_tokens": 20},
+}
+
+
+def make_user_with_key(username="tutor"):
+    user = User.objects.create_user(username, f"{username}@example.com", "pw")
+    group = Api2dGroup2ExpirationMapping.objects.create(
+        group=f"{username}-group", type_id="1", validate_days=30
+    )
+    Api2dKey.objects.create(
+        key=f"fk-{username}", user=user, group=group, created_at=timezone.now()
+    )
+    return user
+
+
+class TestParseEssays(SimpleTestCase):
+    """Test reading essays from CSV and zip uploads."""
+
+    def test_csv(self):
+        upload = SimpleUploadedFile(
+            "class.csv", b'name,essay\nAnn,"Dear Sir,\nHello."\n,Second\nBob,  \n'
+        )
+
+        assert parse_essays(upload) == [
+            ("Ann", "Dear Sir,\nHello."),
+            ("essay-2", "Second"),
+        ]
+
+    def test_zip_of_text_files(self):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, "w") as archive:
+            archive.writestr("class/bob.txt", "Essay B")
+            archive.writestr("class/ann.txt", "Essay A")
+            archive.writestr("class/notes.pdf", "ignored")
+            archive.writestr("__MACOSX/class/._ann.txt", "junk")
+
+        essays = parse_essays(SimpleUploadedFile("class.zip", data.getvalue()))
+
+        assert essays == [("ann", "Essay A"), ("bob", "Essay B")]
+
+    @override_settings(BATCH_MAX_ESSAY_BYTES=100, BATCH_MAX_ARCHIVE_BYTES=150)
+    def test_zip_sizes_are_checked_before_reading(self):
+        def archive(**files):
+            data = io.BytesIO()
+            with zipfile.ZipFile(data, "w", compression=zipfile.ZIP_DEFLATED) as f:
+                for name, text in files.items():
+                    f.writestr(f"{name}.txt", text)
+            return SimpleUploadedFile("class.zip", data.getvalue())
+
+        bomb = archive(ann="Essay A", bomb="a" * 10_000)
+        with (
+            mock.patch("zipfile.ZipFile.open") as read,
+            self.assertRaisesMessage(ValueError, "bomb.txt is too large"),
+        ):
+            parse_essays(bomb)
+        read.assert_not_called()
+        with self.assertRaisesMessage(ValueError, "too much text"):
+            parse_essays(archive(ann="a" * 80, bob="b" * 80))
+
+    def test_csv_without_essay_column(self):
+        with self.assertRaisesMessage(ValueError, '"essay" column'):
+            parse_essays(SimpleUploadedFile("x.csv", b"name,text\na,b\n"))
+
+
+class TestRateLimiter(SimpleTestCase):
+    def test_calls_are_spaced_after_the_burst(self):
+        limiter = RateLimiter(per_minute=1200, burst=2)  # one call per 50 ms
+
+        started = time.monotonic()
+        for _ in range(4):
+            limiter.acquire()
+
+        assert time.monotonic() - started >= 0.09
+
+
+@unit_test_settings
+class TestRunBatch(TransactionTestCase):
+    """Test processing, retrying and resuming a batch."""
+
+    def setUp(self):
+        patcher = mock.patch("api2d.batches.record_usage")
+        self.record_usage = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = make_user_with_key()
+        self.batch = create_batch(
+            self.user, "Class 7B", [(f"student-{i}", f"Essay {i}") for i in range(6)]
+        )
+
+    def test_failed_calls_are_retried_then_marked_failed(self):
+        calls = []
+
+        def reply(payload):
+            essay = payload["messages"][1]["content"]
+            calls.append(essay)
+            # Essay 1 fails once, essay 2 always fails.
+            if "Essay 2" in essay or ("Essay 1" in essay and calls.count(essay) == 1):
+                return None
+            return REPLY
+
+        with mock.patch(
+            "api2d.batches.Api2dClient.create_claude_message", side_effect=reply
+        ):
+            run_batch(self.batch.pk, concurrency=3)
+
+        essays = {e.name: e for e in self.batch.essays.all()}
+        assert essays["student-1"].status == BatchEssay.STATUS_DONE
+        assert essays["student-1"].attempts == 2
+        assert essays["student-2"].status == BatchEssay.STATUS_FAILED
+        assert essays["student-0"].revised_text == "Better essay."
+        assert essays["student-0"].feedback == "Tips"
+        assert len(calls) == 8
+        assert self.record_usage.call_count == 5
+        self.batch.refresh_from_db()
+        assert self.batch.is_finished
+
+    def test_essay_cut_off_at_max_tokens_is_not_retried(self):
+        first = self.batch.essays.order_by("position").first()
+        self.batch.essays.exclude(pk=first.pk).update(status=BatchEssay.STATUS_DONE)
+
+        with mock.patch(
+            "api2d.batches.Api2dClient.create_claude_message",
+            return_value={**REPLY, "stop_reason": "max_tokens"},
+        ) as create:
+            run_batch(self.batch.pk)
+
+        essay = self.batch.essays.get(pk=first.pk)
+        assert create.call_count == 1
+        assert essay.status == BatchEssay.STATUS_FAILED
+        assert "cut off" in essay.error
+        assert self.record_usage.call_count == 1
+
+    def test_resume_skips_essays_already_done(self):
+        self.batch.essays.filter(position__lte=4).update(status=BatchEssay.STATUS_DONE)
+
+        with mock.patch(
+            "api2d.batches.Api2dClient.create_claude_message", return_value=REPLY
+        ) as create:
+            run_batch(self.batch.pk)
+
+        assert create.call_count == 2
+
+    def test_connection_is_released_during_the_upstream_call(self):
+        calls = []
+
+        def reply(payload):
+            calls.append("call")
+            return REPLY
+
+        with (
+            mock.patch(
+                "api2d.batches._release_connection",
+                side_effect=lambda: calls.append("release"),
+            ),
+            mock.patch(
+                "api2d.batches.Api2dClient.create_claude_message", side_effect=reply
+            ),
+        ):
+            run_batch(self.batch.pk, concurrency=1)
+
+        assert calls == ["release", "call"] * 6
+
+    def test_command_resumes_only_stale_batches(self):
+        live = create_batch(self.user, "Class 7C", [("Ann", "One")])
+        assert claim_batch(live.pk)
+
+        with mock.patch(
+            "api2d.batches.Api2dClient.create_claude_message", return_value=REPLY
+        ) as create:
+            call_command("resume_batches", stdout=io.StringIO())
+
+        self.batch.refresh_from_db()
+        live.refresh_from_db()
+        assert self.batch.is_finished
+        assert not live.is_finished
+        assert create.call_count == 6
+
+    def test_only_one_worker_claims_a_batch(self):
+        assert claim_batch(self.batch.pk)
+        assert not claim_batch(self.batch.pk)
+
+    def test_essays_claimed_by_another_worker_are_not_sent(self):
+        other = self.batch.essays.get(position=1)
+        assert claim_essay(other.pk)
+        assert not claim_essay(other.pk)
+
+        with mock.patch(
+            "api2d.batches.Api2dClient.create_claude_message", return_value=REPLY
+        ) as create:
+            run_batch(self.batch.pk)
+
+        assert create.call_count == 5
+        # Left to the worker holding it, not failed
+        other.refresh_from_db()
+        assert other.status == BatchEssay.STATUS_PENDING
+
+    @override_settings(BATCH_HEARTBEAT_SECONDS=0.05)
+    def test_heartbeat_continues_during_a_slow_call(self):
+        beats = []
+
+        def slow_reply(payload):
+            time.sleep(0.3)
+            self.batch.refresh_from_db()
+            beats.append(self.batch.heartbeat_at)
+            return REPLY
+
+        self.batch.essays.filter(position__gt=1).update(status=BatchEssay.STATUS_DONE)
+        with mock.patch(
+            "api2d.batches.Api2dClient.create_claude_message", side_effect=slow_reply
+        ):
+            run_batch(self.batch.pk)
+
+        # Beaten while the only call was still running
+        assert beats[0] is not None
+
+    def test_archive_streams_every_result(self):
+        self.batch.essays.filter(position=1).update(status=BatchEssay.STATUS_DONE)
+
+        data = b"".join(stream_archive(self.batch))
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            names = archive.namelist()
+            index = archive.read("index.csv").decode()
+        assert names == ["0001-student-0.md", "index.csv"]
+        assert index.count("pending") == 5
+
+
+@unit_test_settings
+class TestEssayBatchView(TestCase):
+    def setUp(self):
+        self.user = make_user_with_key()
+        self.client.force_login(self.user)
+
+    @mock.patch("api2d.views.start_batch")
+    def test_upload_creates_and_starts_batch(self, start_batch):
+        response = self.client.post(
+            "/batches/",
+            {
+                "name": "Class 7B",
+                "essays_file": SimpleUploadedFile(
+                    "class.csv", b"name,essay\nAnn,One\nBob,Two\n"
+                ),
+            },
+        )
+
+        batch = self.user.essay_batches.get()
+        assert response.status_code == 302
+        assert batch.essays.count() == 2
+        start_batch.assert_called_once_with(batch.pk)
+
+    @mock.patch("api2d.views.start_batch")
+    def test_detail_page_does_not_start_the_batch(self, start_batch):
+        batch = create_batch(self.user, "Class 7B", [("Ann", "One")])
+
+        response = self.client.get(f"/batches/{batch.pk}/")
+
+        assert response.status_code == 200
+        start_batch.assert_not_called()
+
+    def test_invalid_upload_shows_the_form_error(self):
+        response = self.client.post(
+            "/batches/",
+            {"name": "x", "essays_file": SimpleUploadedFile("x.csv", b"a,b\n1,2\n")},
+        )
+
+        assert response.status_code == 200
+        assert '"essay" column' in response.content.decode()
@@ -0,0 +1,160 @@
+import tempfile
+import threading
+from unittest import mock
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api2d.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from api2d.models import Api2dGroup2ExpirationMapping
+from api2d.routing import EndpointRouter
+from api2d.utilities import Api2dClient
+from .helpers import unit_test_settings
+
+UPSTREAM = "https://api.example"
+BACKUP = "https://backup.example"
+
+breaker_settings = override_settings(
+    UPSTREAM_BREAKER_FAILURES=3,
+    UPSTREAM_BREAKER_RESET_SECONDS=30,
+    UPSTREAM_BREAKER_PROBES=1,
+)
+
+
+def later(seconds):
+    """Patch the breaker clock `seconds` into the future."""
+    import time
+
+    now = time.time()
+    return mock.patch("api2d.breaker.time.time", return_value=now + seconds)
+
+
+@unit_test_settings
+@breaker_settings
+class TestCircuitBreaker(SimpleTestCase):
+    """Test the closed, open and half-open states."""
+
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker(UPSTREAM)
+
+    def trip(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        assert self.breaker.state() == CLOSED
+
+        self.trip()
+
+        assert self.breaker.state() == OPEN
+        assert not self.breaker.allow()
+
+    def test_half_open_lets_one_probe_through(self):
+        self.trip()
+
+        with later(31):
+            assert self.breaker.state() == HALF_OPEN
+            assert self.breaker.allow()
+            assert not self.breaker.allow()
+
+    def test_probe_result_closes_or_reopens(self):
+        self.trip()
+        with later(31):
+            self.breaker.allow()
+            self.breaker.record_failure()
+            assert self.breaker.state() == OPEN
+
+        with later(62):
+            assert self.breaker.allow()
+            self.breaker.record_success()
+            assert self.breaker.state() == CLOSED
+            assert self.breaker.allow()
+
+    def test_concurrent_probes_on_the_file_cache(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_cache = override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory.name,
+                }
+            }
+        )
+        file_cache.enable()
+        self.addCleanup(file_cache.disable)
+        self.trip()
+        allowed = []
+
+        def probe():
+            allowed.append(self.breaker.allow())
+
+        with later(31):
+            threads = [threading.Thread(target=probe) for _ in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert allowed.count(True) == 1
+
+    def test_open_endpoint_is_routed_last(self):
+        router = EndpointRouter([UPSTREAM, BACKUP])
+        router.record_success(UPSTREAM, 10)
+        router.record_success(BACKUP, 500)
+
+        self.trip()
+
+        assert router.candidates() == [BACKUP, UPSTREAM]
+
+
+@unit_test_settings
+@breaker_settings
+class TestClientFailsFast(TestCase):
+    def setUp(self):
+        cache.clear()
+        for _ in range(3):
+            CircuitBreaker(UPSTREAM).record_failure()
+
+    def test_no_request_while_open(self):
+        client = Api2dClient("key", UPSTREAM)
+
+        with mock.patch("api2d.utilities.requests.post") as post:
+            assert client.call_custom_key_search_key("fk-1") is None
+        post.assert_not_called()
+
+    def test_timeouts_trip_the_breaker(self):
+        cache.clear()
+        client = Api2dClient("key", UPSTREAM)
+
+        with mock.patch(
+            "api2d.utilities.requests.post",
+            side_effect=requests.exceptions.ConnectTimeout("slow"),
+        ) as post:
+            for _ in range(5):
+                client.call_custom_key_search_key("fk-1")
+
+        assert post.call_count == 3
+        assert post.call_args.kwargs["timeout"][0] > 0
+
+    @override_settings(API2D_API_ENDPOINT=UPSTREAM, API2D_ADMIN_KEY="admin")
+    def test_api_key_page_shows_a_friendly_message(self):
+        Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        user = get_user_model().objects.create_user("alice", "a@example.com", "pw")
+        self.client.force_login(user)
+
+        with mock.patch("api2d.utilities.requests.post") as post:
+            response = self.client.get("/api-key/")
+
+        post.assert_not_called()
+        assert response.status_code == 200
+        assert "temporarily unavailable" in response.content.decode()
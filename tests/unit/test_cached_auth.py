@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from pages.models import Page
+from users.middleware import user_cache_key
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+
+@unit_test_settings
+class TestCachedAuthentication(TestCase):
+    """Test that warm authenticated requests skip session and user queries."""
+
+    def setUp(self):
+        cache.clear()
+        Page.objects.create(title="Home", slug="home", content="# Hi", is_active=True)
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+        self.client.force_login(self.user)
+
+    def get_home(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/")
+        assert response.status_code == 200
+        return response, [q["sql"] for q in ctx.captured_queries]
+
+    def test_warm_request_skips_session_and_user_queries(self):
+        self.get_home()
+        response, queries = self.get_home()
+
+        self.assertContains(response, "alice")
+        assert not [q for q in queries if "django_session" in q]
+        assert not [q for q in queries if '"auth_user"' in q]
+
+    def test_saving_user_drops_cached_copy(self):
+        self.get_home()
+        assert cache.get(user_cache_key(self.user.pk)) is not None
+
+        self.user.username = "alice2"
+        self.user.save()
+
+        assert cache.get(user_cache_key(self.user.pk)) is None
+        response, _ = self.get_home()
+        self.assertContains(response, "alice2")
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.get_home()
+
+        self.user.set_password("new-password")
+        self.user.save()
+
+        response = self.client.get("/")
+        self.assertNotContains(response, "alice")
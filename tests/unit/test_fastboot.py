@@ -0,0 +1,87 @@
+import io
+import os
+import tempfile
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TestCase, override_settings
+
+from pages.management.commands import fastboot
+
+
+class TestStaticCheck(TestCase):
+    """Test that fastboot only trusts files collected from current sources."""
+
+    def setUp(self):
+        source = tempfile.TemporaryDirectory()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        self.source = Path(source.name)
+        self.root = Path(root.name)
+        (self.source / "css").mkdir()
+        (self.source / "css" / "site.css").write_text("body { color: red; }")
+        (self.source / "app.js").write_text("console.log(1);")
+        settings = override_settings(
+            STATICFILES_DIRS=[self.source],
+            STATIC_ROOT=root.name,
+            FASTBOOT_FINGERPRINT_FILE=Path(source.name, ".fastboot.json"),
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {
+                    "BACKEND": "django.contrib.staticfiles.storage."
+                    "ManifestStaticFilesStorage"
+                },
+            },
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_collected_files_are_up_to_date(self):
+        assert fastboot.static_up_to_date() == (False, 2)
+
+        fastboot.collect_static()
+
+        assert fastboot.static_up_to_date() == (True, 2)
+        assert not list(self.root.glob(".fastboot*"))
+
+    def test_a_changed_source_is_detected(self):
+        fastboot.collect_static()
+        css = self.source / "css" / "site.css"
+        css.write_text("body { color: blue; }")
+        os.utime(css, ns=(0, 0))
+
+        assert fastboot.static_up_to_date() == (False, 2)
+
+    def test_a_new_source_missing_from_the_manifest(self):
+        fastboot.collect_static()
+        _, paths = fastboot.static_fingerprint()
+        (self.source / "extra.js").write_text("")
+
+        assert fastboot.manifest_covers(paths)
+        assert not fastboot.manifest_covers(paths + ["extra.js"])
+
+    def test_start_refuses_uncollected_files(self):
+        with self.assertRaisesMessage(CommandError, "fastboot --collect"):
+            call_command("fastboot", stdout=io.StringIO())
+
+
+class TestMigrationCheck(TestCase):
+    def test_plan_is_empty_when_migrated(self):
+        graph, plan = fastboot.migration_plan()
+
+        assert plan == []
+        assert len(fastboot.migration_fingerprint(graph)) == 64
+
+    def test_unapplied_migrations_are_planned(self):
+        graph, _ = fastboot.migration_plan()
+        latest = graph.leaf_nodes("api2d")[0]
+        MigrationRecorder.Migration.objects.filter(
+            app=latest[0], name=latest[1]
+        ).delete()
+
+        _, plan = fastboot.migration_plan()
+
+        assert [(m.app_label, m.name) for m, _ in plan] == [latest]
@@ -0,0 +1,123 @@
+import json
+
+from django.test import SimpleTestCase, override_settings
+
+from api2d import grammar
+from api2d.streaming import stream_sections
+from .test_streaming import anthropic_stream
+
+STORY = (
+    "The sun was going down. The birds was making noise in the trees. "
+    "She seen a flower and thought it was pretty. She keep walking."
+)
+
+
+def corrections(text):
+    return [
+        (grammar.tokenize(text)[f.first].text, f.correction)
+        for f in grammar.check(text)
+    ]
+
+
+class TestGrammarCheck(SimpleTestCase):
+    """Test the rule-based grammar pre-pass."""
+
+    def test_prompt_example_errors(self):
+        assert corrections(STORY) == [
+            ("was", "were"),
+            ("seen", "saw"),
+            ("keep", "kept"),
+        ]
+
+    def test_irregular_pasts(self):
+        assert corrections("I buyed a car. We have already took it. I seen it.") == [
+            ("buyed", "bought"),
+            ("took", "taken"),
+            ("seen", "saw"),
+        ]
+
+    def test_agreement_in_the_present(self):
+        assert corrections(
+            "There is two reasons. Many families lives here. She like it. "
+            "They has a car."
+        ) == [("is", "are"), ("lives", "live"), ("like", "likes"), ("has", "have")]
+
+    def test_correct_sentences_are_left_alone(self):
+        text = (
+            "Does she have a car? If she were rich, she would buy one. "
+            "You and she are friends. Let it go. The analysis is done. "
+            "The news is good. My boss has seen it. They had left."
+        )
+
+        assert grammar.check(text) == []
+
+    def test_nouns_inside_a_phrase_are_not_subjects(self):
+        for text in (
+            "The cost of the tickets was high.",
+            "One of the birds was singing.",
+            "Each of the students has a book.",
+            "The owner of the dogs lives next door.",
+            "The noise from the neighbours keeps me awake.",
+            "Each of you has a ticket.",
+        ):
+            with self.subTest(text):
+                assert grammar.check(text) == []
+
+    def test_findings_merge_into_the_model_table(self):
+        feedback = "\n".join(
+            grammar.TABLE_HEADER
+            + ['| The birds "was" making | The birds "were" making | Plural |']
+        )
+
+        merged = grammar.merge(feedback, STORY, grammar.check(STORY))
+
+        lines = merged.splitlines()
+        assert lines[:3] == feedback.splitlines()
+        assert [line.split("|")[1].strip() for line in lines[3:]] == [
+            "trees. She `seen` a flower and",
+            "pretty. She `keep` walking.",
+        ]
+        assert grammar.merge("No errors found", STORY, []) == "No errors found"
+
+    def test_findings_never_override_no_errors_found(self):
+        findings = grammar.check("I seen it.")
+
+        assert findings
+        assert grammar.merge("No errors found", "I seen it.", findings) == (
+            "No errors found"
+        )
+
+    def test_check_is_off_by_default(self):
+        assert grammar.local_findings("I seen it.") == []
+        with override_settings(CELPIP_LOCAL_GRAMMAR_CHECK=True):
+            assert len(grammar.local_findings("I seen it.")) == 1
+
+
+@override_settings(CELPIP_LOCAL_GRAMMAR_CHECK=True)
+class TestGrammarStream(SimpleTestCase):
+    def test_findings_come_first_and_merge_into_the_feedback(self):
+        feedback = "\n".join(
+            grammar.TABLE_HEADER + ["| I `like` it | I `love` it | Word choice |"]
+        )
+        out = "".join(
+            stream_sections(
+                anthropic_stream(
+                    "Better.</revised_text><grammar_focused_feedback>", feedback
+                ),
+                original="I seen it.",
+            )
+        )
+        blocks = [block.split("\n") for block in out.strip().split("\n\n")]
+
+        assert blocks[0][0] == "event: grammar_check"
+        assert json.loads(blocks[0][1][6:])["count"] == 1
+        replaced = [b for b in blocks if b[0] == "event: section_replace"]
+        assert len(replaced) == 1
+        text = json.loads(replaced[0][1][6:])["text"]
+        assert "| I `seen` it. | I `saw` it. |" in text
+        # The replacement comes before the section ends
+        assert blocks.index(replaced[0]) + 1 == next(
+            i
+            for i, b in enumerate(blocks)
+            if b[0] == "event: section_end" and "grammar_focused" in b[1]
+        )
@@ -0,0 +1,248 @@
+import threading
+import time
+from unittest import mock
+
+import requests
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from api2d import hedging, utilities
+from api2d.hedging import HedgeBudget, LatencyTracker, hedged
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey
+from api2d.utilities import Api2dClient
+from .helpers import unit_test_settings
+
+UPSTREAM = "https://api.example"
+BACKUP = "https://backup.example"
+
+hedge_settings = override_settings(
+    UPSTREAM_HEDGE_ENABLED=True,
+    UPSTREAM_HEDGE_PERCENTILE=95,
+    UPSTREAM_HEDGE_DEFAULT_DELAY=0.05,
+    UPSTREAM_HEDGE_BUDGET=0.5,
+    UPSTREAM_HEDGE_READ_TIMEOUT=10,
+)
+
+
+def funded_budget():
+    budget = HedgeBudget()
+    budget.tokens = 5
+    return budget
+
+
+@hedge_settings
+class TestHedged(SimpleTestCase):
+    """Test when the hedge goes out and which result wins."""
+
+    def test_fast_call_is_not_hedged(self):
+        backup = mock.Mock()
+
+        result = hedged(
+            lambda: "first", backup, LatencyTracker(), funded_budget(), ok=bool
+        )
+
+        assert result == "first"
+        backup.assert_not_called()
+
+    def test_slow_call_is_hedged_and_the_hedge_wins(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return "slow"
+
+        result = hedged(
+            slow, lambda: "hedge", LatencyTracker(), funded_budget(), ok=bool
+        )
+        release.set()
+
+        assert result == "hedge"
+
+    def test_failed_hedge_falls_back_to_primary(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return "slow"
+
+        def failing():
+            release.set()
+            raise ValueError("down")
+
+        result = hedged(slow, failing, LatencyTracker(), funded_budget(), ok=bool)
+
+        assert result == "slow"
+
+    def test_empty_budget_waits_for_primary(self):
+        backup = mock.Mock()
+
+        def slow():
+            time.sleep(0.2)
+            return "slow"
+
+        result = hedged(slow, backup, LatencyTracker(), HedgeBudget(), ok=bool)
+
+        assert result == "slow"
+        backup.assert_not_called()
+
+    def test_no_free_slot_runs_unhedged_in_the_caller(self):
+        backup = mock.Mock()
+        caller = threading.current_thread()
+
+        def slow():
+            time.sleep(0.2)
+            return threading.current_thread()
+
+        with mock.patch.object(hedging, "_slots", threading.BoundedSemaphore(1)):
+            hedging._slots.acquire()
+            result = hedged(slow, backup, LatencyTracker(), funded_budget(), ok=bool)
+
+        assert result is caller
+        backup.assert_not_called()
+
+    def test_slots_are_released_by_losers(self):
+        release = threading.Event()
+        slots = threading.BoundedSemaphore(2)
+
+        def slow():
+            release.wait(5)
+            return "slow"
+
+        with mock.patch.object(hedging, "_slots", slots):
+            hedged(slow, lambda: "hedge", LatencyTracker(), funded_budget(), ok=bool)
+            # The primary is still in flight and holds its slot
+            assert slots.acquire(blocking=False)
+            assert not slots.acquire(blocking=False)
+            slots.release()
+            release.set()
+            # Both slots come back once the loser returns
+            assert slots.acquire(timeout=5) and slots.acquire(timeout=5)
+
+    def test_delay_follows_the_latency_percentile(self):
+        tracker = LatencyTracker()
+        assert tracker.delay() == 0.05
+
+        for ms in range(1, 101):
+            tracker.record(ms / 1000)
+
+        assert tracker.delay() == 0.096
+
+    def test_budget_allows_a_fraction_of_calls(self):
+        budget = HedgeBudget(burst=2)
+        spent = 0
+        for _ in range(10):
+            budget.earn()
+            spent += budget.spend()
+
+        assert spent == 5
+
+
+@unit_test_settings
+@hedge_settings
+class TestClientHedging(SimpleTestCase):
+    """Test that key lookups are hedged to the next endpoint."""
+
+    def setUp(self):
+        cache.clear()
+        utilities._hedge_latency.clear()
+        self.budget = mock.patch.object(utilities, "_hedge_budget", funded_budget())
+        self.budget.start()
+        self.addCleanup(self.budget.stop)
+
+    def response(self, keys):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"data": {"custom_key_array": keys}}
+        return response
+
+    def test_search_key_hedges_to_backup(self):
+        release = threading.Event()
+        urls = []
+
+        def post(url, **kwargs):
+            urls.append(url)
+            if url.startswith(UPSTREAM):
+                release.wait(5)
+                return self.response(["slow"])
+            return self.response(["fast"])
+
+        client = Api2dClient("secret", [UPSTREAM, BACKUP])
+        with mock.patch("api2d.utilities.requests.post", side_effect=post):
+            keys = client.call_custom_key_search_key("sk-1")
+            release.set()
+
+        assert keys == ["fast"]
+        assert urls[0] == UPSTREAM + "/custom_key/search_key"
+        assert urls[1] == BACKUP + "/custom_key/search_key"
+
+    def test_key_save_is_never_hedged(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"data": {"custom_key_array": []}}
+        client = Api2dClient("secret", [UPSTREAM, BACKUP])
+
+        with (
+            mock.patch("api2d.utilities.requests.post", return_value=response) as post,
+            mock.patch("api2d.utilities.hedged") as hedge,
+        ):
+            client.call_custom_key_save(1, 1)
+
+        hedge.assert_not_called()
+        assert post.call_count == 1
+
+
+@unit_test_settings
+@hedge_settings
+@override_settings(API2D_OPENAI_ENDPOINT=[UPSTREAM, BACKUP])
+class TestCreditsView(TestCase):
+    """Test that the API key page gets the credits from a hedged lookup."""
+
+    def setUp(self):
+        cache.clear()
+        utilities._hedge_latency.clear()
+        budget = mock.patch.object(utilities, "_hedge_budget", funded_budget())
+        budget.start()
+        self.addCleanup(budget.stop)
+        user = get_user_model().objects.create_user("alice", "a@x.com", "pw")
+        group = Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        Api2dKey.objects.create(
+            key="fk-1", user=user, group=group, created_at=timezone.now()
+        )
+        self.client.force_login(user)
+
+    def test_slow_lookup_is_hedged_with_a_short_timeout(self):
+        release = threading.Event()
+        calls = []
+
+        def get(url, **kwargs):
+            calls.append((url, kwargs["timeout"]))
+            response = mock.Mock(status_code=200)
+            if url.startswith(UPSTREAM):
+                release.wait(5)
+                response.json.return_value = {"total_available": 1}
+            else:
+                response.json.return_value = {"total_available": 2}
+            return response
+
+        with mock.patch("api2d.utilities.requests.get", side_effect=get):
+            response = self.client.get("/api-key/credits/")
+            release.set()
+
+        assert response.json() == {"total_available": 2}
+        assert [url for url, _ in calls] == [
+            UPSTREAM + "/dashboard/billing/credit_grants",
+            BACKUP + "/dashboard/billing/credit_grants",
+        ]
+        assert all(timeout[1] == 10 for _, timeout in calls)
+
+    def test_failed_lookup_is_reported(self):
+        with mock.patch(
+            "api2d.utilities.requests.get",
+            side_effect=requests.exceptions.ConnectionError,
+        ):
+            response = self.client.get("/api-key/credits/")
+
+        assert response.status_code == 502
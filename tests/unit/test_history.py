@@ -0,0 +1,125 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from api2d.history import keyset_page, search
+from api2d.models import Submission
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+
+@unit_test_settings
+class TestSubmissionHistory(TestCase):
+    """Test storing, searching and paging through past submissions."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+
+    def make(self, text, **fields):
+        return Submission.objects.create(
+            user=self.user, kind=Submission.KIND_WRITING, input_text=text, **fields
+        )
+
+    def test_large_bodies_are_stored_compressed(self):
+        essay = "Dear neighbour, the construction noise starts at six. " * 100
+        submission = self.make(essay)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT input_text FROM api2d_submission WHERE id = %s",
+                [submission.pk],
+            )
+            stored = bytes(cursor.fetchone()[0])
+        assert len(stored) < len(essay) / 10
+        assert Submission.objects.get(pk=submission.pk).input_text == essay
+        assert submission.summary == essay[:200]
+
+    def test_search_matches_any_text_field(self):
+        noise = self.make("The construction noise keeps me awake.")
+        self.make("I would like to request a refund.", feedback="Use a polite tone.")
+        Submission.objects.create(
+            user=self.user,
+            kind=Submission.KIND_SPEAKING,
+            transcription="My favourite holiday was camping by the lake.",
+        )
+        mine = Submission.objects.filter(user=self.user)
+
+        assert list(search(mine, "construction")) == [noise]
+        assert search(mine, "polite refund").count() == 1
+        assert search(mine, "camping").get().kind == Submission.KIND_SPEAKING
+        assert search(mine, '"unbalanced').count() == 0
+
+    def test_deleted_submissions_leave_the_index(self):
+        submission = self.make("A letter about the construction noise.")
+        submission.delete()
+
+        assert search(Submission.objects.all(), "construction").count() == 0
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM api2d_submission_fts")
+                assert cursor.fetchone()[0] == 0
+
+    def test_keyset_pages_cover_every_row_once(self):
+        now = timezone.now()
+        created = [
+            self.make(f"attempt {i}", created_at=now - timedelta(minutes=i // 2))
+            for i in range(7)
+        ]
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(Submission.objects.all(), cursor, size=3)
+            seen.extend(page)
+            if cursor is None:
+                break
+
+        assert len(seen) == 7
+        assert {s.pk for s in seen} == {s.pk for s in created}
+        assert [(s.created_at, s.pk) for s in seen] == sorted(
+            ((s.created_at, s.pk) for s in seen), reverse=True
+        )
+
+    def test_malformed_cursor_starts_from_the_first_page(self):
+        first = self.make("only attempt")
+
+        page, cursor = keyset_page(Submission.objects.all(), "not a cursor")
+
+        assert page == [first]
+        assert cursor is None
+
+    def test_create_and_list_own_submissions(self):
+        other = User.objects.create_user("bob", "bob@example.com", "pw")
+        Submission.objects.create(user=other, kind="writing", input_text="bob's essay")
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            "/history/new/",
+            json.dumps({"kind": "writing", "input_text": "alice's essay"}),
+            content_type="application/json",
+        )
+        assert response.status_code == 201
+        detail_url = response.json()["url"]
+
+        response = self.client.get("/history/", {"q": "essay"})
+        assert response.status_code == 200
+        assert [s.user for s in response.context["submissions"]] == [self.user]
+        assert self.client.get(detail_url).status_code == 200
+
+        self.client.force_login(other)
+        assert self.client.get(detail_url).status_code == 404
+
+    def test_invalid_kind_is_rejected(self):
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            "/history/new/",
+            json.dumps({"kind": "reading"}),
+            content_type="application/json",
+        )
+
+        assert response.status_code == 400
@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from pages.models import Notification, Page
+from .helpers import unit_test_settings
+
+
+@unit_test_settings
+class TestLayoutFragmentCache(TestCase):
+    """Test the cached base.html fragments and their invalidation."""
+
+    def setUp(self):
+        cache.clear()
+        Page.objects.create(title="Home", slug="home", content="# Hi", is_active=True)
+
+    def notification_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/")
+        assert response.status_code == 200
+        return response, [
+            q for q in ctx.captured_queries if "pages_notification" in q["sql"]
+        ]
+
+    def test_warm_render_skips_notification_query(self):
+        _, cold = self.notification_queries()
+        _, warm = self.notification_queries()
+
+        assert len(cold) >= 1
+        assert warm == []
+
+    def test_saving_notification_invalidates_banner(self):
+        self.notification_queries()
+
+        Notification.objects.create(title="Outage", message="Back at noon")
+
+        response, queries = self.notification_queries()
+        assert len(queries) >= 1
+        self.assertContains(response, "Back at noon")
+
+    def test_navbar_varies_by_user(self):
+        from django.contrib.auth import get_user_model
+
+        user = get_user_model().objects.create_user("alice", "alice@example.com")
+        self.client.get("/")
+
+        self.client.force_login(user)
+        response = self.client.get("/")
+
+        self.assertContains(response, "alice")
+        self.assertNotContains(response, 'aria-label="Login"')
@@ -0,0 +1,131 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api2d.model_routing import choose_model, record_latency
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey
+from .helpers import unit_test_settings
+from .test_streaming import anthropic_stream
+
+User = get_user_model()
+
+SHORT = "x" * 350  # 100 tokens at the default 3.5 characters per token
+LONG = "x" * 3500  # 1000 tokens
+
+
+@unit_test_settings
+@override_settings(
+    API2D_CLAUDE_MODEL="fast",
+    API2D_CLAUDE_QUALITY_MODEL="quality",
+    MODEL_ROUTING_TARGET_SECONDS=20,
+    MODEL_ROUTING_SHORT_TOKENS=250,
+    MODEL_ROUTING_GROUPS={"trial": "fast"},
+)
+class TestChooseModel(TestCase):
+    """Test routing improvements between the fast and the quality model."""
+
+    def setUp(self):
+        cache.clear()
+
+    def measure(self, seconds_per_token, count=20, overhead=0, tokens=500):
+        for _ in range(count):
+            record_latency("quality", overhead + seconds_per_token * tokens, tokens)
+
+    def test_short_input_gets_the_quality_model(self):
+        self.measure(1.0)
+
+        assert choose_model(SHORT).model == "quality"
+
+    def test_long_input_follows_the_latency_target(self):
+        self.measure(0.01)
+        route = choose_model(LONG)
+        assert (route.model, route.predicted) == ("quality", 10.0)
+
+        cache.clear()
+        self.measure(0.01, overhead=2, tokens=400)
+        self.measure(0.01, overhead=2, tokens=800)
+        route = choose_model(LONG)
+        assert route.model == "quality"
+        assert round(route.predicted, 6) == 12.0
+
+        # Peak: the same text would now take 30 s on the quality model
+        self.measure(0.03, count=200)
+        route = choose_model(LONG)
+        assert (route.model, route.reason) == ("fast", "over latency target")
+
+    def test_overhead_of_short_texts_is_not_a_per_token_cost(self):
+        # Short texts pay mostly the fixed overhead of a call
+        self.measure(0.01, count=18, overhead=4, tokens=100)
+        self.measure(0.01, count=2, overhead=4, tokens=1000)
+
+        route = choose_model("x" * 5250)  # 1500 tokens
+
+        assert (route.model, round(route.predicted, 6)) == ("quality", 19.0)
+
+    def test_no_prediction_far_beyond_the_measured_lengths(self):
+        self.measure(1.0, tokens=100)
+
+        assert choose_model(LONG).reason == "no measurements"
+
+    def test_quality_model_until_there_are_measurements(self):
+        self.measure(1.0, count=19)
+
+        assert choose_model(LONG).reason == "no measurements"
+
+    def test_measurements_expire(self):
+        self.measure(1.0)
+
+        with self.settings(MODEL_ROUTING_WINDOW_SECONDS=0):
+            assert choose_model(LONG).model == "quality"
+
+    def test_pinned_group(self):
+        assert choose_model(SHORT, "trial").model == "fast"
+
+    def test_decisions_are_logged(self):
+        with self.assertLogs("api2d.model_routing", "INFO") as logs:
+            choose_model(SHORT, "basic")
+
+        assert logs.output == [
+            "INFO:api2d.model_routing:Routed to quality (short input): "
+            "100 tokens, group basic, predicted p95 -"
+        ]
+
+
+@unit_test_settings
+@override_settings(API2D_CLAUDE_MODEL="fast", API2D_CLAUDE_QUALITY_MODEL="quality")
+class TestRoutedStream(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+        group = Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        Api2dKey.objects.create(
+            key="fk-alice", user=self.user, group=group, created_at=timezone.now()
+        )
+        self.client.force_login(self.user)
+        # The stream records its usage; these tests are not about the ledger
+        patcher = mock.patch("api2d.views.record_usage")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stream_uses_and_reports_the_routed_model(self):
+        with mock.patch(
+            "api2d.views.Api2dClient.stream_claude_message",
+            return_value=anthropic_stream("Better.</revised_text>"),
+        ) as stream:
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "speaking", "text": "Gud."}),
+                content_type="application/json",
+            )
+            body = b"".join(response.streaming_content).decode()
+
+        assert stream.call_args.args[0]["model"] == "quality"
+        assert '"model": "quality"' in body.split("event: done")[1]
+        # The finished stream is a latency measurement for the model
+        assert len(cache.get("model-latency:quality")) == 1
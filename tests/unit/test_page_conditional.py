@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.contrib.messages import constants
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from pages.cache import page_cache_key
+from pages.models import Notification, Page
+from .helpers import unit_test_settings
+
+
+@unit_test_settings
+class TestPageConditionalGet(TestCase):
+    """Test ETag and Last-Modified handling of the page views."""
+
+    def setUp(self):
+        cache.clear()
+        self.page = Page.objects.create(
+            title="About", slug="about", content="# About", is_active=True
+        )
+
+    def get(self, **headers):
+        return self.client.get("/about/", headers=headers)
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.get()
+        assert response.status_code == 200
+        assert response.has_header("ETag")
+        assert response.has_header("Last-Modified")
+        assert "Cookie" in response["Vary"]
+
+        with self.assertNumQueries(0):
+            response = self.get(if_none_match=response["ETag"])
+        assert response.status_code == 304
+
+    def test_if_modified_since(self):
+        last_modified = self.get()["Last-Modified"]
+
+        assert self.get(if_modified_since=last_modified).status_code == 304
+
+    def test_cold_page_entry_costs_one_lookup(self):
+        etag = self.get()["ETag"]
+        cache.delete(page_cache_key("about"))
+
+        with self.assertNumQueries(1):
+            assert self.get(if_none_match=etag).status_code == 304
+
+    def test_edited_page_is_sent_again(self):
+        etag = self.get()["ETag"]
+
+        self.page.content = "# Changed"
+        self.page.save()
+
+        response = self.get(if_none_match=etag)
+        assert response.status_code == 200
+        self.assertContains(response, "# Changed")
+
+    def test_new_notification_changes_the_etag(self):
+        etag = self.get()["ETag"]
+
+        Notification.objects.create(title="Outage", message="Back at noon")
+
+        assert self.get(if_none_match=etag).status_code == 200
+
+    def test_etag_depends_on_the_user(self):
+        etag = self.get()["ETag"]
+        user = get_user_model().objects.create_user("reader", "r@example.com", "pw")
+        self.client.force_login(user)
+
+        response = self.get(if_none_match=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_pending_messages_disable_validation(self):
+        etag = self.get()["ETag"]
+        request = RequestFactory().get("/")
+        storage = CookieStorage(request)
+        storage.add(constants.SUCCESS, "Saved")
+        response = self.get()
+        storage.update(response)
+        self.client.cookies.update(response.cookies)
+
+        response = self.get(if_none_match=etag)
+        assert response.status_code == 200
+        assert not response.has_header("ETag")
+
+    def test_inactive_page_is_not_validated(self):
+        self.page.is_active = False
+        self.page.save()
+
+        response = self.get(if_none_match='"anything"')
+        assert response.status_code == 404
@@ -0,0 +1,145 @@
+from datetime import timedelta
+from unittest import mock
+
+import requests
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api2d.breaker import UNAVAILABLE_MESSAGE
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey, KeyProvisioning
+from api2d import provisioning
+from api2d.provisioning import provision_key
+from .helpers import unit_test_settings
+
+UPSTREAM = ["https://api.example.com"]
+
+
+def created(key):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {"data": {"custom_key_array": [{"key": key}]}}
+    return response
+
+
+@unit_test_settings
+@override_settings(
+    API2D_API_ENDPOINT=UPSTREAM,
+    API2D_ADMIN_KEY="admin",
+    KEY_PROVISIONING_WAIT_SECONDS=5,
+)
+class TestKeyProvisioning(TestCase):
+    """Test that a user's key is created upstream at most once."""
+
+    def setUp(self):
+        self.group = Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        self.user = get_user_model().objects.create_user("alice", "a@x.com", "pw")
+
+    def in_flight(self, **fields):
+        return KeyProvisioning.objects.create(
+            user=self.user,
+            leased_until=timezone.now() + timedelta(seconds=30),
+            **fields,
+        )
+
+    def test_api_key_page_creates_the_key_once(self):
+        self.client.force_login(self.user)
+
+        with mock.patch(
+            "api2d.utilities.requests.post", return_value=created("fk-1")
+        ) as post:
+            first = self.client.get("/api-key/")
+            second = self.client.get("/api-key/")
+
+        assert first.status_code == 302
+        assert second.status_code == 200
+        assert post.call_count == 1
+        assert Api2dKey.objects.get(user=self.user).key == "fk-1"
+        assert not KeyProvisioning.objects.exists()
+
+    def test_waits_for_the_request_in_flight(self):
+        self.in_flight()
+
+        def other_request_finishes(seconds):
+            Api2dKey.objects.create(
+                key="fk-other",
+                user=self.user,
+                group=self.group,
+                created_at=timezone.now(),
+            )
+            KeyProvisioning.objects.all().delete()
+
+        with (
+            mock.patch("api2d.utilities.requests.post") as post,
+            mock.patch("api2d.provisioning.time.sleep", other_request_finishes),
+        ):
+            api_key = provision_key(self.user)
+
+        post.assert_not_called()
+        assert api_key.key == "fk-other"
+
+    def test_shares_the_failure_of_the_request_in_flight(self):
+        self.in_flight()
+
+        def other_request_fails(seconds):
+            KeyProvisioning.objects.all().delete()
+
+        with (
+            mock.patch("api2d.utilities.requests.post") as post,
+            mock.patch("api2d.provisioning.time.sleep", other_request_fails),
+        ):
+            with self.assertRaisesMessage(ValueError, UNAVAILABLE_MESSAGE):
+                provision_key(self.user)
+
+        post.assert_not_called()
+
+    def test_expired_lease_is_taken_over_with_its_key(self):
+        provisioning = self.in_flight(key="fk-orphan")
+        KeyProvisioning.objects.filter(pk=provisioning.pk).update(
+            leased_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        with mock.patch("api2d.utilities.requests.post") as post:
+            api_key = provision_key(self.user)
+
+        # The key created upstream before the holder died is not lost
+        post.assert_not_called()
+        assert api_key.key == "fk-orphan"
+        assert not KeyProvisioning.objects.exists()
+
+    def test_upstream_failure_releases_the_lease(self):
+        with mock.patch(
+            "api2d.utilities.requests.post",
+            side_effect=requests.exceptions.ConnectionError,
+        ):
+            with self.assertRaises(ValueError):
+                provision_key(self.user)
+
+        assert not KeyProvisioning.objects.exists()
+        assert not Api2dKey.objects.exists()
+
+    def test_upstream_call_ends_within_the_lease(self):
+        with mock.patch(
+            "api2d.utilities.requests.post", return_value=created("fk-1")
+        ) as post:
+            provision_key(self.user)
+
+        connect, read = post.call_args.kwargs["timeout"]
+        assert connect + read < settings.KEY_PROVISIONING_LEASE_SECONDS / 2
+
+    def test_lease_deleted_by_the_holder_it_was_taken_from(self):
+        def holder_finishes(user):
+            KeyProvisioning.objects.all().delete()
+            return True
+
+        with (
+            mock.patch.object(provisioning, "_acquire", side_effect=holder_finishes),
+            mock.patch("api2d.utilities.requests.post") as post,
+        ):
+            with self.assertRaisesMessage(ValueError, UNAVAILABLE_MESSAGE):
+                provision_key(self.user)
+
+        post.assert_not_called()
@@ -0,0 +1,176 @@
+import hashlib
+import tempfile
+import zlib
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey, RecordingUpload
+from api2d.recordings import RecordingUploads
+from api2d.transcripts import TranscriptStore
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+RESULT = {"text": "Harry is a nice boy."}
+
+
+@unit_test_settings
+class TestRecordingUpload(TestCase):
+    """Test uploading a recording in slices and transcribing it."""
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.uploads = RecordingUploads(ttl=3600)
+        store = TranscriptStore(tmp.name + "/transcripts", ttl=3600, max_bytes=10_000)
+        for target, value in (
+            ("api2d.views.recording_uploads", self.uploads),
+            ("api2d.views.transcript_store", store),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+        group = Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        Api2dKey.objects.create(
+            key="fk-alice", user=self.user, group=group, created_at=timezone.now()
+        )
+        self.client.force_login(self.user)
+
+    def create(self):
+        response = self.client.post(
+            "/celpip/recordings/",
+            {"name": "take.m4a", "content_type": "audio/mp4"},
+            content_type="application/json",
+        )
+        assert response.status_code == 201
+        return f"/celpip/recordings/{response.json()['id']}/"
+
+    def put(self, url, data, offset, checksum):
+        return self.client.put(
+            url,
+            data,
+            content_type="application/octet-stream",
+            headers={
+                "X-Upload-Offset": str(offset),
+                "X-Upload-Checksum": f"{checksum:08x}",
+            },
+        )
+
+    def send(self, url, slices):
+        offset = crc = 0
+        for data in slices:
+            crc = zlib.crc32(data, crc)
+            response = self.put(url, data, offset, crc)
+            assert response.status_code == 200
+            offset += len(data)
+        return response
+
+    def test_slices_are_joined_and_transcribed(self):
+        url = self.create()
+        slices = [b"\x00\x01" * 500, b"\x02\x03" * 500, b"\x04"]
+        response = self.send(url, slices)
+        audio = b"".join(slices)
+        assert response.json() == {
+            "offset": len(audio),
+            "checksum": f"{zlib.crc32(audio):08x}",
+        }
+
+        received = []
+
+        def transcribe(upload, model, language):
+            received.append((upload.name, upload.read()))
+            return RESULT
+
+        with (
+            mock.patch(
+                "api2d.views.Api2dClient.transcribe_audio", side_effect=transcribe
+            ),
+            mock.patch("api2d.views.transcript_store.get", return_value=None) as get,
+        ):
+            response = self.client.post(
+                url + "transcribe/",
+                {"language": "en"},
+                content_type="application/json",
+            )
+
+        assert response.json() == {**RESULT, "cached": False}
+        assert received == [("take.m4a", audio)]
+        # Same key as a whole-file upload of the recording
+        assert get.call_args.args[0] == hashlib.sha256(audio).hexdigest()
+        # The upload is gone once transcribed
+        assert self.client.get(url).status_code == 404
+
+    def test_repeated_slice_reports_the_offset_to_resume_from(self):
+        url = self.create()
+        self.send(url, [b"first"])
+
+        response = self.put(url, b"first", 0, zlib.crc32(b"first"))
+
+        assert response.status_code == 409
+        assert response.json()["offset"] == 5
+        assert self.client.get(url).json()["offset"] == 5
+
+    def test_corrupted_slice_is_rejected(self):
+        url = self.create()
+        self.send(url, [b"first"])
+        expected = zlib.crc32(b"second", zlib.crc32(b"first"))
+
+        response = self.put(url, b"secunt", 5, expected)
+
+        assert response.status_code == 422
+        assert response.json()["offset"] == 5
+        assert self.put(url, b"second", 5, expected).status_code == 200
+
+    def test_uploads_are_private(self):
+        url = self.create()
+        other = User.objects.create_user("bob", "bob@example.com", "pw")
+        self.client.force_login(other)
+
+        assert self.client.get(url).status_code == 404
+        assert self.put(url, b"x", 0, zlib.crc32(b"x")).status_code == 404
+
+    def test_size_limit(self):
+        url = self.create()
+        with self.settings(TRANSCRIBE_MAX_UPLOAD_SIZE=4):
+            response = self.put(url, b"too long", 0, zlib.crc32(b"too long"))
+
+        assert response.status_code == 413
+
+    def test_slices_may_reach_any_instance(self):
+        url = self.create()
+        self.send(url, [b"first"])
+        upload_id = url.split("/")[-2]
+        # Another host: its own store, the same database
+        other = RecordingUploads(ttl=3600)
+
+        crc = zlib.crc32(b"second", zlib.crc32(b"first"))
+        other.append(self.user.pk, upload_id, 5, b"second", f"{crc:08x}")
+        audio, _ = self.uploads.open(self.user.pk, upload_id)
+        with audio:
+            assert audio.read() == b"firstsecond"
+
+    def test_old_uploads_are_swept_at_most_every_interval(self):
+        url = self.create()
+        upload_id = url.split("/")[-2]
+        RecordingUpload.objects.filter(pk=upload_id).update(
+            created_at=timezone.now() - timedelta(hours=2)
+        )
+        assert self.client.get(url).status_code == 404
+
+        with mock.patch.object(self.uploads, "sweep") as sweep:
+            self.create()
+        sweep.assert_not_called()
+
+        cache.clear()
+        self.create()
+        assert not RecordingUpload.objects.filter(pk=upload_id).exists()
@@ -0,0 +1,145 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from django_project import replicas
+from django_project.replicas import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter
+from pages.models import Notification, Page
+from .helpers import unit_test_settings
+
+
+@unit_test_settings
+class TestReplicaRouter(SimpleTestCase):
+    """Test which database reads and writes are routed to."""
+
+    def setUp(self):
+        cache.clear()
+        replicas._health.update(checked_at=None, usable=[], primary_until=0)
+        replicas._pinned.set(False)
+        self.router = ReplicaRouter()
+        self.aliases = mock.patch.object(
+            replicas, "replica_aliases", return_value=["replica1"]
+        )
+        self.aliases.start()
+        self.addCleanup(self.aliases.stop)
+
+    def lag(self, **kwargs):
+        return mock.patch.object(replicas, "replica_lag", **kwargs)
+
+    def test_hot_models_are_read_from_the_replica(self):
+        with self.lag(return_value=0):
+            assert self.router.db_for_read(Page) == "replica1"
+            assert self.router.db_for_read(Notification) == "replica1"
+            assert self.router.db_for_read(Site) == "replica1"
+            assert self.router.db_for_read(get_user_model()) == "default"
+
+    def test_lag_is_checked_once_per_interval(self):
+        with self.lag(return_value=0) as lag:
+            for _ in range(5):
+                self.router.db_for_read(Page)
+
+        assert lag.call_count == 1
+
+    def test_health_is_shared_with_other_workers(self):
+        with self.lag(return_value=0) as lag:
+            self.router.db_for_read(Page)
+            # Another worker, due for a check within the same interval
+            replicas._health.update(checked_at=None, usable=[])
+
+            assert self.router.db_for_read(Page) == "replica1"
+
+        assert lag.call_count == 1
+
+    def test_replicas_are_probed_outside_the_lock(self):
+        def lag(alias, lsn):
+            assert not replicas._health_lock.locked()
+            assert lsn == "0/16B3748"
+            return 0
+
+        with (
+            mock.patch.object(replicas, "primary_lsn", return_value="0/16B3748"),
+            self.lag(side_effect=lag) as probe,
+        ):
+            assert self.router.db_for_read(Page) == "replica1"
+
+        probe.assert_called_once_with("replica1", "0/16B3748")
+
+    def test_lag_compares_the_replayed_wal_position(self):
+        cursor = mock.MagicMock()
+        cursor.fetchone.return_value = (0,)
+        connection = mock.MagicMock(vendor="postgresql")
+        connection.cursor.return_value.__enter__.return_value = cursor
+
+        with mock.patch.object(replicas, "connections", {"replica1": connection}):
+            assert replicas.replica_lag("replica1", "0/16B3748") == 0
+
+        sql, params = cursor.execute.call_args[0]
+        assert "pg_last_wal_replay_lsn() >= %s::pg_lsn" in sql
+        assert params == ["0/16B3748"]
+
+    def test_lagging_replica_is_skipped(self):
+        with self.lag(return_value=60):
+            assert self.router.db_for_read(Page) == "default"
+
+    def test_unreachable_replica_is_skipped(self):
+        with self.lag(side_effect=DatabaseError("down")):
+            assert self.router.db_for_read(Page) == "default"
+
+    def test_write_pins_reads_to_the_primary(self):
+        with self.lag(return_value=0):
+            assert self.router.db_for_write(Page) == "default"
+            assert self.router.db_for_read(Page) == "default"
+
+    def test_write_pins_other_workers_through_the_cache(self):
+        with self.lag(return_value=0):
+            self.router.db_for_write(Notification)
+            # Another worker: its own context and a due health check
+            replicas._health.update(checked_at=None, primary_until=0)
+            replicas._pinned.set(False)
+
+            assert self.router.db_for_read(Notification) == "default"
+
+    def test_other_writes_do_not_pin(self):
+        with self.lag(return_value=0):
+            self.router.db_for_write(get_user_model())
+
+            assert self.router.db_for_read(Page) == "replica1"
+
+
+@unit_test_settings
+class TestReplicaPinMiddleware(SimpleTestCase):
+    """Test the cookie that keeps a writer on the primary."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_cookie_is_set_after_a_write(self):
+        def view(request):
+            replicas.pin_to_primary()
+            return HttpResponse()
+
+        response = ReplicaPinMiddleware(view)(self.factory.post("/"))
+
+        assert response.cookies[PIN_COOKIE]["max-age"] == 5
+
+    def test_cookie_pins_the_request(self):
+        seen = []
+
+        def view(request):
+            seen.append(replicas._pinned.get())
+            return HttpResponse()
+
+        middleware = ReplicaPinMiddleware(view)
+        request = self.factory.get("/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        response = middleware(request)
+        middleware(self.factory.get("/"))
+
+        assert seen == [True, False]
+        assert PIN_COOKIE not in response.cookies
@@ -0,0 +1,117 @@
+import json
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey
+from api2d.revisions import change_table, highlight
+from .helpers import unit_test_settings
+from .test_streaming import anthropic_stream
+
+User = get_user_model()
+
+ESSAYS = Path(__file__).parent.parent / "fixtures" / "essays"
+
+ORIGINAL = "The birds was making noise. She seen a flower."
+REVISED = "The birds were making noise.\nShe saw a lovely flower!"
+
+
+class TestRevisions(SimpleTestCase):
+    """Test highlighting and tabulating the changes of a revision."""
+
+    def test_changed_and_added_words_are_highlighted(self):
+        assert highlight(ORIGINAL, REVISED) == (
+            "The birds `were` making noise.\nShe `saw` a `lovely` flower!"
+        )
+
+    def test_punctuation_only_changes_are_not_highlighted(self):
+        assert highlight("Hi, Tom", "Hi Tom!") == "Hi Tom!"
+
+    def test_model_markup_is_ignored(self):
+        assert highlight(ORIGINAL, REVISED.replace("were", "`were`")) == highlight(
+            ORIGINAL, REVISED
+        )
+
+    def test_change_table(self):
+        assert change_table(ORIGINAL, REVISED, context=2).splitlines() == [
+            "| Input | Improved | Explanation |",
+            "|-----------|---------|-------------|",
+            "| The birds `was` making noise | The birds `were` making noise | Changed |",
+            "| She `seen` a flower | She `saw` a lovely | Changed |",
+            "| seen a … flower. | saw a `lovely` flower! | Added |",
+            "| a flower `.` | lovely flower `!` | Changed |",
+        ]
+
+    def test_spacing_is_not_a_change(self):
+        assert change_table("Dear  Sir,\nthanks.", "Dear Sir, thanks.") == (
+            "No errors found"
+        )
+
+    def test_fixture_essays_survive_highlighting(self):
+        for path in ESSAYS.glob("*.txt"):
+            essay = path.read_text()
+            revised = essay.replace(" i ", " I ").replace("buyed", "bought")
+            assert highlight(essay, revised).replace("`", "") == revised
+            assert change_table(essay, essay) == "No errors found"
+
+
+@unit_test_settings
+class TestLocalDiffStream(TestCase):
+    """Test streaming a plain revision with locally computed feedback."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+        group = Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        Api2dKey.objects.create(
+            key="fk-alice", user=self.user, group=group, created_at=timezone.now()
+        )
+        self.client.force_login(self.user)
+        # The stream records its usage; these tests are not about the ledger
+        patcher = mock.patch("api2d.views.record_usage")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_feedback_follows_the_revised_text(self):
+        with (
+            self.settings(CELPIP_LOCAL_DIFF=True, CELPIP_LOCAL_GRAMMAR_CHECK=True),
+            mock.patch(
+                "api2d.views.Api2dClient.stream_claude_message",
+                return_value=anthropic_stream("She saw a ", "flower."),
+            ) as stream,
+        ):
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "writing", "text": "She seen a flower."}),
+                content_type="application/json",
+            )
+            body = b"".join(response.streaming_content).decode()
+
+        payload = stream.call_args.args[0]
+        assert payload["stop_sequences"] == ["</revised_text>"]
+        events = [
+            (block.split("\n")[0][len("event: ") :], block.split("\n")[1][6:])
+            for block in body.strip().split("\n\n")
+        ]
+        assert [kind for kind, _ in events] == [
+            "grammar_check",
+            "section_start",
+            "section_delta",
+            "section_delta",
+            "section_replace",
+            "section_end",
+            "section_start",
+            "section_delta",
+            "section_end",
+            "done",
+        ]
+        assert json.loads(events[4][1])["text"] == "She `saw` a flower."
+        feedback = json.loads(events[7][1])
+        assert feedback["section"] == "grammar_focused_feedback"
+        assert "| She `seen` a flower. | She `saw` a flower. | Changed |" in (
+            feedback["text"]
+        )
@@ -0,0 +1,104 @@
+from unittest import mock
+
+import requests
+import urllib3
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from api2d.routing import EndpointRouter
+from api2d.utilities import Api2dClient
+from .helpers import unit_test_settings
+
+FAST = "https://fast.example"
+SLOW = "https://slow.example"
+
+
+def reply(status=200, body=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = b'{"data": {"custom_key_array": []}}' if body is None else body
+    return response
+
+
+@unit_test_settings
+@override_settings(UPSTREAM_EWMA_ALPHA=0.5, UPSTREAM_BREAKER_FAILURES=5)
+class TestEndpointRouter(SimpleTestCase):
+    """Test latency-aware routing and failover between endpoints."""
+
+    def setUp(self):
+        cache.clear()
+        self.router = EndpointRouter([SLOW, FAST + "/"])
+
+    def test_single_url_setting(self):
+        assert EndpointRouter(FAST).candidates() == [FAST]
+
+    def test_lowest_average_latency_first(self):
+        self.router.record_success(SLOW, 100)
+        self.router.record_success(FAST, 300)
+        assert self.router.best() == SLOW
+
+        self.router.record_success(FAST, 10)  # ewma 155
+        self.router.record_success(FAST, 10)  # ewma 82.5
+        assert self.router.best() == FAST
+
+    def test_state_is_shared_between_routers(self):
+        self.router.record_success(FAST, 5)
+        self.router.record_success(SLOW, 50)
+
+        assert EndpointRouter([SLOW, FAST]).best() == FAST
+
+    def test_client_fails_over_on_connection_error_and_5xx(self):
+        self.router.record_success(FAST, 5)
+        self.router.record_success(SLOW, 50)
+        client = Api2dClient("key", [SLOW, FAST])
+
+        with mock.patch(
+            "api2d.utilities.requests.post",
+            side_effect=[requests.exceptions.ConnectionError("down"), reply()],
+        ) as post:
+            assert client.call_custom_key_search_key("fk-1") == []
+        assert [c.args[0] for c in post.call_args_list] == [
+            FAST + "/custom_key/search_key",
+            SLOW + "/custom_key/search_key",
+        ]
+
+        with mock.patch(
+            "api2d.utilities.requests.post", side_effect=[reply(502), reply(503)]
+        ):
+            assert client.call_custom_key_search_key("fk-1") is None
+
+    def test_key_creation_is_not_repeated_on_another_endpoint(self):
+        client = Api2dClient("key", [SLOW, FAST])
+
+        with mock.patch(
+            "api2d.utilities.requests.post", return_value=reply(502)
+        ) as post:
+            assert client.call_custom_key_save("1", 1) is None
+        assert post.call_count == 1
+
+    def test_billed_call_is_not_repeated_after_it_was_sent(self):
+        client = Api2dClient("key", [SLOW, FAST])
+
+        with mock.patch(
+            "api2d.utilities.requests.post",
+            side_effect=requests.exceptions.ReadTimeout("slow"),
+        ) as post:
+            assert client.create_claude_message({}) is None
+        assert post.call_count == 1
+
+    def test_billed_call_fails_over_when_it_was_never_sent(self):
+        client = Api2dClient("key", [SLOW, FAST])
+        refused = requests.exceptions.ConnectionError(
+            urllib3.exceptions.MaxRetryError(
+                None, SLOW, urllib3.exceptions.NewConnectionError(None, "refused")
+            )
+        )
+
+        for error in (requests.exceptions.ConnectTimeout("slow"), refused):
+            cache.clear()
+            with mock.patch(
+                "api2d.utilities.requests.post",
+                side_effect=[error, reply(body=b'{"content": []}')],
+            ) as post:
+                assert client.create_claude_message({}) == {"content": []}
+            assert post.call_count == 2
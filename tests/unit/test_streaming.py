@@ -0,0 +1,256 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+import requests
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey
+from api2d.streaming import SectionStreamParser, stream_revision, stream_sections
+from api2d.utilities import Api2dClient
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+OUTPUT = (
+    "Dear Sir, I am writing.</revised_text>\n"
+    "<grammar_focused_feedback>| a < b | <b>bold</b> |"
+)
+
+
+def collect(chunks, **kwargs):
+    """Feed chunks and return the (type, section, text) of every event."""
+    parser = SectionStreamParser(**kwargs)
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.close())
+    return [(e.type, e.section, e.text) for e in events]
+
+
+def sections(events):
+    text = {}
+    for kind, section, delta in events:
+        text[section] = text.get(section, "") + delta
+    return text
+
+
+class TestSectionStreamParser(SimpleTestCase):
+    """Test splitting streamed output into sections."""
+
+    def test_whole_output(self):
+        events = collect([OUTPUT], initial_section="revised_text")
+
+        assert events == [
+            ("section_start", "revised_text", ""),
+            ("section_delta", "revised_text", "Dear Sir, I am writing."),
+            ("section_end", "revised_text", ""),
+            ("section_start", "grammar_focused_feedback", ""),
+            ("section_delta", "grammar_focused_feedback", "| a < b | <b>bold</b> |"),
+            ("section_end", "grammar_focused_feedback", ""),
+        ]
+
+    def test_tags_split_at_every_position(self):
+        expected = sections(collect([OUTPUT], initial_section="revised_text"))
+
+        for size in (1, 2, 3, 5, 7):
+            chunks = [OUTPUT[i : i + size] for i in range(0, len(OUTPUT), size)]
+            events = collect(chunks, initial_section="revised_text")
+            assert sections(events) == expected
+            assert [e[0] for e in events if e[0] != "section_delta"] == [
+                "section_start",
+                "section_end",
+                "section_start",
+                "section_end",
+            ]
+
+    def test_deltas_are_emitted_before_the_section_closes(self):
+        parser = SectionStreamParser(initial_section="revised_text")
+        parser.feed("")
+
+        events = parser.feed("Dear Sir, </rev")
+
+        assert [(e.type, e.text) for e in events] == [("section_delta", "Dear Sir, ")]
+        assert parser.feed("ised_text>")[0].type == "section_end"
+
+    def test_unterminated_prefix_is_flushed_on_close(self):
+        events = collect(["Dear Sir </revi"], initial_section="revised_text")
+
+        assert sections(events)["revised_text"] == "Dear Sir </revi"
+        assert events[-1] == ("section_end", "revised_text", "")
+
+    def test_text_outside_sections_is_dropped(self):
+        events = collect(["preamble <revised_text>kept</revised_text> junk"])
+
+        assert sections(events) == {"revised_text": "kept"}
+
+
+def anthropic_stream(*texts, stop_reason="end_turn"):
+    yield 'data: {"type": "message_start", "message": {"usage": {"input_tokens": 9}}}'
+    for text in texts:
+        yield ""
+        yield "data: " + json.dumps(
+            {
+                "type": "content_block_delta",
+                "delta": {"type": "text_delta", "text": text},
+            }
+        )
+    yield "data: " + json.dumps(
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason},
+            "usage": {"output_tokens": 4},
+        }
+    )
+    yield 'data: {"type": "message_stop"}'
+
+
+class TestStreamSections(SimpleTestCase):
+    def test_sse_output(self):
+        out = "".join(stream_sections(anthropic_stream("Hi</revised", "_text>")))
+
+        assert out.startswith('event: section_start\ndata: {"section": "revised_text"')
+        assert (
+            'event: section_delta\ndata: {"section": "revised_text", "text": "Hi"}'
+            in out
+        )
+        assert out.endswith(
+            'event: done\ndata: {"usage": {"input_tokens": 9, "output_tokens": 4}}\n\n'
+        )
+
+    def test_answer_cut_off_at_max_tokens_is_an_error(self):
+        lines = anthropic_stream(
+            "Hi</revised_text><grammar_focused_feedback>Use",
+            stop_reason="max_tokens",
+        )
+        out = "".join(stream_sections(lines))
+
+        assert "event: error\n" in out
+        assert out.index("event: error") < out.rindex("event: section_end")
+        assert out.endswith(
+            'event: done\ndata: {"usage": {"input_tokens": 9, "output_tokens": 4}}\n\n'
+        )
+        lines = anthropic_stream("Hi", stop_reason="max_tokens")
+        assert "event: error\n" in "".join(stream_revision(lines, "Hi"))
+        assert "event: error" not in "".join(stream_sections(anthropic_stream("Hi")))
+
+    def test_event_stream_is_read_as_utf8(self):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "text/event-stream"
+        response._content = "\n".join(anthropic_stream("Café – naïve")).encode()
+        response._content_consumed = True
+
+        with mock.patch("api2d.utilities.requests.post", return_value=response):
+            lines = Api2dClient("k", ["https://up.example"]).stream_claude_message({})
+            out = "".join(stream_sections(lines))
+
+        assert '"text": "Caf\\u00e9 \\u2013 na\\u00efve"' in out
+
+
+@unit_test_settings
+class TestImproveStreamView(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+        group = Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        self.key = Api2dKey.objects.create(
+            key="fk-alice", user=self.user, group=group, created_at=timezone.now()
+        )
+        self.client.force_login(self.user)
+        patcher = mock.patch("api2d.views.record_usage")
+        self.record_usage = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_streams_sections_and_wraps_writing_input(self):
+        with mock.patch(
+            "api2d.views.Api2dClient.stream_claude_message",
+            return_value=anthropic_stream(
+                "Better.</revised_text><grammar_", "focused_feedback>Tip"
+            ),
+        ) as stream:
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "writing", "text": "Gud."}),
+                content_type="application/json",
+            )
+            body = b"".join(response.streaming_content).decode()
+
+        assert response["Content-Type"] == "text/event-stream"
+        messages = stream.call_args.args[0]["messages"]
+        assert messages[1]["content"] == "<user_input>Gud.</user_input>"
+        assert '"section": "grammar_focused_feedback", "text": "Tip"' in body
+
+    def test_usage_is_recorded_by_the_server(self):
+        with mock.patch(
+            "api2d.views.Api2dClient.stream_claude_message",
+            return_value=anthropic_stream("Better.</revised_text>"),
+        ):
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "speaking", "text": "Gud."}),
+                content_type="application/json",
+            )
+            b"".join(response.streaming_content)
+
+        usage = self.record_usage.call_args.kwargs
+        assert usage["user_id"] == self.user.pk
+        assert (usage["input_tokens"], usage["output_tokens"]) == (9, 4)
+        assert usage["output_chars"] == len("Better.</revised_text>")
+        assert usage["input_chars"] > len("Gud.")
+
+    def test_usage_is_recorded_when_the_browser_goes_away(self):
+        with (
+            mock.patch(
+                "api2d.views.Api2dClient.stream_claude_message",
+                return_value=anthropic_stream(
+                    "Better.", " Much better.</revised_text>"
+                ),
+            ),
+            mock.patch("api2d.views.record_latency") as record_latency,
+        ):
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "speaking", "text": "Gud."}),
+                content_type="application/json",
+            )
+            content = iter(response.streaming_content)
+            next(content)
+            next(content)
+            response.close()
+
+        usage = self.record_usage.call_args.kwargs
+        assert (usage["input_tokens"], usage["output_tokens"]) == (9, 0)
+        assert usage["output_chars"] == len("Better.")
+        record_latency.assert_not_called()
+
+    def test_expired_key_is_refused(self):
+        Api2dKey.objects.filter(pk=self.key.pk).update(
+            expired_at=timezone.now() - timedelta(days=1)
+        )
+
+        with mock.patch("api2d.views.Api2dClient.stream_claude_message") as stream:
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "speaking", "text": "Hi"}),
+                content_type="application/json",
+            )
+
+        assert response.status_code == 403
+        stream.assert_not_called()
+
+    def test_upstream_failure(self):
+        with mock.patch(
+            "api2d.views.Api2dClient.stream_claude_message", return_value=None
+        ):
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "speaking", "text": "Hi"}),
+                content_type="application/json",
+            )
+
+        assert response.status_code == 502
@@ -0,0 +1,117 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey, UsageEvent
+from api2d.tokens import IMPROVE, REVISE, estimator, max_tokens_for
+from api2d.utilities import celpip_improve_payload
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+
+@unit_test_settings
+class TestTokenEstimator(TestCase):
+    """Test the calibrated token estimate and the output budget it sizes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+
+    def record(self, count, chars, tokens, model="claude"):
+        UsageEvent.objects.bulk_create(
+            UsageEvent(
+                user=self.user,
+                model=model,
+                endpoint="/claude/v1/messages",
+                input_chars=chars,
+                input_tokens=tokens,
+            )
+            for _ in range(count)
+        )
+
+    def test_default_ratio_until_there_are_enough_events(self):
+        self.record(estimator.min_events - 1, chars=500, tokens=100)
+
+        assert estimator.estimate("x" * 70, "claude") == 20
+
+    def test_ratio_is_calibrated_per_model_from_usage(self):
+        self.record(estimator.min_events, chars=500, tokens=100)
+        self.record(estimator.min_events, chars=200, tokens=100, model="other")
+
+        assert estimator.estimate("x" * 70, "claude") == 14
+        assert estimator.estimate("x" * 70, "other") == 35
+        # Cached: later events only count after the calibration expires
+        self.record(100, chars=100, tokens=100)
+        with self.assertNumQueries(0):
+            assert estimator.estimate("x" * 70, "claude") == 14
+
+    def test_budget_grows_with_the_input_within_bounds(self):
+        with self.settings(
+            CELPIP_MAX_TOKENS={IMPROVE: (3.0, 500), REVISE: (2.0, 100)},
+            CELPIP_MAX_TOKENS_RANGE=(256, 4096),
+        ):
+            assert max_tokens_for("", "claude", REVISE) == 256
+            assert max_tokens_for("x" * 700, "claude") == 3 * 200 + 500
+            assert max_tokens_for("x" * 700, "claude", REVISE) == 2 * 200 + 100
+            assert max_tokens_for("x" * 100_000, "claude") == 4096
+
+    def test_payload_is_sized_from_the_text(self):
+        short = celpip_improve_payload("Hi.", wrap_input=True)["max_tokens"]
+        long = celpip_improve_payload("Hi. " * 300, wrap_input=True)["max_tokens"]
+
+        assert short < long <= 4096
+
+
+@unit_test_settings
+class TestInputLimit(TestCase):
+    """Test that oversized texts are refused before the upstream call."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+        group = Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        Api2dKey.objects.create(
+            key="fk-alice", user=self.user, group=group, created_at=timezone.now()
+        )
+        self.client.force_login(self.user)
+
+    @mock.patch("api2d.views.Api2dClient.stream_claude_message")
+    def test_oversized_text_is_refused(self, stream):
+        with self.settings(CELPIP_MAX_INPUT_TOKENS=100):
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "writing", "text": "word " * 200}),
+                content_type="application/json",
+            )
+
+        assert response.status_code == 413
+        assert "too long" in response.json()["error"]
+        stream.assert_not_called()
+
+    @mock.patch("api2d.views.Api2dClient.stream_claude_message")
+    def test_limit_is_checked_for_the_routed_model(self, stream):
+        ratios = {"fast": 6.0, "quality": 1.5}
+        with (
+            self.settings(
+                API2D_CLAUDE_MODEL="fast",
+                API2D_CLAUDE_QUALITY_MODEL="quality",
+                MODEL_ROUTING_GROUPS={"basic": "quality"},
+                CELPIP_MAX_INPUT_TOKENS=150,
+            ),
+            mock.patch.object(estimator, "chars_per_token", side_effect=ratios.get),
+        ):
+            response = self.client.post(
+                "/celpip/improve/stream/",
+                json.dumps({"kind": "writing", "text": "x" * 300}),
+                content_type="application/json",
+            )
+
+        assert response.status_code == 413
+        stream.assert_not_called()
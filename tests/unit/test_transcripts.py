@@ -0,0 +1,155 @@
+import hashlib
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.utils import timezone
+
+from api2d.models import Api2dGroup2ExpirationMapping, Api2dKey
+from api2d.transcripts import SWEEP_KEY, TranscriptStore
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+RESULT = {"text": "Harry is a nice boy.", "usage": {"input_tokens": 50}}
+
+
+@unit_test_settings
+class TestTranscriptStore(TestCase):
+    """Test the content-addressed transcription store."""
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = TranscriptStore(tmp.name, ttl=3600, max_bytes=10_000)
+
+    def test_results_are_keyed_by_audio_model_and_language(self):
+        self.store.put("abc", "stt-1", "en", RESULT)
+
+        assert self.store.get("abc", "stt-1", "en") == RESULT
+        assert self.store.get("abc", "stt-2", "en") is None
+        assert self.store.get("abc", "stt-1", "fr") is None
+        assert self.store.stats()["hits"] == 1
+        assert self.store.stats()["misses"] == 2
+
+    def test_expired_entries_are_dropped(self):
+        self.store.put("abc", "stt", "en", RESULT)
+        self.store.ttl = 0.01
+        time.sleep(0.02)
+
+        assert self.store.get("abc", "stt", "en") is None
+        assert self.store.stats()["entries"] == 0
+
+    def test_least_recently_used_entries_go_first(self):
+        for digest in ("a", "b", "c"):
+            self.store.put(digest, "stt", "en", RESULT)
+        # Age the entries ("c" less than "b"), then read "a" so that "b" is
+        # the oldest access.
+        past = time.time() - 100
+        for digest, age in (("a", 0), ("b", 0), ("c", -10)):
+            path = self.store._path(digest, "stt", "en")
+            os.utime(path, (past - age, past - age))
+        self.store.get("a", "stt", "en")
+
+        self.store.max_bytes = self.store.stats()["bytes"] - 1
+        self.store.evict()
+
+        assert self.store.get("b", "stt", "en") is None
+        assert self.store.get("a", "stt", "en") == RESULT
+        assert self.store.get("c", "stt", "en") == RESULT
+
+    def test_eviction_runs_only_when_over_budget(self):
+        self.store.put("first", "stt", "en", RESULT)
+        size = self.store.stats()["bytes"]
+        self.store.max_bytes = size * 3.5
+
+        with mock.patch.object(self.store, "evict", wraps=self.store.evict) as evict:
+            for digest in ("a", "b"):
+                self.store.put(digest, "stt", "en", RESULT)
+            assert evict.call_count == 0
+            self.store.put("c", "stt", "en", RESULT)
+            assert evict.call_count == 1
+
+        assert self.store.stats()["entries"] == 3
+        assert self.store.get("first", "stt", "en") is None
+
+    def test_expired_entries_are_swept_periodically(self):
+        self.store.put("abc", "stt", "en", RESULT)
+        path = self.store._path("abc", "stt", "en")
+        os.utime(path, (time.time() - 7200, time.time() - 7200))
+
+        self.store.put("def", "stt", "en", RESULT)
+        assert os.path.exists(path)
+
+        cache.delete(SWEEP_KEY)  # the sweep interval is over
+        self.store.put("ghi", "stt", "en", RESULT)
+        assert not os.path.exists(path)
+
+
+@unit_test_settings
+class TestTranscribeView(TestCase):
+    """Test that a repeated upload skips the upstream transcription."""
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = TranscriptStore(tmp.name, ttl=3600, max_bytes=10_000)
+        patcher = mock.patch("api2d.views.transcript_store", store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+        group = Api2dGroup2ExpirationMapping.objects.create(
+            group="basic", type_id="1", validate_days=30
+        )
+        Api2dKey.objects.create(
+            key="fk-alice", user=self.user, group=group, created_at=timezone.now()
+        )
+        self.client.force_login(self.user)
+
+    def upload(self, audio):
+        return self.client.post(
+            "/celpip/transcribe/",
+            {"file": SimpleUploadedFile("take.m4a", audio, "audio/mp4")},
+        )
+
+    def test_repeated_upload_is_served_from_the_store(self):
+        received = []
+
+        def transcribe(audio, model, language):
+            received.append(audio.read())
+            return RESULT
+
+        with mock.patch(
+            "api2d.views.Api2dClient.transcribe_audio", side_effect=transcribe
+        ):
+            first = self.upload(b"\x00\x01" * 5000)
+            second = self.upload(b"\x00\x01" * 5000)
+            other = self.upload(b"\x00\x02" * 5000)
+
+        assert first.json() == {**RESULT, "cached": False}
+        assert second.json() == {**RESULT, "cached": True}
+        assert other.json()["cached"] is False
+        # Upstream saw each distinct recording once, and all of it.
+        assert received == [b"\x00\x01" * 5000, b"\x00\x02" * 5000]
+
+    @mock.patch("api2d.views.Api2dClient.transcribe_audio", return_value=RESULT)
+    def test_upload_is_hashed_as_it_streams(self, transcribe):
+        audio = b"recording" * 1000
+        with mock.patch("api2d.views.transcript_store.get", return_value=None) as get:
+            self.upload(audio)
+
+        assert get.call_args.args[0] == hashlib.sha256(audio).hexdigest()
+
+    @mock.patch("api2d.views.Api2dClient.transcribe_audio", return_value=None)
+    def test_upstream_failure_is_not_cached(self, transcribe):
+        assert self.upload(b"audio").status_code == 502
+        assert self.upload(b"audio").status_code == 502
+        assert transcribe.call_count == 2
@@ -0,0 +1,143 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+
+from api2d.models import UsageEvent, UsageRollup
+from api2d.usage import UsageBuffer
+from .helpers import unit_test_settings
+
+User = get_user_model()
+
+
+@unit_test_settings
+class TestUsageLedger(TestCase):
+    """Test the buffered usage ledger and its rollups."""
+
+    def setUp(self):
+        self.user = User.objects.create_user("alice", "alice@example.com", "pw")
+        self.buffer = UsageBuffer(max_events=100, flush_seconds=0)
+        patcher = mock.patch("api2d.usage.buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_usage(self, **overrides):
+        event = {
+            "model": "claude-3-5-haiku-latest",
+            "endpoint": "/claude/v1/messages",
+            "input_tokens": 1200,
+            "output_tokens": 800,
+            "latency_ms": 4200,
+            "cost": "12.5",
+            **overrides,
+        }
+        return self.client.post(
+            "/usage/", json.dumps(event), content_type="application/json"
+        )
+
+    def test_events_are_buffered_until_flush(self):
+        self.client.force_login(self.user)
+
+        response = self.post_usage()
+
+        assert response.status_code == 202
+        assert UsageEvent.objects.count() == 0
+        assert self.buffer.flush() == 1
+        event = UsageEvent.objects.get()
+        assert event.user == self.user
+        assert (event.input_tokens, event.output_tokens) == (1200, 800)
+
+    def test_invalid_event_is_rejected(self):
+        self.client.force_login(self.user)
+
+        response = self.post_usage(input_tokens="many")
+
+        assert response.status_code == 400
+        assert self.buffer.flush() == 0
+
+    def test_out_of_range_values_are_rejected(self):
+        self.client.force_login(self.user)
+
+        for overrides in (
+            {"input_tokens": 2**31},
+            {"output_tokens": 2**31},
+            {"latency_ms": 2**31},
+        ):
+            assert self.post_usage(**overrides).status_code == 400, overrides
+        assert self.buffer.flush() == 0
+
+    @override_settings(USAGE_MODEL_PRICES={"claude-3-5-haiku-latest": (800, 4000)})
+    def test_cost_is_priced_from_the_tokens(self):
+        self.client.force_login(self.user)
+
+        assert self.post_usage(cost="1e9").status_code == 202
+        assert self.post_usage(model="unlisted").status_code == 202
+        self.buffer.flush()
+
+        assert UsageEvent.objects.get(model="claude-3-5-haiku-latest").cost == (
+            Decimal("4.16")
+        )
+        assert UsageEvent.objects.get(model="unlisted").cost == 0
+
+    def test_a_bad_event_does_not_lose_the_batch(self):
+        self.client.force_login(self.user)
+        self.post_usage()
+        # Queued without the checks, as a server-side caller could
+        self.buffer.add(
+            UsageEvent(user=self.user, model="m", endpoint="/e", cost=Decimal("1e20"))
+        )
+        self.post_usage()
+
+        assert self.buffer.flush() == 2
+        assert UsageEvent.objects.count() == 2
+        assert UsageRollup.objects.get(period=UsageRollup.PERIOD_HOUR).requests == 2
+
+    def test_rollups_accumulate_across_flushes(self):
+        at = datetime(2025, 6, 1, 10, 30, tzinfo=dt_timezone.utc)
+        for _ in range(2):
+            self.buffer.add(
+                UsageEvent(
+                    user=self.user,
+                    model="m",
+                    endpoint="/e",
+                    input_tokens=10,
+                    output_tokens=5,
+                    latency_ms=100,
+                    cost=Decimal("1.5"),
+                    created_at=at,
+                )
+            )
+            self.buffer.flush()
+
+        hourly = UsageRollup.objects.get(period=UsageRollup.PERIOD_HOUR)
+        daily = UsageRollup.objects.get(period=UsageRollup.PERIOD_DAY)
+        assert hourly.bucket == at.replace(minute=0)
+        assert daily.bucket == at.replace(hour=0, minute=0)
+        for rollup in (hourly, daily):
+            assert rollup.requests == 2
+            assert rollup.input_tokens == 20
+            assert rollup.cost == Decimal("3.0")
+
+    def test_full_buffer_flushes(self):
+        self.buffer.max_events = 2
+        for _ in range(2):
+            self.buffer.add(UsageEvent(user=self.user, model="m", endpoint="/e"))
+
+        assert UsageEvent.objects.count() == 2
+
+    def test_batch_is_requeued_when_the_database_is_down(self):
+        self.buffer.add(UsageEvent(user=self.user, model="m", endpoint="/e"))
+
+        with mock.patch(
+            "api2d.usage.Api2dKey.objects.filter",
+            side_effect=OperationalError("down"),
+        ):
+            assert self.buffer.flush() == 0
+
+        assert UsageEvent.objects.count() == 0
+        assert self.buffer.flush() == 1
+        assert UsageEvent.objects.count() == 1
@@ -0,0 +1,129 @@
+import io
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from api2d.vad import (
+    SAMPLE_RATE,
+    encode_wav,
+    read_wav,
+    restore_timings,
+    trim_silence,
+    trim_upload,
+)
+
+
+def recording(*parts):
+    """Synthetic PCM from (kind, seconds) parts: quiet noise or a loud tone."""
+    rng = np.random.default_rng(0)
+    pieces = []
+    for kind, seconds in parts:
+        n = int(seconds * SAMPLE_RATE)
+        if kind == "speech":
+            t = np.arange(n) / SAMPLE_RATE
+            pieces.append(8000 * np.sin(2 * np.pi * 220 * t))
+        else:
+            pieces.append(rng.normal(0, 30, n))
+    return np.concatenate(pieces).astype(np.int16)
+
+
+TAKE = recording(
+    ("silence", 1.0),
+    ("speech", 1.0),
+    ("silence", 2.0),
+    ("speech", 1.0),
+    ("silence", 1.5),
+)
+
+
+class TestTrimSilence(SimpleTestCase):
+    """Test the energy-based silence trimming."""
+
+    def test_cuts_edges_and_shortens_pauses(self):
+        trimmed, timestamps = trim_silence(TAKE)
+
+        seconds = len(trimmed) / SAMPLE_RATE
+        assert 2.8 <= seconds <= 3.6
+        assert timestamps.duration == seconds
+        assert len(timestamps.segments) == 2
+
+    def test_timestamps_map_back_to_the_original(self):
+        _, timestamps = trim_silence(TAKE)
+
+        # Speech starts 1s into the original, preceded by the 0.2s pad.
+        assert abs(timestamps.to_original(0.2) - 1.0) < 0.03
+        second_run = timestamps.segments[1]
+        assert abs(timestamps.to_original(second_run[0] + 0.2) - 4.0) < 0.03
+
+    def test_restore_timings_rewrites_segments(self):
+        _, timestamps = trim_silence(TAKE)
+        result = {"text": "hi", "segments": [{"start": 0.2, "end": 1.2}]}
+
+        restore_timings(result, timestamps)
+
+        assert abs(result["segments"][0]["start"] - 1.0) < 0.03
+        assert abs(result["segments"][0]["end"] - 2.0) < 0.03
+
+    def test_continuous_speech_is_left_alone(self):
+        take = encode_wav(recording(("speech", 2.0)))
+
+        assert trim_upload(SimpleUploadedFile("take.wav", take, "audio/wav")) is None
+
+    def test_audio_shorter_than_a_frame_is_left_alone(self):
+        for samples in (np.zeros(0, dtype=np.int16), np.ones(10, dtype=np.int16)):
+            trimmed, timestamps = trim_silence(samples)
+
+            assert trimmed is samples
+            assert timestamps.duration == len(samples) / SAMPLE_RATE
+
+        empty = SimpleUploadedFile("take.wav", encode_wav(np.zeros(0)), "audio/wav")
+        assert trim_upload(empty) is None
+
+    @mock.patch("api2d.vad.encode_flac", return_value=None)
+    def test_upload_is_trimmed_to_a_wav(self, encode_flac):
+        upload = SimpleUploadedFile("take.wav", encode_wav(TAKE), "audio/wav")
+
+        trimmed = trim_upload(upload)
+
+        assert trimmed.audio.name == "take.wav"
+        samples = read_wav(trimmed.audio.read())
+        assert len(samples) / SAMPLE_RATE == trimmed.trimmed_seconds
+        assert trimmed.original_seconds == len(TAKE) / SAMPLE_RATE
+
+    @mock.patch("api2d.vad.encode_flac", return_value=b"fLaC")
+    def test_upload_is_trimmed_to_a_flac(self, encode_flac):
+        upload = SimpleUploadedFile("take.wav", encode_wav(TAKE), "audio/wav")
+
+        trimmed = trim_upload(upload)
+
+        assert trimmed.audio.name == "take.flac"
+        assert trimmed.audio.content_type == "audio/flac"
+        assert trimmed.audio.read() == b"fLaC"
+
+    def test_compressed_upload_is_not_made_bigger(self):
+        # A compressed recording of the take, smaller than its trimmed WAV
+        upload = SimpleUploadedFile("take.m4a", b"m4a" * 1000, "audio/mp4")
+
+        with (
+            mock.patch("api2d.vad.load_samples", return_value=TAKE),
+            mock.patch("api2d.vad.encode_flac", return_value=None),
+        ):
+            assert trim_upload(upload) is None
+
+    def test_report_over_a_corpus(self):
+        with tempfile.TemporaryDirectory() as corpus:
+            Path(corpus, "a.wav").write_bytes(encode_wav(TAKE))
+            Path(corpus, "b.wav").write_bytes(encode_wav(recording(("speech", 1))))
+            out = io.StringIO()
+
+            call_command("vad_report", corpus, stdout=out)
+
+        report = out.getvalue()
+        assert "a.wav: 6.5s -> " in report
+        assert "b.wav: not trimmed" in report
+        assert "total: 6.5s -> " in report
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from api2d.templatetags.vite_assets import (
+    _cached_manifest,
+    load_manifest,
+    manifest_version,
+)
+
+MANIFEST = {
+    "main.ts": {"file": "assets/components.js", "isEntry": True},
+    "src/django-pages/api2d/CelpipSpeaking.svelte": {
+        "file": "assets/CelpipSpeaking.abc123.js",
+        "isDynamicEntry": True,
+        "imports": ["_index.shared.js", "src/components/Recorder.svelte"],
+        "css": ["assets/CelpipSpeaking.def456.css"],
+    },
+    "src/components/Recorder.svelte": {
+        "file": "assets/Recorder.789abc.js",
+        "isDynamicEntry": True,
+        "imports": ["_index.shared.js"],
+    },
+    "_index.shared.js": {"file": "assets/index.shared.js"},
+}
+
+
+@override_settings(DEBUG=True, STATIC_URL="/static/")
+class TestVitePreload(SimpleTestCase):
+    """Test the preload links rendered from the Vite manifest."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.manifest_path = Path(tmp.name) / "manifest.json"
+        self.manifest_path.write_text(json.dumps(MANIFEST))
+
+    def render(self, entry, manifest_path=None):
+        with override_settings(VITE_MANIFEST_PATH=manifest_path or self.manifest_path):
+            template = Template(
+                '{% load vite_assets %}{% vite_preload "' + entry + '" %}'
+            )
+            return template.render(Context())
+
+    def test_preloads_chunk_and_imports_once(self):
+        html = self.render("src/django-pages/api2d/CelpipSpeaking.svelte")
+
+        assert (
+            '<link rel="modulepreload" '
+            'href="/static/frontend/assets/CelpipSpeaking.abc123.js">' in html
+        )
+        assert "/static/frontend/assets/Recorder.789abc.js" in html
+        assert html.count("assets/index.shared.js") == 1
+        assert (
+            '<link rel="stylesheet" '
+            'href="/static/frontend/assets/CelpipSpeaking.def456.css">' in html
+        )
+        assert "components.js" not in html
+
+    def test_missing_manifest_renders_nothing(self):
+        html = self.render(
+            "src/components/Recorder.svelte", manifest_path="/nonexistent.json"
+        )
+        assert html.strip() == ""
+
+    def test_manifest_version_changes_with_the_build(self):
+        with override_settings(VITE_MANIFEST_PATH=self.manifest_path):
+            version = manifest_version()
+            self.manifest_path.write_text(json.dumps({**MANIFEST, "new.ts": {}}))
+
+            assert len(version) == 32
+            assert manifest_version() != version
+        with override_settings(VITE_MANIFEST_PATH="/nonexistent.json"):
+            assert manifest_version() == ""
+
+    @override_settings(DEBUG=False)
+    def test_manifest_is_hashed_once_per_process(self):
+        _cached_manifest.cache_clear()
+        self.addCleanup(_cached_manifest.cache_clear)
+        with (
+            override_settings(VITE_MANIFEST_PATH=self.manifest_path),
+            mock.patch(
+                "api2d.templatetags.vite_assets.hashlib.md5", wraps=hashlib.md5
+            ) as md5,
+        ):
+            for _ in range(3):
+                manifest_version()
+                load_manifest()
+
+        assert md5.call_count == 1
@@ -0,0 +1,80 @@
+import os
+import runpy
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.test import SimpleTestCase
+
+from django_project import warmup
+from .helpers import unit_test_settings
+
+GUNICORN_CONF = Path(settings.BASE_DIR) / "gunicorn.conf.py"
+
+
+@unit_test_settings
+class TestWarmup(SimpleTestCase):
+    """Test the warm-up run by the gunicorn hooks."""
+
+    def test_shared_warmup_loads_and_then_closes_connections(self):
+        with mock.patch.object(warmup.connections, "close_all") as close_all:
+            timings = warmup.warm_shared()
+
+        assert set(timings) == {"urls", "templates", "vite manifest", "grammar lexicon"}
+        close_all.assert_called_once()
+
+    def test_thread_bound_connections_are_not_kept(self):
+        persistent = mock.Mock(settings_dict={"OPTIONS": {}})
+        pooled = mock.Mock(settings_dict={"OPTIONS": {"pool": {"min_size": 1}}})
+        with (
+            mock.patch.object(warmup.connections, "all", return_value=[persistent]),
+            mock.patch.object(warmup, "_upstream_state"),
+        ):
+            warmup.warm_worker(threads=1)
+            assert not persistent.close.called
+            warmup.warm_worker(threads=4)
+            assert persistent.close.called
+
+        with (
+            mock.patch.object(warmup.connections, "all", return_value=[pooled]),
+            mock.patch.object(warmup, "_upstream_state"),
+        ):
+            warmup.warm_worker(threads=4)
+        pooled.ensure_connection.assert_called_once()
+        assert not pooled.close.called
+
+
+class TestGunicornConf(SimpleTestCase):
+    def load(self, **env):
+        with mock.patch.dict("os.environ", env, clear=True):
+            return runpy.run_path(str(GUNICORN_CONF))
+
+    def test_sizing_from_the_environment(self):
+        conf = self.load(GUNICORN_WORKERS="3", GUNICORN_THREADS="8", PORT="9000")
+
+        assert (conf["workers"], conf["threads"]) == (3, 8)
+        assert conf["bind"] == "0.0.0.0:9000"
+        assert conf["preload_app"] is True
+
+    def test_defaults_are_shared_with_the_database_settings(self):
+        with mock.patch.dict("os.environ", {}, clear=True):
+            conf = runpy.run_path(str(GUNICORN_CONF))
+            # settings.py sizes the connection pool from the same variable
+            assert os.environ["GUNICORN_THREADS"] == str(conf["threads"])
+        assert conf["workers"] >= 3
+        assert self.load(WEB_CONCURRENCY="2")["workers"] == 2
+
+    def test_failed_warmup_does_not_stop_a_worker_without_preload(self):
+        conf = self.load(GUNICORN_PRELOAD="0")
+        worker = mock.Mock(pid=1)
+
+        with (
+            mock.patch.object(warmup, "warm_shared", return_value={}),
+            mock.patch.object(warmup, "warm_worker", side_effect=DatabaseError("down")),
+            mock.patch.object(warmup, "memory_usage", return_value="1 MB"),
+        ):
+            conf["post_worker_init"](worker)
+
+        worker.log.exception.assert_called_once_with("Worker warm-up failed")
+        worker.log.info.assert_called_once_with("Worker %s ready: %s", 1, "1 MB")
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+
+def user_cache_key(user_id):
+    return f"users:user:{user_id}"
+
+
+def _load_user(request):
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+    # A cached user is only trusted for the checks auth.get_user() would pass
+    # without side effects. Anything else (stale hash, fallback secret,
+    # inactive user, unknown backend) goes through the uncached path so that
+    # session flushing and key rotation keep working.
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if (
+        backend_path in settings.AUTHENTICATION_BACKENDS
+        and user.is_active
+        and session_hash
+        and constant_time_compare(session_hash, user.get_session_auth_hash())
+    ):
+        return user
+    cache.delete(key)
+    return auth.get_user(request)
+
+
+def get_cached_user(request):
+    if not hasattr(request, "_cached_user"):
+        request._cached_user = _load_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that keeps the logged-in user in the cache for
+    AUTH_USER_CACHE_TIMEOUT seconds, so repeat requests do not load the
+    auth_user row. Entries are dropped whenever the user is saved or deleted
+    (see users.signals).
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))